@@ -19,3 +19,5 @@ on_connect  # unused function (tests/test_backend.py:14)
 monkeypatch  # unused variable (tests/test_cli.py:23)
 monkeypatch  # unused variable (tests/test_cli.py:33)
 monkeypatch  # unused variable (tests/test_cli.py:43)
+benchmarks  # unused function (noxfile.py)
+_.no_cache  # unused attribute (gdbgui/server/http_routes.py:90)
@@ -0,0 +1,247 @@
+"""End-to-end benchmark of the server against fake gdb processes
+
+Starts debug sessions running benchmarks/fakegdb.py instead of gdb, drives
+them with Flask-SocketIO test clients the way the frontend does, and
+reports
+
+* the round-trip time of the commands the frontend runs whenever gdb
+  pauses, from writing them to receiving their result record
+* the rate of gdb output (console records on the mi pty) and of program
+  output (the user pty) forwarded to the clients
+* the CPU time used by this process per session, which includes the test
+  clients as well as the server
+
+    python -m benchmarks.bench_forwarding [--sessions 1 4 16]
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+from gdbgui.server.app import app, socketio
+from gdbgui.server.server import run_server
+
+from . import fakegdb
+
+NAMESPACE = "/gdb_listener"
+# commands the frontend runs every time gdb pauses
+REFRESH_COMMANDS = [
+    "-stack-list-variables --simple-values",
+    "-stack-list-frames",
+    "-thread-info",
+    "-data-list-register-values x",
+]
+POLL_INTERVAL_SEC = 0.0005
+TIMEOUT_SEC = 60
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def json_size(data: Any) -> int:
+    return len(json.dumps(data, separators=(",", ":")))
+
+
+class BenchmarkSession:
+    """A test client connected to its own debug session running the fake gdb"""
+
+    def __init__(self, flask_client, csrf_token: str, fake_gdb_args: str, query: Dict):
+        gdb_command = f"{sys.executable} {fakegdb.__file__} {fake_gdb_args}"
+        self.client = socketio.test_client(
+            app,
+            namespace=NAMESPACE,
+            flask_test_client=flask_client,
+            query_string=urlencode(
+                dict(query, csrf_token=csrf_token, gdb_command=gdb_command)
+            ),
+        )
+        connection_event = self.client.get_received(NAMESPACE)[0]["args"][0]
+        if not connection_event["ok"]:
+            raise RuntimeError(connection_event["message"])
+        self.next_token = 1
+        # token of the command waiting for its result, and when it was written
+        self.pending_token: Optional[int] = None
+        self.sent_time = 0.0
+        self.round_trip_times: List[float] = []
+        self.received_bytes = 0
+        self.user_pty_output = ""
+
+    def run_gdb_command(self, cmd: str) -> None:
+        self.pending_token = self.next_token
+        self.next_token += 1
+        self.sent_time = time.perf_counter()
+        self.client.emit(
+            "run_gdb_command",
+            {"cmd": [f"{self.pending_token}{cmd}"]},
+            namespace=NAMESPACE,
+        )
+
+    def poll(self) -> None:
+        for event in self.client.get_received(NAMESPACE):
+            data = event["args"][0]
+            self.received_bytes += json_size(data)
+            if event["name"] == "gdb_response":
+                for response in data:
+                    if (
+                        response["type"] == "result"
+                        and response["token"] == self.pending_token
+                    ):
+                        self.round_trip_times.append(
+                            time.perf_counter() - self.sent_time
+                        )
+                        self.pending_token = None
+            elif event["name"] == "user_pty_response":
+                self.user_pty_output += data
+                # the frontend acknowledges every frame once it was written
+                self.client.emit(
+                    "pty_interaction",
+                    {"data": {"pty_name": "user_pty", "action": "ack"}},
+                    namespace=NAMESPACE,
+                )
+
+    def is_waiting(self) -> bool:
+        return self.pending_token is not None
+
+    def disconnect(self) -> None:
+        self.client.disconnect(namespace=NAMESPACE)
+
+
+def wait_for(sessions: List[BenchmarkSession], is_done: Callable) -> None:
+    deadline = time.monotonic() + TIMEOUT_SEC
+    while not all(is_done(s) for s in sessions):
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for the fake gdb")
+        socketio.sleep(POLL_INTERVAL_SEC)
+        for session in sessions:
+            session.poll()
+
+
+def run_commands(sessions: List[BenchmarkSession], cmd: str) -> None:
+    """Run cmd in every session at once and wait for all of their results"""
+    for session in sessions:
+        session.run_gdb_command(cmd)
+    wait_for(sessions, lambda s: not s.is_waiting())
+
+
+def measure(sessions: List[BenchmarkSession], fn: Callable[[], None]) -> Dict:
+    """Return the wall time, cpu time and bytes received while running fn"""
+    for session in sessions:
+        session.received_bytes = 0
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    fn()
+    return {
+        "wall_sec": time.perf_counter() - start_wall,
+        "cpu_sec": time.process_time() - start_cpu,
+        "bytes": sum(s.received_bytes for s in sessions),
+    }
+
+
+def run(
+    *,
+    num_sessions: int,
+    num_commands: int,
+    flood_bytes: int,
+    fake_gdb_args: str = "",
+    delta_updates: bool = False,
+) -> Dict[str, float]:
+    flask_client = app.test_client()
+    flask_client.get("/")
+    with flask_client.session_transaction() as flask_session:
+        csrf_token = flask_session["csrf_token"]
+    query = {"delta_updates": "1"} if delta_updates else {}
+    sessions = [
+        BenchmarkSession(flask_client, csrf_token, fake_gdb_args, query)
+        for _ in range(num_sessions)
+    ]
+    try:
+        # wait for every fake gdb to start
+        run_commands(sessions, "-gdb-set confirm off")
+        for session in sessions:
+            session.round_trip_times.clear()
+
+        def refresh():
+            for i in range(num_commands):
+                if i % len(REFRESH_COMMANDS) == 0:
+                    # the program steps, so the refreshed results change
+                    run_commands(sessions, "-exec-next")
+                run_commands(sessions, REFRESH_COMMANDS[i % len(REFRESH_COMMANDS)])
+
+        refresh_stats = measure(sessions, refresh)
+        mi_stats = measure(
+            sessions, lambda: run_commands(sessions, f"-fake-flood mi {flood_bytes}")
+        )
+
+        def flood_user_pty():
+            run_commands(sessions, f"-fake-flood user {flood_bytes}")
+            wait_for(sessions, lambda s: fakegdb.FLOOD_END_MARKER in s.user_pty_output)
+
+        pty_stats = measure(sessions, flood_user_pty)
+    finally:
+        for session in sessions:
+            session.disconnect()
+
+    round_trip_times = [t for s in sessions for t in s.round_trip_times]
+    total_wall_sec = sum(
+        stats["wall_sec"] for stats in (refresh_stats, mi_stats, pty_stats)
+    )
+    total_cpu_sec = sum(
+        stats["cpu_sec"] for stats in (refresh_stats, mi_stats, pty_stats)
+    )
+    return {
+        "sessions": num_sessions,
+        "p50_ms": percentile(round_trip_times, 50) * 1000,
+        "p90_ms": percentile(round_trip_times, 90) * 1000,
+        "p99_ms": percentile(round_trip_times, 99) * 1000,
+        "refresh_bytes_per_command": refresh_stats["bytes"] / len(round_trip_times),
+        "mi_bytes_per_sec": mi_stats["bytes"] / mi_stats["wall_sec"],
+        "pty_bytes_per_sec": pty_stats["bytes"] / pty_stats["wall_sec"],
+        "cpu_percent_per_session": total_cpu_sec / total_wall_sec / num_sessions * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--commands", type=int, default=200, help="refresh commands per session"
+    )
+    parser.add_argument(
+        "--flood-bytes", type=int, default=2_000_000, help="output flooded per pty"
+    )
+    parser.add_argument("--locals", type=int, default=200)
+    parser.add_argument(
+        "--delta-updates",
+        action="store_true",
+        help="connect with delta_updates, so refresh results are sent as diffs",
+    )
+    args = parser.parse_args()
+
+    run_server(testing=True, app=app, socketio=socketio)
+    print(
+        f"{'sessions':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+        f"{'bytes/cmd':>10} {'mi MB/s':>8} {'pty MB/s':>9} {'cpu %/session':>14}"
+    )
+    for num_sessions in args.sessions:
+        result = run(
+            num_sessions=num_sessions,
+            num_commands=args.commands,
+            flood_bytes=args.flood_bytes,
+            fake_gdb_args=f"--locals {args.locals}",
+            delta_updates=args.delta_updates,
+        )
+        print(
+            f"{num_sessions:>8} {result['p50_ms']:>8.2f} {result['p90_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['refresh_bytes_per_command']:>10.0f} "
+            f"{result['mi_bytes_per_sec'] / 1e6:>8.2f} "
+            f"{result['pty_bytes_per_sec'] / 1e6:>9.2f} "
+            f"{result['cpu_percent_per_session']:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
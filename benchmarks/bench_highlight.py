@@ -0,0 +1,112 @@
+"""Benchmark of turning source files into lines of highlighted html
+
+Lexes each file once, then formats its tokens with both
+HtmlListFormatter().get_marked_up_list, which goes through the generators of
+pygments' HtmlFormatter, and htmllistformatter.get_marked_up_list, which
+gdbgui uses, checks that they produce the same lines, and reports the time
+each of them takes next to the time taken by the lexer.
+
+By default it runs on the largest C and C++ headers in /usr/include.
+
+    python -m benchmarks.bench_highlight [--max-files 20] [paths ...]
+"""
+import argparse
+import glob
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+from pygments.lexers import CppLexer  # type: ignore
+
+from gdbgui import htmllistformatter
+from gdbgui.server.sourcecache import get_lexer
+
+DEFAULT_PATTERNS = ["/usr/include/**/*.h", "/usr/include/c++/**/*"]
+ROUNDS = 3
+
+
+def find_large_files(patterns: List[str], max_files: int) -> List[str]:
+    paths = {
+        path
+        for pattern in patterns
+        for path in glob.glob(pattern, recursive=True)
+        if os.path.isfile(path)
+    }
+    return sorted(paths, key=os.path.getsize, reverse=True)[:max_files]
+
+
+def best_time(fn: Callable[[], Any]) -> float:
+    times = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(paths: List[str]) -> Dict[str, Any]:
+    """Time lexing and both formatters on the files, and return the totals"""
+    num_lines = 0
+    lex_sec = 0.0
+    pygments_sec = 0.0
+    gdbgui_sec = 0.0
+    for path in paths:
+        with open(path, "r", errors="replace") as f:
+            text = f.read()
+        # headers of the c++ standard library have no extension
+        lexer = get_lexer(path) or CppLexer()
+        start = time.perf_counter()
+        tokens = list(lexer.get_tokens(text))
+        lex_sec += time.perf_counter() - start
+
+        expected = htmllistformatter.HtmlListFormatter().get_marked_up_list(tokens)
+        lines = htmllistformatter.get_marked_up_list(tokens)
+        if lines != expected:
+            raise AssertionError(f"formatters disagree on {path}")
+        num_lines += len(lines)
+        pygments_sec += best_time(
+            lambda: htmllistformatter.HtmlListFormatter().get_marked_up_list(tokens)
+        )
+        gdbgui_sec += best_time(lambda: htmllistformatter.get_marked_up_list(tokens))
+    return {
+        "files": len(paths),
+        "lines": num_lines,
+        "lex_sec": lex_sec,
+        "pygments_format_sec": pygments_sec,
+        "gdbgui_format_sec": gdbgui_sec,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="*", help="files to highlight")
+    parser.add_argument(
+        "--max-files",
+        type=int,
+        default=20,
+        help="how many of the largest headers to use when no paths are given",
+    )
+    args = parser.parse_args()
+
+    paths = args.paths or find_large_files(DEFAULT_PATTERNS, args.max_files)
+    result = run(paths)
+    pygments_total = result["lex_sec"] + result["pygments_format_sec"]
+    gdbgui_total = result["lex_sec"] + result["gdbgui_format_sec"]
+    print(f"{result['files']} files, {result['lines']} lines")
+    print(f"{'':>20} {'format s':>9} {'lex+format s':>13} {'lines/s':>10}")
+    for name, format_sec, total_sec in [
+        ("HtmlListFormatter", result["pygments_format_sec"], pygments_total),
+        ("get_marked_up_list", result["gdbgui_format_sec"], gdbgui_total),
+    ]:
+        print(
+            f"{name:>20} {format_sec:>9.3f} {total_sec:>13.3f} "
+            f"{result['lines'] / total_sec:>10.0f}"
+        )
+    print(
+        f"formatting is {result['pygments_format_sec'] / result['gdbgui_format_sec']:.1f}x "
+        "faster, identical output"
+    )
+
+
+if __name__ == "__main__":
+    main()
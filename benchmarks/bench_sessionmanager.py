@@ -0,0 +1,65 @@
+"""Microbenchmark of SessionManager dispatch with many synthetic debug sessions
+
+Every websocket event (run_gdb_command, pty_interaction, disconnect) looks up
+its debug session by client id, and the dashboard looks sessions up by gdb
+pid. The cost of these lookups should not depend on how many sessions and
+tabs are live.
+
+    python -m benchmarks.bench_sessionmanager
+"""
+import random
+import timeit
+from typing import List
+
+from gdbgui.server.sessionmanager import DebugSession, SessionManager
+
+SESSION_COUNTS = [10, 100, 1000, 5000]
+CLIENTS_PER_SESSION = 3
+LOOKUPS = 20000
+
+
+def make_manager(num_sessions: int) -> SessionManager:
+    manager = SessionManager()
+    for i in range(num_sessions):
+        debug_session = DebugSession(
+            pygdbmi_controller=None,  # type: ignore
+            pty_for_gdbgui=None,  # type: ignore
+            pty_for_gdb=None,  # type: ignore
+            pty_for_debugged_program=None,  # type: ignore
+            command="gdb",
+            mi_version="mi2",
+            pid=100000 + i,
+        )
+        manager.add_debug_session(debug_session, f"client-{i}-0")
+        for j in range(1, CLIENTS_PER_SESSION):
+            manager.connect_client_to_debug_session(
+                desired_gdbpid=debug_session.pid, client_id=f"client-{i}-{j}"
+            )
+    return manager
+
+
+def time_per_call_ns(fn, args: List) -> float:
+    iterator = iter(args)
+    seconds = timeit.timeit(lambda: fn(next(iterator)), number=len(args))
+    return seconds / len(args) * 1e9
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'sessions':>10} {'by client id (ns)':>20} {'by pid (ns)':>15}")
+    for num_sessions in SESSION_COUNTS:
+        manager = make_manager(num_sessions)
+        client_ids = [
+            f"client-{rng.randrange(num_sessions)}-{rng.randrange(CLIENTS_PER_SESSION)}"
+            for _ in range(LOOKUPS)
+        ]
+        pids = [100000 + rng.randrange(num_sessions) for _ in range(LOOKUPS)]
+        by_client_id = time_per_call_ns(
+            manager.debug_session_from_client_id, client_ids
+        )
+        by_pid = time_per_call_ns(manager.debug_session_from_pid, pids)
+        print(f"{num_sessions:>10} {by_client_id:>20.0f} {by_pid:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""A stand-in for gdb that speaks enough gdb/MI to benchmark gdbgui
+
+gdbgui starts gdb with `-iex` startup commands, one of which is
+`new-ui mi2 <pty>`. This script accepts the same arguments, answers common
+mi commands on that pty with canned results of a configurable size, and
+can flood output on any of gdb's ptys, so the server can be measured
+without gdb or a program to debug.
+
+    fakegdb.py [--locals N] [--frames N] [--registers N] [--vector-registers N]
+               [--instructions N] [--disassemble-sec SEC]
+
+In addition to the common mi commands it understands
+
+    -fake-flood mi|user|program TOTAL_BYTES [BYTES_PER_SEC]
+
+which writes TOTAL_BYTES of output (as console records on the mi pty, or
+as plain text on the user or program pty) followed by a line containing
+FLOOD_END_MARKER, and then its result record. With no BYTES_PER_SEC, the
+output is written as fast as possible.
+
+It has MEMORY_BYTES of readable memory starting at MEMORY_START, in which
+every byte is the low byte of its address, except that every
+MEMORY_LINE_STRIDE-th byte is the line the program is on, so memory changes
+when the program steps. -data-disassemble returns the given number of
+instructions after taking the given time, like gdb does for large
+functions.
+
+Registers are numbered with the vector registers, whose values are
+composites like those of 512 bit vector registers, after the others. Every
+register changes when the program steps, except three out of four vector
+registers, and the first one (the program counter) changes with the frame
+selected by -stack-select-frame.
+"""
+import argparse
+import os
+import re
+import sys
+import termios
+import time
+import tty
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+FLOOD_END_MARKER = "fake-gdb-flood-end"
+FLOOD_LINE = "x" * 79 + "\n"
+MEMORY_START = 0x600000
+MEMORY_BYTES = 1024 * 1024
+MEMORY_LINE_STRIDE = 64
+_COMMAND = re.compile(r"^(\d*)(-[\w-]+)?\s*(.*)$")
+
+
+def mi_value(value: Any) -> str:
+    """Serialize value in gdb/MI syntax. Lists of (name, value) tuples are
+    serialized as lists of results, such as stack=[frame={...},frame={...}]"""
+    if isinstance(value, str):
+        return mi_string(value)
+    elif isinstance(value, dict):
+        return "{" + ",".join(f"{k}={mi_value(v)}" for k, v in value.items()) + "}"
+    elif isinstance(value, tuple):
+        return f"{value[0]}={mi_value(value[1])}"
+    elif isinstance(value, list):
+        return "[" + ",".join(mi_value(v) for v in value) + "]"
+    raise TypeError(f"Can't serialize {value!r}")
+
+
+def mi_string(value: str) -> str:
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+    return f'"{escaped}"'
+
+
+def mi_results(results: Dict[str, Any]) -> str:
+    return "".join(f",{k}={mi_value(v)}" for k, v in results.items())
+
+
+class FakeGdb:
+    def __init__(
+        self,
+        mi_in: TextIO,
+        mi_out: TextIO,
+        user: TextIO,
+        program: Optional[TextIO],
+        *,
+        num_locals: int,
+        num_frames: int,
+        num_registers: int,
+        num_vector_registers: int = 0,
+        num_instructions: int = 1000,
+        disassemble_sec: float = 0,
+    ):
+        self.mi_in = mi_in
+        self.mi_out = mi_out
+        self.user = user
+        self.program = program
+        self.num_locals = num_locals
+        self.num_frames = num_frames
+        self.num_registers = num_registers
+        self.num_vector_registers = num_vector_registers
+        # register values as of the last -data-list-changed-registers
+        self.last_register_values: Dict[str, str] = {}
+        self.num_instructions = num_instructions
+        self.disassemble_sec = disassemble_sec
+        self.executable: Optional[str] = None
+        self.started = False
+        # advances every time the program "steps", so refreshed results change
+        self.line = 1
+        self.selected_frame = 0
+        self.breakpoints: List[Dict[str, str]] = []
+
+    def frame(self, level: int) -> Dict[str, str]:
+        return {
+            "level": str(level),
+            "addr": f"0x{0x401000 + level * 0x40:016x}",
+            "func": "main" if level == self.num_frames - 1 else f"func{level}",
+            "file": "main.c",
+            "fullname": "/tmp/main.c",
+            "line": str(self.line + level),
+            "arch": "i386:x86-64",
+        }
+
+    def variables(self) -> List[Dict[str, str]]:
+        return [
+            {
+                "name": f"var{i}",
+                "type": "int",
+                "value": str(self.line if i % 4 == 0 else i),
+            }
+            for i in range(self.num_locals)
+        ]
+
+    def run(self) -> None:
+        self.write_mi('=thread-group-added,id="i1"')
+        self.write_mi("(gdb) ")
+        for line in self.mi_in:
+            line = line.strip()
+            if not line:
+                continue
+            token, command, args = _COMMAND.match(line).groups()  # type: ignore
+            if command is None:
+                # cli commands, which are echoed like -interpreter-exec echoes its
+                # arguments
+                command, args = "-interpreter-exec", line
+            if command == "-gdb-exit":
+                self.write_mi(f"{token}^exit")
+                return
+            self.handle(token, command, args)
+            self.write_mi("(gdb) ")
+
+    def handle(self, token: str, command: str, args: str) -> None:
+        result: Optional[Tuple[str, Dict[str, Any]]] = ("done", {})
+        if command in ("-stack-list-variables", "-stack-list-locals"):
+            key = "variables" if command == "-stack-list-variables" else "locals"
+            result = ("done", {key: self.variables()})
+        elif command == "-stack-list-frames":
+            frames = [("frame", self.frame(i)) for i in range(self.num_frames)]
+            result = ("done", {"stack": frames})
+        elif command == "-stack-info-frame":
+            result = ("done", {"frame": self.frame(0)})
+        elif command == "-thread-info":
+            thread = {"id": "1", "target-id": "process 1", "frame": self.frame(0)}
+            result = ("done", {"threads": [thread], "current-thread-id": "1"})
+        elif command == "-data-list-register-names":
+            names = [f"r{i}" for i in range(self.num_registers)]
+            names += [f"zmm{i}" for i in range(self.num_vector_registers)]
+            result = ("done", {"register-names": names})
+        elif command == "-data-list-register-values":
+            values = self.register_values()
+            # the format comes first, then the numbers of the registers to list
+            numbers = args.split()[1:]
+            if numbers:
+                values = {number: values[number] for number in numbers}
+            register_values = [
+                {"number": number, "value": value} for number, value in values.items()
+            ]
+            result = ("done", {"register-values": register_values})
+        elif command == "-data-list-changed-registers":
+            values = self.register_values()
+            changed = [
+                number
+                for number, value in values.items()
+                if self.last_register_values.get(number) != value
+            ]
+            self.last_register_values = values
+            result = ("done", {"changed-registers": changed})
+        elif command == "-break-insert":
+            breakpoint = {
+                "number": str(len(self.breakpoints) + 1),
+                "type": "breakpoint",
+                "enabled": "y",
+                "func": args.split()[-1] if args else "main",
+                "file": "main.c",
+                "fullname": "/tmp/main.c",
+                "line": "1",
+            }
+            self.breakpoints.append(breakpoint)
+            result = ("done", {"bkpt": breakpoint})
+        elif command == "-break-list":
+            body = [("bkpt", b) for b in self.breakpoints]
+            result = ("done", {"BreakpointTable": {"body": body}})
+        elif command in ("-exec-run", "-exec-next", "-exec-step", "-exec-continue"):
+            if not self.started:
+                self.started = True
+                self.write_mi('=thread-group-started,id="i1",pid="4242"')
+            self.write_mi(f"{token}^running")
+            self.write_mi('*running,thread-id="all"')
+            self.line += 1
+            self.selected_frame = 0
+            stopped = {"reason": "end-stepping-range", "frame": self.frame(0)}
+            self.write_mi("*stopped" + mi_results(stopped))
+            result = None
+        elif command == "-stack-select-frame":
+            self.selected_frame = int(args)
+        elif command == "-file-exec-and-symbols":
+            self.executable = args
+        elif command == "-list-thread-groups":
+            group = {"id": "i1", "type": "process"}
+            if self.started:
+                group["pid"] = "4242"
+            if self.executable:
+                group["executable"] = self.executable
+            result = ("done", {"groups": [group]})
+        elif command == "-data-disassemble":
+            time.sleep(self.disassemble_sec)
+            result = ("done", {"asm_insns": self.instructions()})
+        elif command == "-data-read-memory-bytes":
+            result = self.read_memory_bytes(*args.split())
+        elif command == "-interpreter-exec":
+            self.write_mi("~" + mi_string(f"{args}\n"))
+        elif command == "-fake-flood":
+            self.flood(*args.split())
+        elif not command.startswith(("-file-", "-gdb-", "-environment-", "-enable-")):
+            result = ("error", {"msg": f'Undefined MI command: {command.lstrip("-")}'})
+        if result is not None:
+            self.write_mi(f"{token}^{result[0]}{mi_results(result[1])}")
+
+    def register_values(self) -> Dict[str, str]:
+        values = {str(i): hex(self.line * (i + 1)) for i in range(self.num_registers)}
+        if self.num_registers:
+            values["0"] = hex(0x401000 + self.selected_frame * 0x40 + self.line)
+        for i in range(self.num_vector_registers):
+            seed = self.line if i % 4 == 0 else i
+            lanes = {
+                f"v{64 // size}_int{size * 8}": "{"
+                + ", ".join(
+                    f"0x{seed + lane:0{size * 2}x}" for lane in range(64 // size)
+                )
+                + "}"
+                for size in (1, 2, 4, 8)
+            }
+            values[str(self.num_registers + i)] = (
+                "{" + ", ".join(f"{k} = {v}" for k, v in lanes.items()) + "}"
+            )
+        return values
+
+    def instructions(self) -> List[Dict[str, str]]:
+        return [
+            {
+                "address": f"0x{0x401000 + i * 4:016x}",
+                "func-name": "main",
+                "offset": str(i * 4),
+                "inst": f"mov    0x{i:x}(%rbp),%eax",
+            }
+            for i in range(self.num_instructions)
+        ]
+
+    def read_memory_bytes(self, addr: str, count: str) -> Tuple[str, Dict[str, Any]]:
+        start = max(int(addr, 16), MEMORY_START)
+        end = min(int(addr, 16) + int(count), MEMORY_START + MEMORY_BYTES)
+        if start >= end:
+            return ("error", {"msg": "Unable to read memory."})
+        block = {
+            "begin": f"0x{start:016x}",
+            "offset": f"0x{start - int(addr, 16):016x}",
+            "end": f"0x{end:016x}",
+            "contents": "".join(
+                f"{(self.line if a % MEMORY_LINE_STRIDE == 0 else a) & 0xFF:02x}"
+                for a in range(start, end)
+            ),
+        }
+        return ("done", {"memory": [block]})
+
+    def flood(self, target: str, total_bytes: str, bytes_per_sec: str = "0") -> None:
+        remaining = int(total_bytes)
+        rate = int(bytes_per_sec)
+        start = time.monotonic()
+        written = 0
+        while remaining > 0:
+            chunk = FLOOD_LINE[:remaining]
+            self.write_output(target, chunk)
+            remaining -= len(chunk)
+            written += len(chunk)
+            if rate:
+                delay = start + written / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        self.write_output(target, f"\n{FLOOD_END_MARKER}\n")
+
+    def write_output(self, target: str, output: str) -> None:
+        if target == "mi":
+            self.write_mi("~" + mi_string(output))
+        elif target == "user":
+            self.user.write(output)
+            self.user.flush()
+        elif target == "program" and self.program is not None:
+            self.program.write(output)
+            self.program.flush()
+        else:
+            raise ValueError(f"Unknown flood target {target}")
+
+    def write_mi(self, record: str) -> None:
+        self.mi_out.write(record + "\n")
+        self.mi_out.flush()
+
+
+def get_startup_ptys(startup_commands: List[str]) -> Dict[str, str]:
+    """Return the ptys named by the new-ui and inferior-tty startup commands"""
+    ptys = {}
+    for startup_command in startup_commands:
+        words = startup_command.split()
+        if words[:1] == ["new-ui"]:
+            ptys["mi"] = words[2]
+        elif words[:2] == ["set", "inferior-tty"]:
+            ptys["program"] = words[2]
+    return ptys
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-iex", action="append", default=[], dest="startup_commands")
+    parser.add_argument("--locals", type=int, default=20)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--registers", type=int, default=32)
+    parser.add_argument("--vector-registers", type=int, default=0)
+    parser.add_argument("--instructions", type=int, default=1000)
+    parser.add_argument("--disassemble-sec", type=float, default=0)
+    args = parser.parse_args(argv)
+
+    ptys = get_startup_ptys(args.startup_commands)
+    if "mi" not in ptys:
+        sys.exit("fakegdb.py must be started with -iex='new-ui mi2 <pty>'")
+    # like gdb, stop when the pty of the mi is closed
+    mi_fd = os.open(ptys["mi"], os.O_RDWR | os.O_NOCTTY)
+    # like gdb, write "\n" rather than "\r\n" line endings on the mi pty
+    tty.setraw(mi_fd, termios.TCSANOW)
+    program = None
+    if "program" in ptys:
+        program = open(os.open(ptys["program"], os.O_RDWR | os.O_NOCTTY), "w")
+    try:
+        FakeGdb(
+            open(mi_fd, "r"),
+            open(os.dup(mi_fd), "w"),
+            sys.stdout,
+            program,
+            num_locals=args.locals,
+            num_frames=args.frames,
+            num_registers=args.registers,
+            num_vector_registers=args.vector_registers,
+            num_instructions=args.instructions,
+            disassemble_sec=args.disassemble_sec,
+        ).run()
+    except OSError:
+        # the pty was closed
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -16,8 +16,18 @@ from typing import List, Optional
 
 from gdbgui import __version__
 from gdbgui.server.app import app, socketio
-from gdbgui.server.constants import DEFAULT_GDB_EXECUTABLE, DEFAULT_HOST, DEFAULT_PORT
+from gdbgui.server.constants import (
+    DEFAULT_GDB_EXECUTABLE,
+    DEFAULT_HIGHLIGHT_CACHE_MAX_MB,
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    DEFAULT_PTY_OUTPUT_BUFFER_MAX_CHARS,
+    DEFAULT_PTY_READ_BUDGET_BYTES,
+)
+from gdbgui.server.highlightcache import HighlightCache
+from gdbgui.server.mioutput import MI_PARSE_POOLS
 from gdbgui.server.server import run_server
+from gdbgui.server.sourcecache import find_source_files, preload_lexers_in_background
 
 
 logger = logging.getLogger(__name__)
@@ -106,6 +116,12 @@ def get_parser():
         "browser, or let someone else debug your application remotely.",
         action="store_true",
     )
+    network.add_argument(
+        "--asyncio",
+        help="Serve gdbgui from an asyncio event loop under uvicorn instead of eventlet. "
+        "Requires the optional dependencies installed by `pip install gdbgui[asyncio]`.",
+        action="store_true",
+    )
 
     security.add_argument(
         "--auth-file",
@@ -145,6 +161,60 @@ def get_parser():
         "--project",
         help='Set the project directory. When viewing the "folders" pane, paths are shown relative to this directory.',
     )
+    other.add_argument(
+        "--mi-parse-pool",
+        choices=MI_PARSE_POOLS,
+        default=None,
+        help="Parse gdb's machine interface output in a pool of worker threads or "
+        "processes, so a huge response in one debug session does not delay the "
+        "output of other debug sessions. By default it is parsed by the thread that "
+        "reads it.",
+    )
+    other.add_argument(
+        "--pty-read-budget-bytes",
+        type=int,
+        default=DEFAULT_PTY_READ_BUDGET_BYTES,
+        help="Maximum number of bytes read from the terminal of gdb or of the "
+        "debugged program before its output is sent to the browser, so a program "
+        "printing in a tight loop does not delay other debug sessions. "
+        "Default %(default)s.",
+    )
+    other.add_argument(
+        "--pty-output-buffer-max-chars",
+        type=int,
+        default=DEFAULT_PTY_OUTPUT_BUFFER_MAX_CHARS,
+        help="Number of characters of terminal output waiting to be sent to a "
+        "browser that cannot keep up above which the oldest output is dropped. "
+        "Default %(default)s.",
+    )
+    other.add_argument(
+        "--preload-lexers",
+        action="store_true",
+        help="Load the syntax highlighters of the languages of the files in the "
+        "project directory (--project) when gdbgui starts, and of the source files "
+        "of each executable that is loaded, so the first file opened in each "
+        "language is shown sooner.",
+    )
+    other.add_argument(
+        "--prehighlight-source-files",
+        action="store_true",
+        help="Highlight the source files of each executable that is loaded in the "
+        "background, starting with the files in the backtrace, so source files are "
+        "shown right away when gdb stops in them. Uses spare cpu time and up to half "
+        "of the memory of the source file cache.",
+    )
+    other.add_argument(
+        "--highlight-cache-dir",
+        help="Keep highlighted source code in this directory, so it is reused "
+        "after restarts and by other gdbgui processes using the same directory.",
+    )
+    other.add_argument(
+        "--highlight-cache-max-mb",
+        type=int,
+        default=DEFAULT_HIGHLIGHT_CACHE_MAX_MB,
+        help="Size of the --highlight-cache-dir directory above which the least "
+        "recently used source code is deleted. Default %(default)s.",
+    )
     other.add_argument("-v", "--version", help="Print version", action="store_true")
 
     other.add_argument(
@@ -217,6 +287,18 @@ def main():
         args.auth_file, args.user, args.password
     )
     app.config["project_home"] = args.project
+    app.config["mi_parse_pool"] = args.mi_parse_pool
+    app.config["pty_read_budget_bytes"] = args.pty_read_budget_bytes
+    app.config["pty_output_buffer_max_chars"] = args.pty_output_buffer_max_chars
+    app.config["preload_lexers"] = args.preload_lexers
+    app.config["prehighlight_source_files"] = args.prehighlight_source_files
+    if args.highlight_cache_dir:
+        app.config["_source_cache"].disk_cache = HighlightCache(
+            args.highlight_cache_dir,
+            max_bytes=args.highlight_cache_max_mb * 1024 * 1024,
+        )
+    if args.preload_lexers and args.project:
+        preload_lexers_in_background(find_source_files(args.project))
     if args.remap_sources:
         try:
             app.config["remap_sources"] = json.loads(args.remap_sources)
@@ -256,6 +338,7 @@ def main():
         browsername=args.browser,
         private_key=args.key,
         certificate=args.cert,
+        use_asyncio=args.asyncio,
     )
 
 
@@ -1,5 +1,16 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
 from pygments.formatters import HtmlFormatter  # type: ignore
 
+# what HtmlFormatter escapes in the values of tokens
+_ESCAPE_HTML_TABLE = {
+    ord("&"): "&amp;",
+    ord("<"): "&lt;",
+    ord(">"): "&gt;",
+    ord('"'): "&quot;",
+    ord("'"): "&#39;",
+}
+
 
 class HtmlListFormatter(HtmlFormatter):
     """A custom pygments class to format html. Returns a list of source code.
@@ -33,3 +44,82 @@ class HtmlListFormatter(HtmlFormatter):
             if html_line[IS_CODE_INDEX] == IS_CODE_VAL
         ]
         return source_list
+
+
+# opening tag of the span of each token type, or "" for types without a css
+# class. Token types are singletons, so this is shared by every file.
+_span_openers: Dict[Any, str] = {}
+_css_class_formatter = HtmlFormatter()
+
+
+def _get_span_opener(ttype: Any) -> str:
+    css_class = _css_class_formatter._get_css_classes(ttype)
+    span_opener = f'<span class="{css_class}">' if css_class else ""
+    _span_openers[ttype] = span_opener
+    return span_opener
+
+
+def get_marked_up_list(tokensource: Iterable[Tuple[Any, str]]) -> List[str]:
+    """Format tokens as a list of lines of html, the same as
+    HtmlListFormatter().get_marked_up_list, but without going through the
+    line wrappers and generators of HtmlFormatter, which only apply to
+    options gdbgui does not use.
+
+    Tokens of the same css class are merged into one span, and spans of
+    tokens that span several lines are closed at the end of each line and
+    reopened on the next one. Lines end with a newline.
+    """
+    span_openers = _span_openers
+    escape_table = _ESCAPE_HTML_TABLE
+    # the same identifiers, keywords and whitespace come up over and over, so
+    # they are only escaped once
+    escaped: Dict[str, str] = {}
+    lines: List[str] = []
+    append_line = lines.append
+    # parts of the current line, and the span that is open at its end
+    line: List[str] = []
+    lspan = ""
+    for ttype, value in tokensource:
+        cspan = span_openers.get(ttype)
+        if cspan is None:
+            cspan = _get_span_opener(ttype)
+        escaped_value = escaped.get(value)
+        if escaped_value is None:
+            escaped_value = escaped[value] = value.translate(escape_table)
+        if "\n" in escaped_value:
+            parts = escaped_value.split("\n")
+            # every part but the last one ends a line
+            for part in parts[:-1]:
+                if line:
+                    if lspan != cspan and part:
+                        line.extend(
+                            (
+                                lspan and "</span>",
+                                cspan,
+                                part,
+                                cspan and "</span>",
+                                "\n",
+                            )
+                        )
+                    else:
+                        line.extend((part, lspan and "</span>", "\n"))
+                    append_line("".join(line))
+                    line = []
+                elif part:
+                    append_line(f"{cspan}{part}{cspan and '</span>'}\n")
+                else:
+                    append_line("\n")
+            escaped_value = parts[-1]
+        if escaped_value:
+            if not line:
+                line = [cspan, escaped_value]
+                lspan = cspan
+            elif lspan != cspan:
+                line.extend((lspan and "</span>", cspan, escaped_value))
+                lspan = cspan
+            else:
+                line.append(escaped_value)
+    if line:
+        line.extend((lspan and "</span>", "\n"))
+        append_line("".join(line))
+    return lines
@@ -1,16 +1,32 @@
 import binascii
 import logging
 import os
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 import traceback
 from flask import Flask, abort, request, session
 from flask_compress import Compress  # type: ignore
-from flask_socketio import SocketIO, emit  # type: ignore
-
-from .constants import DEFAULT_GDB_EXECUTABLE, STATIC_DIR, TEMPLATE_DIR
+from flask_socketio import SocketIO, emit, join_room  # type: ignore
+
+from .constants import (
+    DEFAULT_DISASSEMBLY_CACHE_MAX_BYTES,
+    DEFAULT_GDB_EXECUTABLE,
+    DEFAULT_PTY_OUTPUT_BUFFER_MAX_CHARS,
+    DEFAULT_PTY_READ_BUDGET_BYTES,
+    DEFAULT_SOURCE_CACHE_MAX_BYTES,
+    PTY_OUTPUT_ACK_TIMEOUT_SEC,
+    STATIC_DIR,
+    TEMPLATE_DIR,
+)
+from .disassemblycache import DisassemblyCache
+from .forwarding import OutputForwarder
 from .http_routes import blueprint
 from .http_util import is_cross_origin
+from .mioutput import MiOutputParser, create_mi_parse_executor
+from .ptywatcher import PtyWatcher, get_selectors_module
 from .sessionmanager import SessionManager, DebugSession
+from .sourcecache import SourceCache, SourcePrehighlighter
+from .sourcewatcher import SourceFileChange, SourceWatcher
+from .wireencoding import JSON, encode_event_data, negotiate_encoding
 
 logger = logging.getLogger(__file__)
 # Create flask application and add some configuration keys to be used in various callbacks
@@ -25,10 +41,27 @@ app.config["gdb_command"] = None
 app.config["TEMPLATES_AUTO_RELOAD"] = True
 app.config["project_home"] = None
 app.config["remap_sources"] = {}
+app.config["pty_read_budget_bytes"] = DEFAULT_PTY_READ_BUDGET_BYTES
+app.config["pty_output_buffer_max_chars"] = DEFAULT_PTY_OUTPUT_BUFFER_MAX_CHARS
+app.config["mi_parse_pool"] = None
+app.config["preload_lexers"] = False
+app.config["prehighlight_source_files"] = False
+app.config["_source_cache"] = SourceCache(max_bytes=DEFAULT_SOURCE_CACHE_MAX_BYTES)
+app.config["_source_prehighlighter"] = SourcePrehighlighter(app.config["_source_cache"])
+app.config["_disassembly_cache"] = DisassemblyCache(
+    max_bytes=DEFAULT_DISASSEMBLY_CACHE_MAX_BYTES
+)
 manager = SessionManager()
 app.config["_manager"] = manager
 app.secret_key = binascii.hexlify(os.urandom(24)).decode("utf-8")
 socketio = SocketIO(manage_session=False)
+forwarder = OutputForwarder(
+    manager,
+    lambda event, data, room: socketio.emit(
+        event, data, namespace="/gdb_listener", room=room
+    ),
+    app.config,
+)
 
 
 @app.before_request
@@ -66,11 +99,37 @@ def client_connected():
         logger.warning("Received cross origin request. Aborting")
         abort(403)
 
-    csrf_token = request.args.get("csrf_token")
+    csrf_error = get_csrf_error(request.args.get("csrf_token"))
+    if csrf_error is not None:
+        emit("server_error", {"message": csrf_error})
+        return
+
+    debug_session, connection_event = connect_client(request.args, request.sid)
+    if debug_session is not None:
+        join_room(debug_session.get_client_room(request.sid))
+    emit("debug_session_connection_event", connection_event)
+
+    # Make sure there is a reader thread reading. One thread reads all instances.
+    if manager.gdb_reader_thread is None:
+        pty_watcher = PtyWatcher(get_selectors_module(socketio.async_mode))
+        manager.watch_ptys(pty_watcher)
+        manager.mi_output_parser = MiOutputParser(
+            create_mi_parse_executor(app.config["mi_parse_pool"]),
+            on_parsed=pty_watcher.wakeup,
+        )
+        manager.gdb_reader_thread = socketio.start_background_task(
+            read_and_forward_gdb_and_pty_output, pty_watcher
+        )
+        logger.info("Created background thread to read gdb responses")
+
+
+def get_csrf_error(csrf_token: Optional[str]) -> Optional[str]:
+    """Check the csrf token a websocket client connected with against the
+    one in its session. Returns the message to send to the client if it is
+    invalid."""
     if csrf_token is None:
         logger.warning("Recieved invalid csrf token")
-        emit("server_error", {"message": "Recieved invalid csrf token"})
-        return
+        return "Recieved invalid csrf token"
 
     elif csrf_token != session.get("csrf_token"):
         # this can happen fairly often, so log debug message, not warning
@@ -78,55 +137,58 @@ def client_connected():
             "Recieved invalid csrf token %s (expected %s)"
             % (csrf_token, str(session.get("csrf_token")))
         )
-        emit(
-            "server_error", {"message": "Session expired. Please refresh this webpage."}
-        )
-        return
-
-    desired_gdbpid = int(request.args.get("gdbpid", 0))
+        return "Session expired. Please refresh this webpage."
+    return None
+
+
+def connect_client(
+    args: Mapping[str, str], client_id: str
+) -> Tuple[Optional[DebugSession], Dict[str, Any]]:
+    """Connect a client to the debug session requested by the arguments it
+    connected with, starting a new one if needed. Returns the debug session,
+    or None if it failed, and the debug_session_connection_event to send to
+    the client."""
+    desired_gdbpid = int(args.get("gdbpid", 0))
+    # the encoding of the events with gdb and pty output
+    encoding = negotiate_encoding(args.get("encoding"))
+    # whether the client can apply diffs of repeated gdb responses
+    delta_updates = args.get("delta_updates") == "1"
     try:
         if desired_gdbpid:
             # connect to exiting debug session
             debug_session = manager.connect_client_to_debug_session(
-                desired_gdbpid=desired_gdbpid, client_id=request.sid
-            )
-            emit(
-                "debug_session_connection_event",
-                {
-                    "ok": True,
-                    "started_new_gdb_process": False,
-                    "pid": debug_session.pid,
-                    "message": f"Connected to existing gdb process {desired_gdbpid}",
-                },
+                desired_gdbpid=desired_gdbpid, client_id=client_id, encoding=encoding
             )
+            connection_event = {
+                "ok": True,
+                "started_new_gdb_process": False,
+                "pid": debug_session.pid,
+                "message": f"Connected to existing gdb process {desired_gdbpid}",
+            }
         else:
             # start new debug session
-            gdb_command = request.args.get("gdb_command", app.config["gdb_command"])
-            mi_version = request.args.get("mi_version", "mi2")
+            gdb_command = args.get("gdb_command", app.config["gdb_command"])
+            mi_version = args.get("mi_version", "mi2")
             debug_session = manager.add_new_debug_session(
-                gdb_command=gdb_command, mi_version=mi_version, client_id=request.sid
-            )
-            emit(
-                "debug_session_connection_event",
-                {
-                    "ok": True,
-                    "started_new_gdb_process": True,
-                    "message": f"Started new gdb process, pid {debug_session.pid}",
-                    "pid": debug_session.pid,
-                },
+                gdb_command=gdb_command,
+                mi_version=mi_version,
+                client_id=client_id,
+                encoding=encoding,
             )
+            connection_event = {
+                "ok": True,
+                "started_new_gdb_process": True,
+                "message": f"Started new gdb process, pid {debug_session.pid}",
+                "pid": debug_session.pid,
+            }
     except Exception as e:
-        emit(
-            "debug_session_connection_event",
-            {"message": f"Failed to establish gdb session: {e}", "ok": False},
-        )
+        return None, {"message": f"Failed to establish gdb session: {e}", "ok": False}
 
-    # Make sure there is a reader thread reading. One thread reads all instances.
-    if manager.gdb_reader_thread is None:
-        manager.gdb_reader_thread = socketio.start_background_task(
-            target=read_and_forward_gdb_and_pty_output
-        )
-        logger.info("Created background thread to read gdb responses")
+    if delta_updates:
+        debug_session.delta_clients.add(client_id)
+    connection_event["encoding"] = encoding
+    connection_event["delta_updates"] = delta_updates
+    return debug_session, connection_event
 
 
 @socketio.on("pty_interaction", namespace="/gdb_listener")
@@ -141,29 +203,48 @@ def pty_interaction(message):
         return
 
     try:
-        data = message.get("data")
-        pty_name = data.get("pty_name")
-        if pty_name == "user_pty":
-            pty = debug_session.pty_for_gdb
-        elif pty_name == "program_pty":
-            pty = debug_session.pty_for_debugged_program
-        else:
-            raise ValueError(f"Unknown pty: {pty_name}")
-
-        action = data.get("action")
-        if action == "write":
-            key = data["key"]
-            pty.write(key)
-        elif action == "set_winsize":
-            pty.set_winsize(data["rows"], data["cols"])
-        else:
-            raise ValueError(f"Unknown action {action}")
+        interact_with_pty(debug_session, request.sid, message.get("data"), forwarder)
     except Exception:
         err = traceback.format_exc()
         logger.error(err)
         emit("error_running_gdb_command", {"message": err})
 
 
+def interact_with_pty(
+    debug_session: DebugSession,
+    client_id: str,
+    data: Dict[str, Any],
+    output_forwarder: OutputForwarder,
+) -> None:
+    pty_name = data.get("pty_name")
+    if pty_name == "user_pty":
+        pty = debug_session.pty_for_gdb
+    elif pty_name == "program_pty":
+        pty = debug_session.pty_for_debugged_program
+    else:
+        raise ValueError(f"Unknown pty: {pty_name}")
+
+    action = data.get("action")
+    if action == "ack":
+        # the client finished processing the previous frame of output
+        pty_output_buffer = debug_session.pty_output_buffers.get(pty_name)
+        if pty_output_buffer is not None:
+            pty_output_buffer.ack(client_id)
+            output_forwarder.flush_pty_output(debug_session, pty_name)
+    elif action == "write":
+        key = data["key"]
+        pty.write(key)
+        if pty_name == "user_pty":
+            # a command entered on gdb's console may load another executable
+            commands = debug_session.disassembly.console_input_written(key)
+            if commands:
+                debug_session.write_mi_commands(commands)
+    elif action == "set_winsize":
+        pty.set_winsize(data["rows"], data["cols"])
+    else:
+        raise ValueError(f"Unknown action {action}")
+
+
 @socketio.on("run_gdb_command", namespace="/gdb_listener")
 def run_gdb_command(message: Dict[str, str]):
     """Write commands to gdbgui's gdb mi pty"""
@@ -172,132 +253,270 @@ def run_gdb_command(message: Dict[str, str]):
     if not debug_session:
         emit("error_running_gdb_command", {"message": "no session"})
         return
+    error = write_gdb_commands(debug_session, client_id, message, emit)
+    if error is not None:
+        emit("error_running_gdb_command", {"message": error})
+
+
+def write_gdb_commands(
+    debug_session: DebugSession,
+    client_id: str,
+    message: Dict[str, Any],
+    emit: Callable[[str, Any], None],
+) -> Optional[str]:
+    """Write the commands of a run_gdb_command message to the mi pty.
+    Disassembly that is cached is sent to the client right away instead.
+    Returns an error message if they could not be written."""
     pty_mi = debug_session.pygdbmi_controller
-    if pty_mi is not None:
-        try:
-            # the command (string) or commands (list) to run
-            cmds = message["cmd"]
-            for cmd in cmds:
-                pty_mi.write(
-                    cmd + "\n",
-                    timeout_sec=0,
-                    raise_error_on_timeout=False,
-                    read_response=False,
-                )
+    if pty_mi is None:
+        return "gdb is not running"
+    disassembly = debug_session.disassembly
+    disassembly_cache = app.config["_disassembly_cache"]
+    try:
+        # the command (string) or commands (list) to run
+        cmds = message["cmd"]
+        for cmd in cmds:
+            key = disassembly.get_key(cmd)
+            if key is not None:
+                cached = disassembly.get_cached_response(cmd, key, disassembly_cache)
+                if cached is not None:
+                    encoding = debug_session.client_encodings.get(client_id, JSON)
+                    emit(
+                        "gdb_response",
+                        encode_event_data("gdb_response", [cached], encoding),
+                    )
+                    continue
+                cmd = disassembly.rewrite_command(cmd, key)
+            pty_mi.write(
+                cmd + "\n",
+                timeout_sec=0,
+                raise_error_on_timeout=False,
+                read_response=False,
+            )
+            for line in cmd.split("\n"):
+                if line.strip():
+                    debug_session.response_deltas.command_written(line)
+                    own_cmds = disassembly.command_written(line)
+                    own_cmds += debug_session.register_reader.command_written(line)
+                    if own_cmds:
+                        debug_session.write_mi_commands(own_cmds)
+    except Exception:
+        err = traceback.format_exc()
+        logger.error(err)
+        return err
+    return None
 
-        except Exception:
-            err = traceback.format_exc()
-            logger.error(err)
-            emit("error_running_gdb_command", {"message": err})
-    else:
-        emit("error_running_gdb_command", {"message": "gdb is not running"})
 
+@socketio.on("read_memory", namespace="/gdb_listener")
+def read_memory(message: Dict[str, Any]):
+    """Read a range of the program's memory with a few gdb commands. It is
+    sent to the clients as a memory_response event."""
+    client_id = request.sid  # type: ignore
+    debug_session = manager.debug_session_from_client_id(client_id)
+    if not debug_session:
+        emit("error_running_gdb_command", {"message": "no session"})
+        return
+    read_memory_of_client(debug_session, client_id, message, emit)
+
+
+def read_memory_of_client(
+    debug_session: DebugSession,
+    client_id: str,
+    message: Dict[str, Any],
+    emit: Callable[[str, Any], None],
+) -> None:
+    """Write the commands that read the memory range of a read_memory message
+    to the mi pty. With watch set, the client watches the range, and only
+    what changed is sent unless full is set too. emit sends an event to the
+    client."""
+    memory_reader = debug_session.memory_reader
+    try:
+        start_addr = int(message["start_addr"], 16)
+        num_bytes = int(message["num_bytes"])
+        watch = bool(message.get("watch"))
+        full = not watch or bool(message.get("full"))
+        if watch and full:
+            snapshot = memory_reader.get_snapshot(start_addr, num_bytes)
+            if snapshot is not None:
+                # the program did not run since another client read it
+                memory_reader.watch(client_id, start_addr, num_bytes)
+                emit("memory_response", snapshot)
+                return
+        cmds = memory_reader.get_commands(
+            start_addr, num_bytes, client_id if watch else None, full
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        emit("server_error", {"message": f"Cannot read memory: {e}"})
+        return
+    if not cmds:
+        # the range is already being read
+        return
+    try:
+        # the memory reader takes their results out of gdb's output, so they
+        # are not passed to the response delta encoder
+        debug_session.write_mi_commands(cmds)
+    except Exception:
+        err = traceback.format_exc()
+        logger.error(err)
+        emit("server_error", {"message": err})
+
+
+@socketio.on("read_registers", namespace="/gdb_listener")
+def read_registers(message: Dict[str, Any]):
+    """Read the registers with gdb. They are sent to the clients as a
+    register_values event, and again whenever gdb stops."""
+    client_id = request.sid  # type: ignore
+    debug_session = manager.debug_session_from_client_id(client_id)
+    if not debug_session:
+        emit("error_running_gdb_command", {"message": "no session"})
+        return
+    read_registers_of_client(debug_session, client_id, message, emit)
+
+
+def read_registers_of_client(
+    debug_session: DebugSession,
+    client_id: str,
+    message: Dict[str, Any],
+    emit: Callable[[str, Any], None],
+) -> None:
+    """Write the commands that read the registers for a read_registers
+    message to the mi pty. Only the registers that changed are sent unless
+    full is set, and vector registers only if they are in expanded. emit
+    sends an event to the client."""
+    register_reader = debug_session.register_reader
+    try:
+        expanded = [str(number) for number in message.get("expanded", [])]
+        full = bool(message.get("full"))
+    except TypeError as e:
+        emit("server_error", {"message": f"Cannot read registers: {e}"})
+        return
+    if full:
+        snapshot = register_reader.get_snapshot(expanded)
+        if snapshot is not None:
+            # the program did not run since another client read them
+            register_reader.get_commands(client_id, expanded, full)
+            emit("register_values", snapshot)
+            return
+    cmds = register_reader.get_commands(client_id, expanded, full)
+    if not cmds:
+        # the registers are already being read
+        return
+    try:
+        debug_session.write_mi_commands(cmds)
+    except Exception:
+        err = traceback.format_exc()
+        logger.error(err)
+        emit("server_error", {"message": err})
+
+
+@socketio.on("resync_gdb_responses", namespace="/gdb_listener")
+def resync_gdb_responses(message: Dict[str, Any]):
+    """Send the latest full results of commands a client could not apply
+    diffs to"""
+    client_id = request.sid  # type: ignore
+    debug_session = manager.debug_session_from_client_id(client_id)
+    if debug_session:
+        emit("gdb_response", get_resync_response(debug_session, client_id, message))
 
-def send_msg_to_clients(client_ids, msg, error=False):
-    """Send message to all clients"""
-    if error:
-        stream = "stderr"
-    else:
-        stream = "stdout"
 
-    response = [{"message": None, "type": "console", "payload": msg, "stream": stream}]
+def get_resync_response(
+    debug_session: DebugSession, client_id: str, message: Dict[str, Any]
+) -> Any:
+    records = debug_session.response_deltas.get_latest(message["command_ids"])
+    encoding = debug_session.client_encodings.get(client_id, JSON)
+    return encode_event_data("gdb_response", records, encoding)
 
-    for client_id in client_ids:
-        logger.info("emiting message to websocket client id " + client_id)
-        socketio.emit(
-            "gdb_response", response, namespace="/gdb_listener", room=client_id
+
+@socketio.on("watch_source_files", namespace="/gdb_listener")
+def watch_source_files(message: Dict[str, Any]):
+    """Notify the clients of a debug session when any of these files change"""
+    if manager.source_watcher is None:
+        manager.source_watcher = SourceWatcher(
+            get_selectors_module(socketio.async_mode), socketio.sleep
+        )
+        socketio.start_background_task(
+            forward_source_file_changes, manager.source_watcher
         )
+        logger.info("Created background thread to watch source files")
+    watch_source_files_of_client(request.sid, message)  # type: ignore
+
+
+def watch_source_files_of_client(client_id: str, message: Dict[str, Any]) -> None:
+    debug_session = manager.debug_session_from_client_id(client_id)
+    if debug_session is None or manager.source_watcher is None:
+        return
+    for path in message.get("paths", []):
+        if isinstance(path, str) and os.path.isfile(path):
+            manager.source_watcher.watch(path, debug_session)
+
+
+def emit_source_file_changes(
+    changes: List[SourceFileChange], emit: Callable[[str, Any, str], None]
+) -> None:
+    """Drop changed files from the source cache, and send a
+    source_file_changed event to the debug sessions watching them"""
+    for change in changes:
+        app.config["_source_cache"].invalidate(change.path)
+        data = {
+            "path": change.path,
+            "last_modified_unix_sec": change.last_modified_unix_sec,
+        }
+        for debug_session in change.keys:
+            for encoding in debug_session.get_client_encodings():
+                emit("source_file_changed", data, debug_session.get_room(encoding))
+
+
+def forward_source_file_changes(source_watcher: SourceWatcher):
+    """A task that runs on a different thread, and emits source file changes.
+    It blocks until a watched file changes."""
+    while True:
+        try:
+            emit_source_file_changes(source_watcher.wait(), forwarder.emit)
+        except Exception:
+            logger.error("caught exception, continuing:" + traceback.format_exc())
+            socketio.sleep(1)
 
 
 @socketio.on("disconnect", namespace="/gdb_listener")
 def client_disconnected():
     """do nothing if client disconnects"""
-    manager.disconnect_client(request.sid)
+    disconnect_client(request.sid)
     logger.info("Client websocket disconnected, id %s" % (request.sid))
 
 
+def disconnect_client(client_id: str) -> None:
+    debug_session = manager.debug_session_from_client_id(client_id)
+    if debug_session:
+        # don't hold back output for the remaining clients
+        for pty_output_buffer in debug_session.pty_output_buffers.values():
+            pty_output_buffer.ack(client_id)
+        debug_session.memory_reader.unwatch(client_id)
+        debug_session.register_reader.unwatch(client_id)
+    manager.disconnect_client(client_id)
+
+
 @socketio.on("Client disconnected")
 def test_disconnect():
     print("Client websocket disconnected", request.sid)
 
 
-def read_and_forward_gdb_and_pty_output():
+def read_and_forward_gdb_and_pty_output(pty_watcher: PtyWatcher):
     """A task that runs on a different thread, and emits websocket messages
-    of gdb responses"""
+    of gdb responses. It blocks until one of the ptys of any debug session
+    has output, so it is idle while nothing is happening."""
 
     while True:
-        socketio.sleep(0.05)
-        debug_sessions_to_remove = []
-        for debug_session, client_ids in manager.debug_session_to_client_ids.items():
-            try:
-                try:
-                    response = debug_session.pygdbmi_controller.get_gdb_response(
-                        timeout_sec=0, raise_error_on_timeout=False
-                    )
-
-                except Exception:
-                    response = None
-                    send_msg_to_clients(
-                        client_ids,
-                        "The underlying gdb process has been killed. This tab will no longer function as expected.",
-                        error=True,
-                    )
-                    debug_sessions_to_remove.append(debug_session)
-
-                if response:
-                    for client_id in client_ids:
-                        logger.info(
-                            "emiting message to websocket client id " + client_id
-                        )
-                        socketio.emit(
-                            "gdb_response",
-                            response,
-                            namespace="/gdb_listener",
-                            room=client_id,
-                        )
-                else:
-                    # there was no queued response from gdb, not a problem
-                    pass
-
-            except Exception:
-                logger.error("caught exception, continuing:" + traceback.format_exc())
-
-        debug_sessions_to_remove += check_and_forward_pty_output()
-        for debug_session in set(debug_sessions_to_remove):
-            manager.remove_debug_session(debug_session)
-
-
-def check_and_forward_pty_output() -> List[DebugSession]:
-    debug_sessions_to_remove = []
-    for debug_session, client_ids in manager.debug_session_to_client_ids.items():
         try:
-            response = debug_session.pty_for_gdb.read()
-            if response is not None:
-                for client_id in client_ids:
-                    socketio.emit(
-                        "user_pty_response",
-                        response,
-                        namespace="/gdb_listener",
-                        room=client_id,
-                    )
-
-            response = debug_session.pty_for_debugged_program.read()
-            if response is not None:
-                for client_id in client_ids:
-                    socketio.emit(
-                        "program_pty_response",
-                        response,
-                        namespace="/gdb_listener",
-                        room=client_id,
-                    )
-        except Exception as e:
-            debug_sessions_to_remove.append(debug_session)
-            for client_id in client_ids:
-                socketio.emit(
-                    "fatal_server_error",
-                    {"message": str(e)},
-                    namespace="/gdb_listener",
-                    room=client_id,
+            ready = pty_watcher.wait(
+                timeout_sec=(
+                    PTY_OUTPUT_ACK_TIMEOUT_SEC
+                    if forwarder.buffered_pty_output
+                    else None
                 )
-            logger.error(e, exc_info=True)
-    return debug_sessions_to_remove
+            )
+        except Exception:
+            logger.error("caught exception, continuing:" + traceback.format_exc())
+            socketio.sleep(0.05)
+            continue
+
+        forwarder.forward_ready_output(ready)
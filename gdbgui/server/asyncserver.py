@@ -0,0 +1,261 @@
+"""Serve gdbgui from an asyncio event loop under an ASGI server (uvicorn),
+instead of Flask-SocketIO on eventlet
+
+The websocket events are handled by python-socketio's AsyncServer, and the
+ptys of every debug session are watched with `loop.add_reader`, so a single
+thread serves all debug sessions and clients. The Flask app still serves
+the HTTP routes, each request running on a pool of threads so blocking work
+like reading and highlighting a source file never blocks the event loop.
+
+This requires the optional dependencies uvicorn and a2wsgi, which are
+installed with `pip install gdbgui[asyncio]`.
+"""
+import asyncio
+import logging
+import traceback
+from typing import Any, Dict, Optional
+
+import socketio  # type: ignore
+from a2wsgi import WSGIMiddleware
+from flask import request
+
+from .app import (
+    app,
+    connect_client,
+    disconnect_client,
+    emit_source_file_changes,
+    get_csrf_error,
+    get_resync_response,
+    interact_with_pty,
+    manager,
+    read_memory_of_client,
+    read_registers_of_client,
+    watch_source_files_of_client,
+    write_gdb_commands,
+)
+from .constants import PTY_OUTPUT_ACK_TIMEOUT_SEC
+from .forwarding import OutputForwarder
+from .http_util import is_cross_origin
+from .mioutput import MiOutputParser, create_mi_parse_executor
+from .ptywatcher import AsyncioPtyWatcher
+from .sourcewatcher import POLL_INTERVAL_SEC, SourceWatcher
+
+logger = logging.getLogger(__name__)
+NAMESPACE = "/gdb_listener"
+# threads the HTTP requests of the Flask app are handled on
+HTTP_WORKERS = 32
+
+
+class AsyncioSocketServer:
+    """Handle the websocket events of gdbgui's clients and forward the output
+    of their debug sessions, all from one asyncio event loop"""
+
+    def __init__(self):
+        self.sio = socketio.AsyncServer(async_mode="asgi", allow_upgrades=False)
+        self.forwarder = OutputForwarder(manager, self._queue_emit, app.config)
+        # events are emitted by a single task, in the order they were queued,
+        # so forwarded output can be queued from plain callbacks of the loop
+        self._emit_queue: Optional[asyncio.Queue] = None
+        self._ack_timer: Optional[asyncio.TimerHandle] = None
+        self.sio.on("connect", self.client_connected, namespace=NAMESPACE)
+        self.sio.on("pty_interaction", self.pty_interaction, namespace=NAMESPACE)
+        self.sio.on("run_gdb_command", self.run_gdb_command, namespace=NAMESPACE)
+        self.sio.on("read_memory", self.read_memory, namespace=NAMESPACE)
+        self.sio.on("read_registers", self.read_registers, namespace=NAMESPACE)
+        self.sio.on(
+            "resync_gdb_responses", self.resync_gdb_responses, namespace=NAMESPACE
+        )
+        self.sio.on("watch_source_files", self.watch_source_files, namespace=NAMESPACE)
+        self.sio.on("disconnect", self.client_disconnected, namespace=NAMESPACE)
+
+    def create_asgi_app(self, http_workers: int = HTTP_WORKERS):
+        """Return the ASGI app serving both websockets and the Flask app, whose
+        requests are handled on a pool of http_workers threads"""
+        return socketio.ASGIApp(
+            self.sio,
+            other_asgi_app=WSGIMiddleware(
+                app, workers=http_workers  # type: ignore[arg-type]
+            ),
+        )
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        pty_watcher = AsyncioPtyWatcher(
+            loop,
+            on_readable=lambda key: self.forwarder.forward_ready_output([key]),
+            on_wakeup=self._on_wakeup,
+        )
+        manager.watch_ptys(pty_watcher)
+        manager.mi_output_parser = MiOutputParser(
+            create_mi_parse_executor(app.config["mi_parse_pool"]),
+            on_parsed=pty_watcher.wakeup,
+        )
+        self._emit_queue = asyncio.Queue()
+        manager.gdb_reader_thread = loop.create_task(self._send_queued_events())
+        logger.info("Watching ptys with the asyncio event loop")
+
+    def _on_wakeup(self) -> None:
+        self.forwarder.forward_gdb_responses()
+        self.forwarder.flush_buffered_pty_output()
+        if self.forwarder.buffered_pty_output and self._ack_timer is None:
+            # send output whose clients did not acknowledge the previous
+            # frame in time
+            self._ack_timer = asyncio.get_running_loop().call_later(
+                PTY_OUTPUT_ACK_TIMEOUT_SEC, self._on_ack_timeout
+            )
+
+    def _on_ack_timeout(self) -> None:
+        self._ack_timer = None
+        self._on_wakeup()
+
+    def _watch_source_files(self) -> None:
+        manager.source_watcher = SourceWatcher()
+        fd = manager.source_watcher.fileno()
+        if fd is not None:
+            asyncio.get_running_loop().add_reader(fd, self._forward_source_file_changes)
+        else:
+            self._poll_source_files()
+
+    def _forward_source_file_changes(self) -> None:
+        assert manager.source_watcher is not None
+        emit_source_file_changes(
+            manager.source_watcher.read_changes(), self._queue_emit
+        )
+
+    def _poll_source_files(self) -> None:
+        self._forward_source_file_changes()
+        asyncio.get_running_loop().call_later(
+            POLL_INTERVAL_SEC, self._poll_source_files
+        )
+
+    def _queue_emit(self, event: str, data: Any, to: str) -> None:
+        if self._emit_queue is not None:
+            self._emit_queue.put_nowait((event, data, to))
+
+    async def _send_queued_events(self) -> None:
+        assert self._emit_queue is not None
+        while True:
+            event, data, to = await self._emit_queue.get()
+            try:
+                await self.sio.emit(event, data, to=to, namespace=NAMESPACE)
+            except Exception:
+                logger.error("caught exception, continuing:" + traceback.format_exc())
+
+    async def client_connected(
+        self, sid: str, environ: Dict[str, Any], auth: Any = None
+    ) -> None:
+        if self._emit_queue is None:
+            self._start()
+
+        # the flask session (with the csrf token) is in the request's cookie
+        with app.request_context(environ):
+            if is_cross_origin(request):
+                logger.warning("Received cross origin request. Aborting")
+                raise socketio.exceptions.ConnectionRefusedError("cross origin")
+            csrf_error = get_csrf_error(request.args.get("csrf_token"))
+            if csrf_error is not None:
+                self._queue_emit("server_error", {"message": csrf_error}, sid)
+                return
+            debug_session, connection_event = connect_client(request.args, sid)
+
+        if debug_session is not None:
+            await self.sio.enter_room(
+                sid, debug_session.get_client_room(sid), namespace=NAMESPACE
+            )
+        self._queue_emit("debug_session_connection_event", connection_event, sid)
+
+    async def pty_interaction(self, sid: str, message: Dict[str, Any]) -> None:
+        debug_session = manager.debug_session_from_client_id(sid)
+        if not debug_session:
+            self._queue_emit(
+                "error_running_gdb_command",
+                {"message": f"no gdb session available for client id {sid}"},
+                sid,
+            )
+            return
+        try:
+            interact_with_pty(debug_session, sid, message["data"], self.forwarder)
+        except Exception:
+            err = traceback.format_exc()
+            logger.error(err)
+            self._queue_emit("error_running_gdb_command", {"message": err}, sid)
+
+    async def run_gdb_command(self, sid: str, message: Dict[str, Any]) -> None:
+        debug_session = manager.debug_session_from_client_id(sid)
+        if not debug_session:
+            self._queue_emit(
+                "error_running_gdb_command", {"message": "no session"}, sid
+            )
+            return
+        error = write_gdb_commands(
+            debug_session,
+            sid,
+            message,
+            lambda event, data: self._queue_emit(event, data, sid),
+        )
+        if error is not None:
+            self._queue_emit("error_running_gdb_command", {"message": error}, sid)
+
+    async def read_memory(self, sid: str, message: Dict[str, Any]) -> None:
+        debug_session = manager.debug_session_from_client_id(sid)
+        if not debug_session:
+            self._queue_emit(
+                "error_running_gdb_command", {"message": "no session"}, sid
+            )
+            return
+        read_memory_of_client(
+            debug_session,
+            sid,
+            message,
+            lambda event, data: self._queue_emit(event, data, sid),
+        )
+
+    async def read_registers(self, sid: str, message: Dict[str, Any]) -> None:
+        debug_session = manager.debug_session_from_client_id(sid)
+        if not debug_session:
+            self._queue_emit(
+                "error_running_gdb_command", {"message": "no session"}, sid
+            )
+            return
+        read_registers_of_client(
+            debug_session,
+            sid,
+            message,
+            lambda event, data: self._queue_emit(event, data, sid),
+        )
+
+    async def resync_gdb_responses(self, sid: str, message: Dict[str, Any]) -> None:
+        debug_session = manager.debug_session_from_client_id(sid)
+        if debug_session:
+            self._queue_emit(
+                "gdb_response", get_resync_response(debug_session, sid, message), sid
+            )
+
+    async def watch_source_files(self, sid: str, message: Dict[str, Any]) -> None:
+        if manager.source_watcher is None:
+            self._watch_source_files()
+        watch_source_files_of_client(sid, message)
+
+    async def client_disconnected(self, sid: str, *args: Any) -> None:
+        disconnect_client(sid)
+        logger.info("Client websocket disconnected, id %s" % sid)
+
+
+def run_asyncio_server(
+    *,
+    host: str,
+    port: int,
+    debug: bool,
+    private_key: Optional[str] = None,
+    certificate: Optional[str] = None,
+) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        AsyncioSocketServer().create_asgi_app(),
+        host=host,
+        port=port,
+        log_level="debug" if debug else "info",
+        ssl_keyfile=private_key,
+        ssl_certfile=certificate,
+    )
@@ -6,6 +6,21 @@ from pathlib import Path
 DEFAULT_GDB_EXECUTABLE = "gdb"
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 5000
+# maximum number of bytes read from a pty before its output is forwarded
+DEFAULT_PTY_READ_BUDGET_BYTES = 1024 * 1024
+# high-water mark of pty output waiting to be sent to the browser, per pty,
+# in characters of decoded output rather than bytes. Older output is dropped
+# above it.
+DEFAULT_PTY_OUTPUT_BUFFER_MAX_CHARS = 512 * 1024
+# how long to wait for clients to acknowledge a frame of pty output before
+# sending the next one anyway
+PTY_OUTPUT_ACK_TIMEOUT_SEC = 1.0
+# memory used by the cache of (highlighted) source files served to the browser
+DEFAULT_SOURCE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# memory used by the cache of gdb's disassembly shared by debug sessions
+DEFAULT_DISASSEMBLY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# size of the optional directory of highlighted source code shared by processes
+DEFAULT_HIGHLIGHT_CACHE_MAX_MB = 1024
 USING_WINDOWS = os.name == "nt"
 IS_A_TTY = sys.stdout.isatty()
 pyinstaller_base_dir = getattr(sys, "_MEIPASS", None)
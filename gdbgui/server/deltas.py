@@ -0,0 +1,159 @@
+"""Send the results of the commands the frontend runs every time gdb pauses
+as structural diffs against their previous result
+
+Every mi command produces exactly one result record, in the order the
+commands were written, so the command of each result record is known by
+keeping the written commands in a queue. The latest payload of each
+command in DELTA_COMMANDS is kept, along with a version. When all clients of
+a debug session support it, a result record of one of those commands is
+sent with a diff against the previous version rather than its payload.
+A client that does not have the previous version asks for the latest full
+records instead.
+
+Diffs are nested lists:
+    ["r", value]                        replace with value
+    ["d", {key: diff}, [removed keys]]  patch a dict
+    ["l", length, {index: diff}]        patch a list, truncated or extended to length
+and None means unchanged.
+"""
+import re
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# commands run by the frontend whenever gdb pauses, whose results are often
+# almost identical to the previous time
+DELTA_COMMANDS = (
+    "-stack-list-variables",
+    "-stack-list-locals",
+    "-stack-list-arguments",
+    "-stack-list-frames",
+    "-var-update",
+    "-data-list-register-values",
+    "-data-list-changed-registers",
+    "-thread-info",
+    "-break-list",
+)
+_MI_TOKEN = re.compile(r"^\d+")
+
+
+def diff(old: Any, new: Any) -> Optional[List[Any]]:
+    """Return a diff that turns old into new, or None if they are equal"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {}
+        for key, value in new.items():
+            if key in old:
+                value_diff = diff(old[key], value)
+                if value_diff is not None:
+                    changed[key] = value_diff
+            else:
+                changed[key] = ["r", value]
+        removed = [key for key in old if key not in new]
+        if changed or removed:
+            return ["d", changed, removed]
+        return None
+    elif isinstance(old, list) and isinstance(new, list):
+        changed = {}
+        for i, value in enumerate(new):
+            if i < len(old):
+                value_diff = diff(old[i], value)
+                if value_diff is not None:
+                    changed[str(i)] = value_diff
+            else:
+                changed[str(i)] = ["r", value]
+        if changed or len(old) != len(new):
+            return ["l", len(new), changed]
+        return None
+    elif type(old) is type(new) and old == new:
+        return None
+    return ["r", new]
+
+
+def apply_diff(old: Any, value_diff: Optional[List[Any]]) -> Any:
+    """Return old with value_diff applied. old is not modified."""
+    if value_diff is None:
+        return old
+    op = value_diff[0]
+    if op == "r":
+        return value_diff[1]
+    elif op == "d":
+        _, changed, removed = value_diff
+        new = {key: value for key, value in old.items() if key not in removed}
+        for key, value_diff in changed.items():
+            new[key] = apply_diff(old.get(key), value_diff)
+        return new
+    elif op == "l":
+        _, length, changed = value_diff
+        new_list = old[:length]
+        new_list += [None] * (length - len(new_list))
+        for index, value_diff in changed.items():
+            i = int(index)
+            new_list[i] = apply_diff(new_list[i], value_diff)
+        return new_list
+    raise ValueError(f"Unknown diff operation {op}")
+
+
+class ResponseDeltaEncoder:
+    """Replace the payloads of result records of DELTA_COMMANDS with diffs,
+    for a single debug session
+
+    Records of those commands get a "payload_version" field of
+    [command id, version], and either their "payload", or a "payload_delta"
+    field of [base version, diff] instead.
+    """
+
+    def __init__(self):
+        # command ids of the written commands waiting for their result, with
+        # None for commands whose result is sent as is
+        self._pending_commands: Deque[Optional[int]] = deque()
+        self._command_ids: Dict[str, int] = {}
+        # latest version and full record of each command id
+        self._latest: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+
+    def command_written(self, cmd: str) -> None:
+        command = _MI_TOKEN.sub("", cmd.strip())
+        if not command.startswith(DELTA_COMMANDS):
+            self._pending_commands.append(None)
+            return
+        command_id = self._command_ids.setdefault(command, len(self._command_ids))
+        self._pending_commands.append(command_id)
+
+    def encode(
+        self, responses: List[Dict[str, Any]], send_deltas: bool
+    ) -> List[Dict[str, Any]]:
+        """Return the responses, with versions and (if send_deltas) diffs
+        added to the result records of DELTA_COMMANDS"""
+        encoded = []
+        for response in responses:
+            if response.get("type") != "result":
+                encoded.append(response)
+                continue
+            # results of commands written by something other than gdbgui,
+            # i.e. when gdb starts, would be sent as is
+            command_id = (
+                self._pending_commands.popleft() if self._pending_commands else None
+            )
+            if command_id is None:
+                encoded.append(response)
+                continue
+
+            previous = self._latest.get(command_id)
+            version = previous[0] + 1 if previous else 0
+            self._latest[command_id] = (version, response)
+            record = dict(response, payload_version=[command_id, version])
+            if send_deltas and previous is not None:
+                record.pop("payload", None)
+                record["payload_delta"] = [
+                    previous[0],
+                    diff(previous[1].get("payload"), response.get("payload")),
+                ]
+            encoded.append(record)
+        return encoded
+
+    def get_latest(self, command_ids: List[int]) -> List[Dict[str, Any]]:
+        """Return the latest full records of command_ids, to resync a client"""
+        records = []
+        for command_id in command_ids:
+            if command_id in self._latest:
+                version, response = self._latest[command_id]
+                records.append(dict(response, payload_version=[command_id, version]))
+        return records
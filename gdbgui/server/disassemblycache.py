@@ -0,0 +1,355 @@
+"""Cache of gdb's disassembly, shared by every debug session
+
+Disassembling a large function takes gdb seconds, and sessions debugging
+the same executable ask it for the same disassembly. The results of
+-data-disassemble commands are cached by the command's arguments (an
+address range, or a file and line) and by what else determines them.
+Commands with expressions for arguments, such as $pc, are not cached since
+their values change as the program runs. Results depend on:
+
+- the executable, identified by its ELF build-id, or its path, size and
+  modification time if it has none
+- the gdb command the session was started with
+- the disassembly flavor
+- whether the program was started, which relocates position independent
+  code and loads shared libraries. Programs that were started are only
+  cached while gdb disables address space randomization (its default), so
+  every run of them has the same addresses.
+
+Each session learns which executable gdb debugs by writing
+-list-thread-groups after commands that can change it, whether they are
+mi commands or typed on gdb's console, and caches nothing until the result
+comes back. Commands written by gdbgui for the cache have
+mi tokens of their own, so their results can be taken out of gdb's output
+(or given the client's token back) before it is forwarded.
+"""
+import json
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# well above the tokens of the frontend and of memory reads
+DISASSEMBLY_TOKEN_BASE = 2_000_000_000
+# commands after which gdb may debug another executable
+EXECUTABLE_COMMANDS = {
+    "-file-exec-and-symbols",
+    "-file-exec-file",
+    "-file-symbol-file",
+    "-target-attach",
+    "-target-select",
+    "-environment-cd",
+    "-interpreter-exec",
+    "file",
+    "exec-file",
+    "symbol-file",
+    "add-symbol-file",
+    "attach",
+    "target",
+    "core",
+    "core-file",
+    "cd",
+}
+_MI_TOKEN = re.compile(r"^\d+")
+_ADDRESS = r"(?:0x[0-9a-fA-F]+|\d+)"
+# -data-disassemble commands with numeric address ranges, or files and lines
+_CACHED_DISASSEMBLY = re.compile(
+    r"^-data-disassemble\s+"
+    rf"(?:-s\s+{_ADDRESS}\s+-e\s+{_ADDRESS}|-f\s+\S+\s+-l\s+\d+(?:\s+-n\s+-?\d+)?)"
+    r"(?:\s+--\s+\d+)?$"
+)
+_SETTING = re.compile(
+    r"^(?:set|-gdb-set)\s+(disassembly-flavor|disable-randomization)\s+(\S+)"
+)
+_PT_NOTE = 4
+_NT_GNU_BUILD_ID = 3
+
+
+def get_build_id(path: str) -> Optional[str]:
+    """Return the GNU build-id of an ELF file as hex digits, or None"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(64)
+            if header[:4] != b"\x7fELF":
+                return None
+            is_64_bit = header[4] == 2
+            endian = "<" if header[5] == 1 else ">"
+            if is_64_bit:
+                (phoff,) = struct.unpack_from(endian + "Q", header, 32)
+                phentsize, phnum = struct.unpack_from(endian + "HH", header, 54)
+            else:
+                (phoff,) = struct.unpack_from(endian + "I", header, 28)
+                phentsize, phnum = struct.unpack_from(endian + "HH", header, 42)
+            f.seek(phoff)
+            program_headers = f.read(phentsize * phnum)
+            for i in range(phnum):
+                if is_64_bit:
+                    (
+                        p_type,
+                        _,
+                        p_offset,
+                        _,
+                        _,
+                        p_filesz,
+                        _,
+                        p_align,
+                    ) = struct.unpack_from(
+                        endian + "IIQQQQQQ", program_headers, i * phentsize
+                    )
+                else:
+                    (
+                        p_type,
+                        p_offset,
+                        _,
+                        _,
+                        p_filesz,
+                        _,
+                        _,
+                        p_align,
+                    ) = struct.unpack_from(
+                        endian + "IIIIIIII", program_headers, i * phentsize
+                    )
+                if p_type != _PT_NOTE:
+                    continue
+                f.seek(p_offset)
+                build_id = _find_build_id(
+                    f.read(p_filesz), endian, 8 if p_align == 8 else 4
+                )
+                if build_id is not None:
+                    return build_id
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def _find_build_id(notes: bytes, endian: str, align: int) -> Optional[str]:
+    pos = 0
+    while pos + 12 <= len(notes):
+        namesz, descsz, note_type = struct.unpack_from(endian + "III", notes, pos)
+        name_start = pos + 12
+        desc_start = name_start + -(-namesz // align) * align
+        if (
+            note_type == _NT_GNU_BUILD_ID
+            and notes[name_start : name_start + namesz] == b"GNU\0"
+        ):
+            return notes[desc_start : desc_start + descsz].hex()
+        pos = desc_start + -(-descsz // align) * align
+    return None
+
+
+def get_executable_key(path: str) -> Optional[str]:
+    """Return what identifies the build of an executable, or None if it
+    can't be read"""
+    build_id = get_build_id(path)
+    if build_id:
+        return f"build-id:{build_id}"
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class DisassemblyCache:
+    """LRU cache of the payloads of -data-disassemble results, holding up
+    to max_bytes of them (as json)"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._num_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Tuple, payload: Dict[str, Any]) -> None:
+        size_bytes = len(json.dumps(payload))
+        if size_bytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._num_bytes -= previous[1]
+            self._entries[key] = (payload, size_bytes)
+            self._num_bytes += size_bytes
+            while self._num_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._num_bytes -= evicted_bytes
+
+
+class SessionDisassembly:
+    """What the disassembly of a debug session's commands is cached by, and
+    the -data-disassemble and -list-thread-groups commands written for the
+    cache that are waiting for their results"""
+
+    def __init__(self, gdb_command: str):
+        self.gdb_command = gdb_command
+        # None until gdb says which executable it debugs
+        self.executable_key: Optional[str] = None
+        self.flavor = "att"
+        self.disable_randomization = True
+        self.program_started = False
+        # -list-thread-groups commands waiting for their results
+        self._executable_lookups: Set[int] = set()
+        # client token and cache key of each -data-disassemble command
+        self._disassembly: Dict[int, Tuple[Optional[int], Tuple]] = {}
+        self._next_token = DISASSEMBLY_TOKEN_BASE
+        # the line being typed on gdb's console, or None if it was edited in
+        # a way that can't be followed, like recalling history
+        self._console_line: Optional[str] = ""
+
+    def get_key(self, cmd: str) -> Optional[Tuple]:
+        """Return the cache key of the result of cmd, or None if it is not
+        cached"""
+        command = _MI_TOKEN.sub("", cmd.strip())
+        if (
+            not _CACHED_DISASSEMBLY.match(command)
+            or "\n" in command
+            or self.executable_key is None
+            or self._executable_lookups
+            or (self.program_started and not self.disable_randomization)
+        ):
+            return None
+        return (
+            self.gdb_command,
+            self.executable_key,
+            self.flavor,
+            self.program_started,
+            command,
+        )
+
+    def get_cached_response(
+        self, cmd: str, key: Tuple, cache: DisassemblyCache
+    ) -> Optional[Dict[str, Any]]:
+        """Return the result record gdb would respond to cmd with, if its
+        payload is cached"""
+        payload = cache.get(key)
+        if payload is None:
+            return None
+        token = _MI_TOKEN.match(cmd.strip())
+        return {
+            "type": "result",
+            "message": "done",
+            "payload": payload,
+            "token": int(token.group()) if token else None,
+            "stream": "stdout",
+        }
+
+    def rewrite_command(self, cmd: str, key: Tuple) -> str:
+        """Give cmd a token of its own, so its result can be cached"""
+        cmd = cmd.strip()
+        token = _MI_TOKEN.match(cmd)
+        self._disassembly[self._next_token] = (
+            int(token.group()) if token else None,
+            key,
+        )
+        self._next_token += 1
+        return f"{self._next_token - 1}{_MI_TOKEN.sub('', cmd)}"
+
+    def command_written(self, cmd: str) -> List[str]:
+        """Keep track of the settings a command changes. Returns the commands
+        to write to learn which executable gdb debugs, if it may have
+        changed."""
+        command = _MI_TOKEN.sub("", cmd.strip())
+        setting = _SETTING.match(command)
+        if setting:
+            self._set(*setting.groups())
+        words = command.split(None, 1)
+        if words and words[0] in EXECUTABLE_COMMANDS:
+            return self.get_executable_commands()
+        return []
+
+    def console_input_written(self, key: str) -> List[str]:
+        """Keep track of the keys typed on gdb's console. Returns the commands
+        to write to learn which executable gdb debugs, if a command that was
+        entered may have changed it."""
+        commands: List[str] = []
+        for char in key:
+            line = self._console_line
+            if char in "\r\n":
+                self._console_line = ""
+                if line is None:
+                    new_commands = self.get_executable_commands()
+                else:
+                    new_commands = self.command_written(line)
+                if not commands:
+                    commands = new_commands
+            elif line is None:
+                continue
+            elif char in "\x7f\b":
+                self._console_line = line[:-1]
+            elif char in "\x03\x15":
+                # ctrl-c and ctrl-u discard the line
+                self._console_line = ""
+            elif char < " ":
+                # escape sequences and tab completion
+                self._console_line = None
+            else:
+                self._console_line = line + char
+        return commands
+
+    def get_executable_commands(self) -> List[str]:
+        """Return the commands to write to learn which executable gdb debugs"""
+        self._executable_lookups.add(self._next_token)
+        self._next_token += 1
+        return [f"{self._next_token - 1}-list-thread-groups"]
+
+    def _set(self, name: str, value: str) -> None:
+        if name == "disassembly-flavor":
+            self.flavor = value
+        elif name == "disable-randomization":
+            self.disable_randomization = value in ("on", "1", "yes", "enable")
+
+    def take_results(
+        self, responses: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Tuple[Tuple, Dict[str, Any]]]]:
+        """Return the responses without the results of -list-thread-groups
+        commands written for the cache, and with the tokens of clients given
+        back to -data-disassemble results, along with the (key, payload) of
+        each disassembly to cache"""
+        remaining = []
+        to_cache = []
+        for response in responses:
+            if response.get("type") == "notify":
+                self._notified(response)
+            elif response.get("type") == "result" and response.get("token"):
+                token = response["token"]
+                if token in self._executable_lookups:
+                    self._executable_lookups.discard(token)
+                    self._found_executable(response)
+                    continue
+                if token in self._disassembly:
+                    client_token, key = self._disassembly.pop(token)
+                    if response.get("message") == "done":
+                        to_cache.append((key, response["payload"]))
+                    response = dict(response, token=client_token)
+            remaining.append(response)
+        return remaining, to_cache
+
+    def _notified(self, response: Dict[str, Any]) -> None:
+        message = response.get("message")
+        payload = response.get("payload") or {}
+        if message == "thread-group-started":
+            self.program_started = True
+        elif message == "thread-group-exited":
+            self.program_started = False
+        elif message == "cmd-param-changed":
+            # settings changed on gdb's console
+            self._set(payload.get("param", ""), payload.get("value", ""))
+
+    def _found_executable(self, response: Dict[str, Any]) -> None:
+        groups = (response.get("payload") or {}).get("groups") or []
+        executable = groups[0].get("executable") if groups else None
+        if response.get("message") != "done" or not executable:
+            self.executable_key = None
+            return
+        self.executable_key = get_executable_key(executable)
+        self.program_started = "pid" in groups[0]
@@ -0,0 +1,216 @@
+import errno
+import logging
+import traceback
+from typing import Any, Callable, Iterable, List, Mapping, Set, Tuple
+
+from .constants import PTY_OUTPUT_ACK_TIMEOUT_SEC
+from .outputbuffer import PtyOutputBuffer
+from .sessionmanager import MI_PTY, PROGRAM_PTY, USER_PTY, DebugSession, SessionManager
+from .wireencoding import encode_event_data
+
+logger = logging.getLogger(__name__)
+
+PTY_RESPONSE_EVENTS = {
+    USER_PTY: "user_pty_response",
+    PROGRAM_PTY: "program_pty_response",
+}
+
+
+class OutputForwarder:
+    """Read the output of the ptys of debug sessions and emit it to the
+    socketio room of each debug session
+
+    This is shared by the eventlet and asyncio servers, which only differ in
+    how they wait for ptys to become readable and how they emit events.
+    `emit` is called with the event name, its data and the room to send it to.
+    Data is encoded once for each encoding the clients of a debug session use.
+    """
+
+    def __init__(
+        self,
+        manager: SessionManager,
+        emit: Callable[[str, Any, str], None],
+        config: Mapping[str, Any],
+    ):
+        self.manager = manager
+        self.emit = emit
+        self.config = config
+        # ptys with output that was held back until their clients acknowledge
+        # the previous frame
+        self.buffered_pty_output: Set[Tuple[DebugSession, str]] = set()
+
+    def forward_ready_output(self, ready: Iterable[Tuple[DebugSession, str]]) -> None:
+        """Read and forward the output of the readable ptys identified by
+        (debug_session, pty_name) keys"""
+        debug_sessions_to_remove = []
+        for debug_session, pty_name in ready:
+            if debug_session not in self.manager.debug_session_to_client_ids:
+                # debug session was removed after its pty became readable
+                continue
+            if pty_name == MI_PTY:
+                debug_sessions_to_remove += self.read_gdb_mi_output(debug_session)
+            else:
+                debug_sessions_to_remove += self.check_and_forward_pty_output(
+                    debug_session, pty_name
+                )
+
+        # responses parsed inline, or by workers that finished since the last pass
+        self.forward_gdb_responses()
+        self.flush_buffered_pty_output()
+
+        for debug_session in set(debug_sessions_to_remove):
+            self.manager.remove_debug_session(debug_session)
+
+    def send_msg_to_debug_session(
+        self, debug_session: DebugSession, msg: str, error: bool = False
+    ) -> None:
+        """Send message to all clients of a debug session"""
+        if error:
+            stream = "stderr"
+        else:
+            stream = "stdout"
+
+        response = [
+            {"message": None, "type": "console", "payload": msg, "stream": stream}
+        ]
+        self.emit_to_debug_session(debug_session, "gdb_response", response)
+
+    def emit_to_debug_session(
+        self, debug_session: DebugSession, event: str, data: Any
+    ) -> None:
+        for encoding in debug_session.get_client_encodings():
+            self.emit(
+                event,
+                encode_event_data(event, data, encoding),
+                debug_session.get_room(encoding),
+            )
+
+    def read_gdb_mi_output(self, debug_session: DebugSession) -> List[DebugSession]:
+        """Read gdb's mi output and hand it to the mi output parser. It is
+        forwarded by forward_gdb_responses once it is parsed."""
+        try:
+            output = debug_session.pty_for_gdbgui.read(
+                max_bytes=self.config["pty_read_budget_bytes"]
+            )
+        except Exception:
+            self.send_msg_to_debug_session(
+                debug_session,
+                "The underlying gdb process has been killed. This tab will no longer function as expected.",
+                error=True,
+            )
+            return [debug_session]
+        if output is not None:
+            self.manager.mi_output_parser.feed(debug_session, output)
+        return []
+
+    def forward_gdb_responses(self) -> None:
+        for debug_session, response in self.manager.mi_output_parser.get_parsed():
+            if debug_session not in self.manager.debug_session_to_client_ids:
+                continue
+            try:
+                response, memory_reads = debug_session.memory_reader.take_results(
+                    response
+                )
+                (
+                    response,
+                    register_reads,
+                    mi_cmds,
+                ) = debug_session.register_reader.take_results(response)
+                response, disassembly = debug_session.disassembly.take_results(response)
+                for key, payload in disassembly:
+                    self.config["_disassembly_cache"].put(key, payload)
+                for memory_read in memory_reads:
+                    self.emit_to_debug_session(
+                        debug_session, "memory_response", memory_read
+                    )
+                for register_read in register_reads:
+                    self.emit_to_debug_session(
+                        debug_session, "register_values", register_read
+                    )
+                if response:
+                    # watched memory and registers are read again whenever gdb
+                    # stops
+                    mi_cmds += debug_session.memory_reader.get_refresh_commands(
+                        response
+                    ) + debug_session.register_reader.get_refresh_commands(response)
+                    response = debug_session.response_deltas.encode(
+                        response, debug_session.sends_deltas()
+                    )
+                    # the payload is serialized once and broadcast to every
+                    # client in the debug session's room
+                    logger.debug("emiting gdb response to room " + debug_session.room)
+                    self.emit_to_debug_session(debug_session, "gdb_response", response)
+                if mi_cmds:
+                    debug_session.write_mi_commands(mi_cmds)
+            except Exception:
+                logger.error("caught exception, continuing:" + traceback.format_exc())
+
+    def check_and_forward_pty_output(
+        self, debug_session: DebugSession, pty_name: str
+    ) -> List[DebugSession]:
+        debug_sessions_to_remove = []
+        try:
+            pty = debug_session.get_ptys()[pty_name]
+            response = pty.read(max_bytes=self.config["pty_read_budget_bytes"])
+            if response is not None:
+                self.get_pty_output_buffer(debug_session, pty_name).append(response)
+                self.flush_pty_output(debug_session, pty_name)
+        except Exception as e:
+            debug_sessions_to_remove.append(debug_session)
+            if isinstance(e, OSError) and e.errno == errno.EIO:
+                # the process on the other end of the pty exited, which ends
+                # the debug session rather than being an error of the server
+                logger.info(f"{pty_name} of gdb pid {debug_session.pid} was closed")
+                self.send_msg_to_debug_session(
+                    debug_session,
+                    "gdb exited. This tab will no longer function as expected.",
+                    error=True,
+                )
+            else:
+                self.emit_to_debug_session(
+                    debug_session, "fatal_server_error", {"message": str(e)}
+                )
+                logger.error(e, exc_info=True)
+        return debug_sessions_to_remove
+
+    def get_pty_output_buffer(
+        self, debug_session: DebugSession, pty_name: str
+    ) -> PtyOutputBuffer:
+        pty_output_buffer = debug_session.pty_output_buffers.get(pty_name)
+        if pty_output_buffer is None:
+            pty_output_buffer = PtyOutputBuffer(
+                max_chars=self.config["pty_output_buffer_max_chars"],
+                ack_timeout_sec=PTY_OUTPUT_ACK_TIMEOUT_SEC,
+            )
+            debug_session.pty_output_buffers[pty_name] = pty_output_buffer
+        return pty_output_buffer
+
+    def flush_pty_output(self, debug_session: DebugSession, pty_name: str) -> None:
+        """Send buffered pty output as a single frame to the clients of the debug
+        session, unless they are still processing the previous frame"""
+        pty_output_buffer = debug_session.pty_output_buffers.get(pty_name)
+        if pty_output_buffer is None:
+            return
+        frame = pty_output_buffer.take_frame(
+            self.manager.debug_session_to_client_ids.get(debug_session, [])
+        )
+        if frame is not None:
+            self.emit_to_debug_session(
+                debug_session, PTY_RESPONSE_EVENTS[pty_name], frame
+            )
+        if pty_output_buffer.has_output():
+            if (debug_session, pty_name) not in self.buffered_pty_output:
+                self.buffered_pty_output.add((debug_session, pty_name))
+                # make the server start waiting with a timeout
+                if self.manager.pty_watcher is not None:
+                    self.manager.pty_watcher.wakeup()
+        else:
+            self.buffered_pty_output.discard((debug_session, pty_name))
+
+    def flush_buffered_pty_output(self) -> None:
+        """Send output whose clients did not acknowledge the previous frame in time"""
+        for debug_session, pty_name in list(self.buffered_pty_output):
+            if debug_session in self.manager.debug_session_to_client_ids:
+                self.flush_pty_output(debug_session, pty_name)
+            else:
+                self.buffered_pty_output.discard((debug_session, pty_name))
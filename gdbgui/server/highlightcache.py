@@ -0,0 +1,140 @@
+"""Cache of highlighted source code on disk, shared by gdbgui processes
+
+Highlighting is cached by a hash of the text that was lexed, the lexer,
+and the versions of pygments and gdbgui (which determine the html), so
+entries never go stale and the same headers are only highlighted once for
+every gdbgui process on a host, across restarts. The html only contains
+css classes, so it is the same for every theme.
+
+Every entry is a file, written to a temporary file first and renamed into
+place, so other processes either see all of it or none of it. Entries
+that are used are touched, and the least recently used ones are deleted
+once the directory holds more than max_bytes. Processes may delete entries
+others are about to read, which are then treated as missing.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, List, Optional, Tuple
+
+import pygments  # type: ignore
+
+from gdbgui import __version__
+
+logger = logging.getLogger(__name__)
+
+# entries are evicted down to this fraction of max_bytes, so eviction is
+# not needed again on the next write
+EVICT_TO_FRACTION = 0.8
+# temporary files of processes that died while writing are deleted after this
+STALE_TEMP_FILE_SEC = 60 * 60
+_TEMP_PREFIX = ".tmp-"
+
+
+class HighlightCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # bytes in the directory, including what other processes wrote as of
+        # the last time it was scanned
+        self._num_bytes: Optional[int] = None
+
+    def get_key(self, text: str, lexer: Any) -> str:
+        key = hashlib.blake2b(text.encode(), digest_size=20)
+        key.update(
+            f"\0{type(lexer).__name__}\0{pygments.__version__}\0{__version__}".encode()
+        )
+        return key.hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the highlighted lines cached under key, or None"""
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            lines = json.loads(zlib.decompress(data))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Ignoring invalid highlight cache entry {path}: {e}")
+            return None
+        try:
+            # used recently, so evicted last
+            os.utime(path)
+        except OSError:
+            pass
+        return lines
+
+    def put(self, key: str, lines: List[str]) -> None:
+        data = zlib.compress(json.dumps(lines).encode(), 1)
+        path = self._get_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path), prefix=_TEMP_PREFIX
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Failed to write highlight cache entry {path}: {e}")
+            return
+
+        with self._lock:
+            if self._num_bytes is None:
+                self._num_bytes = self._scan()[1]
+            else:
+                self._num_bytes += len(data)
+            if self._num_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, str]], int]:
+        """Return the entries of the directory as (mtime, size, path),
+        least recently used first, and their total size. Deletes stale
+        temporary files."""
+        entries = []
+        num_bytes = 0
+        now = time.time()
+        for root, _dirs, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                    if filename.startswith(_TEMP_PREFIX):
+                        if now - stat.st_mtime > STALE_TEMP_FILE_SEC:
+                            os.unlink(path)
+                        continue
+                except OSError:
+                    # deleted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                num_bytes += stat.st_size
+        entries.sort()
+        return entries, num_bytes
+
+    def _evict(self) -> None:
+        # other processes write to the directory too
+        entries, num_bytes = self._scan()
+        for _mtime, size, path in entries:
+            if num_bytes <= self.max_bytes * EVICT_TO_FRACTION:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            num_bytes -= size
+        self._num_bytes = num_bytes
@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+from typing import Any, Dict
 
 from flask import (
     Blueprint,
@@ -10,18 +11,19 @@ from flask import (
     render_template,
     request,
     session,
+    stream_with_context,
     Response,
 )
-from pygments.lexers import get_lexer_for_filename  # type: ignore
-
-from gdbgui import htmllistformatter, __version__
+from gdbgui import __version__
 
 from .constants import TEMPLATE_DIR, USING_WINDOWS, SIGNAL_NAME_TO_OBJ
+from .sourcecache import SourceLines, get_etag, preload_lexers_in_background
 from .http_util import (
     add_csrf_token_to_session,
     authenticate,
     client_error,
     csrf_protect,
+    if_none_match_contains,
 )
 
 logger = logging.getLogger(__file__)
@@ -31,7 +33,14 @@ blueprint = Blueprint("http_routes", __name__, template_folder=str(TEMPLATE_DIR)
 @blueprint.route("/read_file", methods=["GET"])
 @csrf_protect
 def read_file():
-    """Read a file and return its contents as an array"""
+    """Read a file and return its contents as an array. Responses have an
+    ETag, and requests with it in If-None-Match get a 304 (Not Modified)
+    response if neither the file nor the requested lines changed.
+
+    With stream=true, the response is streamed as lines of json with the
+    fields of a response, each with up to BLOCK_LINES lines of the file, or
+    with the path and an error message.
+    """
 
     def should_highlight():
         try:
@@ -51,51 +60,36 @@ def read_file():
 
     if path and os.path.isfile(path):
         try:
-            last_modified = os.path.getmtime(path)
-            with open(path, "r") as f:
-                raw_source_code_list = f.read().split("\n")
-                num_lines_in_file = len(raw_source_code_list)
-                end_line = min(
-                    num_lines_in_file, end_line
-                )  # make sure we don't try to go too far
-
-                # if leading lines are '', then the lexer will strip them out, but we want
-                # to preserve blank lines. Insert a space whenever we find a blank line.
-                for i in range((start_line - 1), (end_line)):
-                    if raw_source_code_list[i] == "":
-                        raw_source_code_list[i] = " "
-                raw_source_code_lines_of_interest = raw_source_code_list[
-                    (start_line - 1) : (end_line)
-                ]
-            try:
-                lexer = get_lexer_for_filename(path)
-            except Exception:
-                lexer = None
-
-            if lexer and should_highlight():
-                highlighted = True
-                # convert string into tokens
-                tokens = lexer.get_tokens("\n".join(raw_source_code_lines_of_interest))
-                # format tokens into nice, marked up list of html
-                formatter = (
-                    htmllistformatter.HtmlListFormatter()
-                )  # Don't add newlines after each line
-                source_code = formatter.get_marked_up_list(tokens)
+            highlight = should_highlight()
+            # the lines are read as of the same stat, so they match the etag
+            stat = os.stat(path)
+            etag = get_etag(path, stat, start_line, end_line, highlight)
+            if if_none_match_contains(etag):
+                response = Response(status=304)
+            elif request.args.get("stream") == "true":
+                chunks = current_app.config["_source_cache"].iter_read(
+                    path, start_line, end_line, highlight=highlight, stat=stat
+                )
+
+                def generate():
+                    try:
+                        for chunk in chunks:
+                            yield json.dumps(get_source_lines_data(path, chunk)) + "\n"
+                    except Exception as e:
+                        yield json.dumps({"path": path, "message": "%s" % e}) + "\n"
+
+                response = Response(
+                    stream_with_context(generate()), mimetype="application/x-ndjson"
+                )
             else:
-                highlighted = False
-                source_code = raw_source_code_lines_of_interest
-
-            return jsonify(
-                {
-                    "source_code_array": source_code,
-                    "path": path,
-                    "last_modified_unix_sec": last_modified,
-                    "highlighted": highlighted,
-                    "start_line": start_line,
-                    "end_line": end_line,
-                    "num_lines_in_file": num_lines_in_file,
-                }
-            )
+                source = current_app.config["_source_cache"].read(
+                    path, start_line, end_line, highlight=highlight, stat=stat
+                )
+                response = jsonify(get_source_lines_data(path, source))
+            response.set_etag(etag)
+            # revalidate cached responses every time they are used
+            response.cache_control.no_cache = True
+            return response
 
         except Exception as e:
             return client_error({"message": "%s" % e})
@@ -104,6 +98,41 @@ def read_file():
         return client_error({"message": "File not found: %s" % path})
 
 
+def get_source_lines_data(path: str, source: SourceLines) -> Dict[str, Any]:
+    return {
+        "source_code_array": source.lines,
+        "path": path,
+        "last_modified_unix_sec": source.last_modified_unix_sec,
+        "highlighted": source.highlighted,
+        "start_line": source.start_line,
+        "end_line": source.end_line,
+        "num_lines_in_file": source.num_lines_in_file,
+    }
+
+
+@blueprint.route("/preload_lexers", methods=["POST"])
+@csrf_protect
+def preload_lexers():
+    """Load the lexers of the source files of a newly loaded executable in
+    the background"""
+    if current_app.config["preload_lexers"]:
+        preload_lexers_in_background(request.json.get("paths", []))
+    return jsonify({})
+
+
+@blueprint.route("/prehighlight_source_files", methods=["POST"])
+@csrf_protect
+def prehighlight_source_files():
+    """Highlight source files in the background before they are requested,
+    starting with priority_paths, such as the files of the backtrace"""
+    if current_app.config["prehighlight_source_files"]:
+        current_app.config["_source_prehighlighter"].add(
+            [p for p in request.json.get("paths", []) if isinstance(p, str)],
+            [p for p in request.json.get("priority_paths", []) if isinstance(p, str)],
+        )
+    return jsonify({})
+
+
 @blueprint.route("/get_last_modified_unix_sec", methods=["GET"])
 @csrf_protect
 def get_last_modified_unix_sec():
@@ -121,6 +150,22 @@ def get_last_modified_unix_sec():
         return client_error({"message": "File not found: %s" % path, "path": path})
 
 
+@blueprint.route("/get_last_modified_unix_secs", methods=["POST"])
+@csrf_protect
+def get_last_modified_unix_secs():
+    """Get last modified unix time of several files at once, or null for
+    those that can't be found"""
+    last_modified_unix_secs = {}
+    for path in request.json.get("paths", []):
+        if not isinstance(path, str):
+            continue
+        try:
+            last_modified_unix_secs[path] = os.path.getmtime(path)
+        except OSError:
+            last_modified_unix_secs[path] = None
+    return jsonify({"last_modified_unix_secs": last_modified_unix_secs})
+
+
 @blueprint.route("/help")
 def help_route():
     return redirect("https://github.com/cs01/gdbgui/blob/master/HELP.md")
@@ -164,6 +209,8 @@ def gdbgui():
         "themes": THEMES,
         "signals": SIGNAL_NAME_TO_OBJ,
         "using_windows": USING_WINDOWS,
+        "preload_lexers": current_app.config["preload_lexers"],
+        "prehighlight_source_files": current_app.config["prehighlight_source_files"],
     }
 
     return render_template(
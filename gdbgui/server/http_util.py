@@ -13,6 +13,18 @@ def add_csrf_token_to_session():
         session["csrf_token"] = binascii.hexlify(os.urandom(20)).decode("utf-8")
 
 
+def if_none_match_contains(etag: str) -> bool:
+    """Return True if the If-None-Match header of the request contains etag.
+    flask-compress appends the compression algorithm to the etags of the
+    responses it compresses, such as "<etag>:gzip", which is ignored."""
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return True
+    return any(
+        tag.split(":")[0] == etag for tag in if_none_match.as_set(include_weak=True)
+    )
+
+
 def is_cross_origin(request):
     """Compare headers HOST and ORIGIN. Remove protocol prefix from ORIGIN, then
     compare. Return true if they are not equal
@@ -0,0 +1,335 @@
+"""Read ranges of the debugged program's memory with a few mi commands
+
+A range is read with one -data-read-memory-bytes command per
+MEMORY_READ_CHUNK_BYTES, rather than one command per byte. The commands are
+written with mi tokens of their own, so their result records can be taken
+out of gdb's output before it is forwarded. Once every chunk of a range was
+read, the range is sent to the clients as a single memory_response event,
+with the bytes that could be read as blocks of hex digits.
+
+Clients can watch the range they display. The last snapshot of each watched
+region is kept, marked stale when the program runs, and read again when it
+stops. Reads of a watched region are sent as the blocks of bytes that
+changed since the previous snapshot, along with a bitmap of the changed
+bytes, rather than as the whole region:
+
+    {"start_addr", "num_bytes", "errors", "version",
+     "base_version", "changed_blocks": [{"begin", "contents"}],
+     "changed_bitmap": [first byte of the bitmap, hex digits of the bitmap]}
+
+Bit j of byte i of the bitmap is set if the byte at
+start_addr + (first byte + i) * 8 + j changed. Clients that don't have the
+base version ask for the whole region, which is sent with "blocks" instead
+of "base_version" and "changed_blocks".
+"""
+import itertools
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# bytes read by each -data-read-memory-bytes command
+MEMORY_READ_CHUNK_BYTES = 64 * 1024
+MAX_MEMORY_READ_BYTES = 1024 * 1024
+# well above the tokens the frontend uses, so results of commands written by
+# gdbgui's own reads are never mistaken for others
+MEMORY_READ_TOKEN_BASE = 1_000_000_000
+# snapshots are compared in slices of this many bytes, and only the bytes of
+# slices that differ are compared one by one
+DIFF_SLICE_BYTES = 64
+# changed bytes this close to each other are sent as a single block
+CHANGED_BLOCK_MAX_GAP_BYTES = 8
+
+
+def merge_blocks(blocks: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """Merge adjacent blocks of (address, hex digits)"""
+    merged: List[Tuple[int, str]] = []
+    end = None
+    for begin, contents in sorted(blocks):
+        if merged and begin == end:
+            merged[-1] = (merged[-1][0], merged[-1][1] + contents)
+        else:
+            merged.append((begin, contents))
+        end = begin + len(contents) // 2
+    return merged
+
+
+def get_changed_ranges(old: bytes, new: bytes) -> List[Tuple[int, int]]:
+    """Return the (start, end) offsets of the runs of bytes that differ
+    between old and new, which have the same length"""
+    ranges: List[List[int]] = []
+    for slice_start in range(0, len(new), DIFF_SLICE_BYTES):
+        slice_end = slice_start + DIFF_SLICE_BYTES
+        if old[slice_start:slice_end] == new[slice_start:slice_end]:
+            continue
+        for i in range(slice_start, min(slice_end, len(new))):
+            if old[i] != new[i]:
+                if ranges and ranges[-1][1] == i:
+                    ranges[-1][1] = i + 1
+                else:
+                    ranges.append([i, i + 1])
+    return [(start, end) for start, end in ranges]
+
+
+def get_changed_bitmap(ranges: List[Tuple[int, int]], start_addr: int) -> List[Any]:
+    """Return the bitmap of the bytes in ranges of addresses, as the index of
+    its first byte and the hex digits of its bytes from there on"""
+    if not ranges:
+        return [0, ""]
+    first_byte = (ranges[0][0] - start_addr) // 8
+    bitmap = bytearray((ranges[-1][1] - start_addr + 7) // 8 - first_byte)
+    for start, end in ranges:
+        for offset in range(start - start_addr, end - start_addr):
+            bitmap[offset // 8 - first_byte] |= 1 << (offset % 8)
+    return [first_byte, bitmap.hex()]
+
+
+class _WatchedRegion:
+    def __init__(self, start_addr: int, num_bytes: int):
+        self.start_addr = start_addr
+        self.num_bytes = num_bytes
+        self.client_ids: Set[str] = set()
+        # the readable blocks of the region as of the last read, as
+        # (address, bytes), and the errors of reading the rest
+        self.blocks: Optional[List[Tuple[int, bytes]]] = None
+        self.errors: List[str] = []
+        self.version = -1
+        # whether the program ran since the last read
+        self.stale = True
+        self.pending_read: Optional["_MemoryRead"] = None
+
+
+class _MemoryRead:
+    def __init__(
+        self,
+        start_addr: int,
+        num_bytes: int,
+        region: Optional[_WatchedRegion] = None,
+        full: bool = True,
+    ):
+        self.start_addr = start_addr
+        self.num_bytes = num_bytes
+        self.region = region
+        # whether to send the whole region rather than what changed
+        self.full = full
+        # tokens of the commands whose results have not been read yet
+        self.pending_tokens: Set[int] = set()
+        self.blocks: List[Tuple[int, str]] = []
+        self.errors: List[str] = []
+
+
+class MemoryReader:
+    """The memory reads of a single debug session that wait for gdb's
+    results, and the regions its clients watch"""
+
+    def __init__(self):
+        self._tokens = itertools.count(MEMORY_READ_TOKEN_BASE)
+        self._reads: Dict[int, _MemoryRead] = {}
+        self._regions: Dict[Tuple[int, int], _WatchedRegion] = {}
+        self._client_regions: Dict[str, _WatchedRegion] = {}
+
+    def get_commands(
+        self,
+        start_addr: int,
+        num_bytes: int,
+        client_id: Optional[str] = None,
+        full: bool = True,
+    ) -> List[str]:
+        """Return the commands that read num_bytes bytes starting at
+        start_addr, and wait for their results. With a client_id, the client
+        watches the region instead of the one it watched before, and unless
+        full is set, only what changed is sent."""
+        if start_addr < 0 or num_bytes <= 0:
+            raise ValueError(
+                f"Invalid memory range of {num_bytes} bytes at {start_addr}"
+            )
+        if num_bytes > MAX_MEMORY_READ_BYTES:
+            raise ValueError(
+                f"Cannot read {num_bytes} bytes of memory at once. "
+                f"The maximum is {MAX_MEMORY_READ_BYTES}."
+            )
+        if client_id is None:
+            return self._start_read(_MemoryRead(start_addr, num_bytes))
+        region = self.watch(client_id, start_addr, num_bytes)
+        if region.pending_read is not None:
+            # the clients get the result of the read that is in flight
+            region.pending_read.full = region.pending_read.full or full
+            return []
+        return self._start_read(_MemoryRead(start_addr, num_bytes, region, full))
+
+    def _start_read(self, memory_read: _MemoryRead) -> List[str]:
+        commands = []
+        for offset in range(0, memory_read.num_bytes, MEMORY_READ_CHUNK_BYTES):
+            token = next(self._tokens)
+            chunk_bytes = min(MEMORY_READ_CHUNK_BYTES, memory_read.num_bytes - offset)
+            address = memory_read.start_addr + offset
+            commands.append(
+                f"{token}-data-read-memory-bytes {hex(address)} {chunk_bytes}"
+            )
+            memory_read.pending_tokens.add(token)
+            self._reads[token] = memory_read
+        if memory_read.region is not None:
+            memory_read.region.pending_read = memory_read
+        return commands
+
+    def watch(self, client_id: str, start_addr: int, num_bytes: int) -> _WatchedRegion:
+        """Make the client watch a region instead of the one it watched before"""
+        region = self._regions.get((start_addr, num_bytes))
+        if region is None:
+            region = _WatchedRegion(start_addr, num_bytes)
+            self._regions[(start_addr, num_bytes)] = region
+        if self._client_regions.get(client_id) is not region:
+            self.unwatch(client_id)
+            region.client_ids.add(client_id)
+            self._client_regions[client_id] = region
+        return region
+
+    def unwatch(self, client_id: str) -> None:
+        region = self._client_regions.pop(client_id, None)
+        if region is None:
+            return
+        region.client_ids.discard(client_id)
+        if not region.client_ids:
+            del self._regions[(region.start_addr, region.num_bytes)]
+
+    def get_snapshot(self, start_addr: int, num_bytes: int) -> Optional[Dict[str, Any]]:
+        """Return the whole of a watched region as of its last read, if the
+        program did not run since"""
+        region = self._regions.get((start_addr, num_bytes))
+        if (
+            region is None
+            or region.blocks is None
+            or region.stale
+            or region.pending_read is not None
+        ):
+            return None
+        return {
+            "start_addr": hex(start_addr),
+            "num_bytes": num_bytes,
+            "errors": region.errors,
+            "version": region.version,
+            "blocks": [
+                {"begin": hex(begin), "contents": contents.hex()}
+                for begin, contents in region.blocks
+            ],
+        }
+
+    def get_refresh_commands(self, responses: List[Dict[str, Any]]) -> List[str]:
+        """Return the commands that read the watched regions again, if gdb
+        stopped the program in responses"""
+        if not self._regions or not any(
+            response.get("type") == "notify" and response.get("message") == "stopped"
+            for response in responses
+        ):
+            return []
+        commands = []
+        for region in self._regions.values():
+            if region.pending_read is None:
+                commands += self._start_read(
+                    _MemoryRead(region.start_addr, region.num_bytes, region, full=False)
+                )
+        return commands
+
+    def take_results(
+        self, responses: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Take the result records of memory reads out of responses.
+        Returns the other responses, and the memory reads that were completed."""
+        if not self._reads and not self._regions:
+            return responses, []
+        other_responses = []
+        completed = []
+        for response in responses:
+            memory_read = None
+            if response.get("type") == "result" and response.get("token"):
+                memory_read = self._reads.pop(response["token"], None)
+            elif (
+                response.get("type") == "notify"
+                and response.get("message") == "running"
+            ):
+                for region in self._regions.values():
+                    region.stale = True
+            if memory_read is None:
+                other_responses.append(response)
+                continue
+            memory_read.pending_tokens.discard(response["token"])
+            payload = response.get("payload") or {}
+            if response.get("message") == "error":
+                memory_read.errors.append(payload.get("msg", "Unable to read memory."))
+            else:
+                for block in payload.get("memory", []):
+                    memory_read.blocks.append(
+                        (int(block["begin"], 16), block["contents"])
+                    )
+            if not memory_read.pending_tokens:
+                completed.append(self._get_response(memory_read))
+        return other_responses, completed
+
+    def _get_response(self, memory_read: _MemoryRead) -> Dict[str, Any]:
+        blocks = merge_blocks(memory_read.blocks)
+        data: Dict[str, Any] = {
+            "start_addr": hex(memory_read.start_addr),
+            "num_bytes": memory_read.num_bytes,
+            "errors": memory_read.errors,
+        }
+        region = memory_read.region
+        if region is not None:
+            if region.pending_read is memory_read:
+                region.pending_read = None
+            new_blocks = [
+                (begin, bytes.fromhex(contents)) for begin, contents in blocks
+            ]
+            block_changes = self._diff_blocks(region.blocks, new_blocks)
+            region.blocks = new_blocks
+            region.errors = memory_read.errors
+            region.stale = False
+            region.version += 1
+            data["version"] = region.version
+            if block_changes is not None:
+                data["changed_bitmap"] = get_changed_bitmap(
+                    [
+                        (begin + start, begin + end)
+                        for begin, _, ranges in block_changes
+                        for start, end in ranges
+                    ],
+                    region.start_addr,
+                )
+                if not memory_read.full:
+                    data["base_version"] = region.version - 1
+                    data["changed_blocks"] = self._get_changed_blocks(block_changes)
+                    return data
+        data["blocks"] = [
+            {"begin": hex(begin), "contents": contents} for begin, contents in blocks
+        ]
+        return data
+
+    def _diff_blocks(
+        self,
+        old_blocks: Optional[List[Tuple[int, bytes]]],
+        new_blocks: List[Tuple[int, bytes]],
+    ) -> Optional[List[Tuple[int, bytes, List[Tuple[int, int]]]]]:
+        """Return each new block with the offsets of the runs of bytes that
+        changed in it, or None if the blocks can't be compared because
+        different bytes could be read"""
+        if old_blocks is None or [(b, len(c)) for b, c in old_blocks] != [
+            (b, len(c)) for b, c in new_blocks
+        ]:
+            return None
+        return [
+            (begin, new, get_changed_ranges(old, new))
+            for (begin, old), (_, new) in zip(old_blocks, new_blocks)
+        ]
+
+    def _get_changed_blocks(
+        self, block_changes: List[Tuple[int, bytes, List[Tuple[int, int]]]]
+    ) -> List[Dict[str, str]]:
+        changed_blocks = []
+        for begin, contents, ranges in block_changes:
+            merged: List[List[int]] = []
+            for start, end in ranges:
+                if merged and start - merged[-1][1] <= CHANGED_BLOCK_MAX_GAP_BYTES:
+                    merged[-1][1] = end
+                else:
+                    merged.append([start, end])
+            for start, end in merged:
+                changed_blocks.append(
+                    {"begin": hex(begin + start), "contents": contents[start:end].hex()}
+                )
+        return changed_blocks
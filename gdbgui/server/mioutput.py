@@ -0,0 +1,123 @@
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from pygdbmi import gdbmiparser
+
+logger = logging.getLogger(__name__)
+MI_PARSE_POOLS = ["thread", "process"]
+
+
+def parse_mi_output(output: str) -> List[Dict[str, Any]]:
+    """Parse complete lines of gdb mi output, the same way pygdbmi's IoManager
+    does. This runs in worker threads or processes, so it must not depend on
+    any state."""
+    responses = []
+    for line in output.split("\n"):
+        if not line or gdbmiparser.response_is_finished(line):
+            continue
+        parsed_response = gdbmiparser.parse_response(line)
+        parsed_response["stream"] = "stdout"
+        responses.append(parsed_response)
+    return responses
+
+
+def create_mi_parse_executor(pool: Optional[str]) -> Optional[Executor]:
+    if pool is None:
+        return None
+    elif pool == "thread":
+        return ThreadPoolExecutor(thread_name_prefix="gdbgui_mi_parser")
+    elif pool == "process":
+        # don't fork the server process, which has every debug session's ptys open
+        return ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    raise ValueError(f"Unknown mi parse pool {pool}. Expected one of {MI_PARSE_POOLS}")
+
+
+class MiOutputParser:
+    """Split gdb mi output of many debug sessions into complete records and
+    parse them, either right away or in a pool of workers.
+
+    Parsing a huge response (i.e. a disassembly or a list of all source files)
+    in a worker means the thread reading gdb output can keep forwarding other
+    debug sessions' responses in the meantime. Responses of each debug
+    session are still returned in the order gdb wrote them.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        on_parsed: Optional[Callable[[], None]] = None,
+    ):
+        self.executor = executor
+        # called from a worker when a response finished parsing
+        self.on_parsed = on_parsed
+        self._incomplete_output: Dict[Any, List[str]] = {}
+        self._pending: Dict[Any, Deque[Union[Future, List[Dict[str, Any]]]]] = {}
+
+    def feed(self, key: Any, output: str) -> None:
+        """Add output read from the mi pty of the debug session identified by key"""
+        incomplete = self._incomplete_output.setdefault(key, [])
+        if "\n" not in output:
+            # keep the pieces of a long line in a list, joining them only
+            # once the line is complete
+            incomplete.append(output)
+            return
+        end_of_complete_lines = output.rindex("\n") + 1
+        complete_output = "".join(incomplete) + output[:end_of_complete_lines]
+        incomplete.clear()
+        if end_of_complete_lines < len(output):
+            incomplete.append(output[end_of_complete_lines:])
+
+        pending = self._pending.setdefault(key, deque())
+        if self.executor is None:
+            try:
+                pending.append(parse_mi_output(complete_output))
+            except Exception:
+                logger.error("Failed to parse gdb mi output", exc_info=True)
+        else:
+            future = self.executor.submit(parse_mi_output, complete_output)
+            future.add_done_callback(self._parsed)
+            pending.append(future)
+
+    def _parsed(self, _future: Future) -> None:
+        if self.on_parsed:
+            self.on_parsed()
+
+    def get_parsed(self) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+        """Return the parsed responses that are ready, in order for each key.
+        A response is held back until every response before it of the same
+        key has been parsed."""
+        ready = []
+        for key, pending in list(self._pending.items()):
+            responses: List[Dict[str, Any]] = []
+            while pending:
+                item = pending[0]
+                if isinstance(item, Future):
+                    if not item.done():
+                        break
+                    try:
+                        responses += item.result()
+                    except Exception:
+                        logger.error("Failed to parse gdb mi output", exc_info=True)
+                else:
+                    responses += item
+                pending.popleft()
+            if not pending:
+                del self._pending[key]
+            if responses:
+                ready.append((key, responses))
+        return ready
+
+    def remove(self, key: Any) -> None:
+        self._incomplete_output.pop(key, None)
+        pending = self._pending.pop(key, deque())
+        for item in pending:
+            if isinstance(item, Future):
+                item.cancel()
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Iterable, Optional, Set
+
+
+class PtyOutputBuffer:
+    """Bounded buffer for pty output waiting to be sent to the clients of
+    a debug session
+
+    Output that arrives while the clients are still processing the previous
+    frame is coalesced into the next frame. If more than max_chars
+    characters (of decoded output, so not bytes) are waiting, the oldest output is dropped and a marker saying how much was
+    dropped is put in its place, so a program printing in a tight loop
+    cannot make the server (or the browser) queue an unbounded amount of
+    output.
+
+    A frame is only sent once every client acknowledged the previous one, or
+    ack_timeout_sec passed, so slow clients slow down the rate of frames
+    rather than the amount of queued output growing.
+    """
+
+    def __init__(self, *, max_chars: int, ack_timeout_sec: float):
+        self.max_chars = max_chars
+        self.ack_timeout_sec = ack_timeout_sec
+        self._chunks: Deque[str] = deque()
+        self._num_chars = 0
+        self._num_dropped_chars = 0
+        self._clients_pending_ack: Set[str] = set()
+        self._sent_time = 0.0
+        self._lock = threading.Lock()
+
+    def append(self, output: str) -> None:
+        with self._lock:
+            self._chunks.append(output)
+            self._num_chars += len(output)
+            while self._num_chars > self.max_chars:
+                excess = self._num_chars - self.max_chars
+                oldest = self._chunks[0]
+                if len(oldest) <= excess:
+                    self._chunks.popleft()
+                    removed = len(oldest)
+                else:
+                    self._chunks[0] = oldest[excess:]
+                    removed = excess
+                self._num_chars -= removed
+                self._num_dropped_chars += removed
+
+    def has_output(self) -> bool:
+        return self._num_chars > 0 or self._num_dropped_chars > 0
+
+    def is_waiting_for_ack(self) -> bool:
+        if not self._clients_pending_ack:
+            return False
+        return time.monotonic() - self._sent_time < self.ack_timeout_sec
+
+    def take_frame(self, client_ids: Iterable[str]) -> Optional[str]:
+        """Return all buffered output as a single frame, if it can be sent now.
+        client_ids are the clients the frame will be sent to, whose acks are
+        needed before the next frame is sent."""
+        with self._lock:
+            if not self.has_output() or self.is_waiting_for_ack():
+                return None
+            frame = "".join(self._chunks)
+            if self._num_dropped_chars:
+                frame = (
+                    f"\r\n[gdbgui: {self._num_dropped_chars} characters of output "
+                    "were dropped because clients could not keep up]\r\n" + frame
+                )
+            self._chunks.clear()
+            self._num_chars = 0
+            self._num_dropped_chars = 0
+            self._clients_pending_ack = set(client_ids)
+            self._sent_time = time.monotonic()
+            return frame
+
+    def ack(self, client_id: str) -> None:
+        with self._lock:
+            self._clients_pending_ack.discard(client_id)
@@ -6,6 +6,7 @@ if USING_WINDOWS:
         "Windows is not supported at this time. "
         + "Versions lower than 0.14.x. are Windows compatible."
     )
+import codecs
 import fcntl
 import pty
 import select
@@ -13,13 +14,15 @@ import shlex
 import signal
 import struct
 import termios
-from typing import Optional
+from typing import List, Optional
 
 
 class Pty:
     max_read_bytes = 1024 * 20
 
     def __init__(self, *, cmd: Optional[str] = None, echo: bool = True):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.closed = False
         if cmd:
             (child_pid, fd) = pty.fork()
             if child_pid == 0:
@@ -68,19 +71,63 @@ class Pty:
             raise RuntimeError("fd stdin not assigned")
         fcntl.ioctl(self.stdin, termios.TIOCSWINSZ, winsize)
 
-    def read(self) -> Optional[str]:
+    def read(self, max_bytes: Optional[int] = None) -> Optional[str]:
+        """Read output that is available on the pty without blocking.
+
+        By default a single read of up to max_read_bytes is done. If max_bytes
+        is given, the pty is drained until no more output is available or
+        max_bytes have been read.
+
+        Output is decoded incrementally, so a multi-byte character split
+        across two reads is held back until the rest of it arrives, and
+        invalid bytes are replaced instead of dropping the whole chunk.
+        """
         if self.stdout is None:
             return "done"
-        timeout_sec = 0
-        (data_to_read, _, _) = select.select([self.stdout], [], [], timeout_sec)
-        if data_to_read:
+        budget = self.max_read_bytes if max_bytes is None else max_bytes
+        chunks: List[bytes] = []
+        num_bytes_read = 0
+        while num_bytes_read < budget:
+            timeout_sec = 0
+            (data_to_read, _, _) = select.select([self.stdout], [], [], timeout_sec)
+            if not data_to_read:
+                break
             try:
-                response = os.read(self.stdout, self.max_read_bytes).decode()
-            except (OSError, UnicodeDecodeError):
-                return None
-            return response
-        return None
+                chunk = os.read(
+                    self.stdout, min(self.max_read_bytes, budget - num_bytes_read)
+                )
+            except BlockingIOError:
+                break
+            except OSError:
+                # i.e. EIO after the process on the other end of the pty
+                # exited. It must be raised, otherwise the pty would stay
+                # readable forever and the caller would never find out. If some
+                # output was already read, return it and raise on the next read.
+                if chunks:
+                    break
+                raise
+            if not chunk:
+                break
+            chunks.append(chunk)
+            num_bytes_read += len(chunk)
+            if max_bytes is None:
+                break
+
+        if not chunks:
+            return None
+        response = self._decoder.decode(b"".join(chunks))
+        return response or None
 
     def write(self, data: str):
         edata = data.encode()
         os.write(self.stdin, edata)
+
+    def close(self) -> None:
+        """Close the file descriptor of the pty, once it is not watched anymore"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            os.close(self.stdout)
+        except OSError:
+            pass
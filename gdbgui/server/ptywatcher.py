@@ -0,0 +1,128 @@
+import asyncio
+import os
+import selectors
+import threading
+from types import ModuleType
+from typing import Any, Callable, List, Optional
+
+
+def get_selectors_module(async_mode: Optional[str]) -> ModuleType:
+    """Return a selectors module that cooperates with the socketio async mode.
+
+    gdbgui does not monkey patch the standard library, so the stdlib selector
+    would block the entire eventlet/gevent hub while waiting. eventlet only
+    has a green select, so its DefaultSelector is a SelectSelector, which
+    hands every registered file descriptor to eventlet's hub (epoll where
+    available) on each wait: no cpu is used while ptys are idle, but a wait
+    costs time linear in the number of ptys.
+    """
+    if async_mode == "eventlet":
+        from eventlet.green import selectors as green_selectors  # type: ignore
+
+        return green_selectors
+    elif async_mode == "gevent":
+        from gevent import selectors as gevent_selectors  # type: ignore
+
+        return gevent_selectors
+    return selectors
+
+
+class PtyWatcher:
+    """Wait on the file descriptors of many ptys at once
+
+    Each file descriptor is registered once with the DefaultSelector of
+    selectors_module (epoll where available, see get_selectors_module) along
+    with a key identifying it. `wait` blocks until at least one of them is
+    readable, so no cpu is used while all ptys are idle.
+    Registering or unregistering a file descriptor wakes up a blocked `wait`
+    so the change takes effect immediately.
+    """
+
+    def __init__(self, selectors_module: ModuleType = selectors):
+        self._selector = selectors_module.DefaultSelector()
+        self._wakeup_read_fd, self._wakeup_write_fd = os.pipe()
+        os.set_blocking(self._wakeup_read_fd, False)
+        os.set_blocking(self._wakeup_write_fd, False)
+        self._selector.register(self._wakeup_read_fd, selectors.EVENT_READ, None)
+
+    def register(self, fd: int, key: Any) -> None:
+        self._selector.register(fd, selectors.EVENT_READ, key)
+        self.wakeup()
+
+    def unregister(self, fd: int) -> None:
+        try:
+            self._selector.unregister(fd)
+        except (KeyError, ValueError):
+            # not registered, or already closed
+            pass
+        self.wakeup()
+
+    def wakeup(self) -> None:
+        try:
+            os.write(self._wakeup_write_fd, b"\0")
+        except BlockingIOError:
+            # pipe is full, so a wakeup is already pending
+            pass
+
+    def wait(self, timeout_sec: Optional[float] = None) -> List[Any]:
+        """Block until a registered file descriptor is readable or `wakeup`
+        is called. Returns the keys of the readable file descriptors."""
+        ready = []
+        for selector_key, _ in self._selector.select(timeout_sec):
+            if selector_key.fd == self._wakeup_read_fd:
+                self._drain_wakeup_pipe()
+            else:
+                ready.append(selector_key.data)
+        return ready
+
+    def _drain_wakeup_pipe(self) -> None:
+        try:
+            while os.read(self._wakeup_read_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+
+class AsyncioPtyWatcher:
+    """Watch the file descriptors of ptys with an asyncio event loop
+
+    This has the same interface as PtyWatcher, but rather than a task waiting
+    on a selector, the event loop calls `on_readable` with the key of each
+    readable file descriptor. `wakeup` calls `on_wakeup` on the event loop.
+    It must be created on the event loop's thread, but its methods can be
+    called from any thread.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        on_readable: Callable[[Any], None],
+        on_wakeup: Callable[[], None],
+    ):
+        self._loop = loop
+        self._on_readable = on_readable
+        self._on_wakeup = on_wakeup
+        self._loop_thread_id = threading.get_ident()
+
+    def register(self, fd: int, key: Any) -> None:
+        self._call_in_loop(self._loop.add_reader, fd, self._on_readable, key)
+
+    def unregister(self, fd: int) -> None:
+        self._call_in_loop(self._remove_reader, fd)
+
+    def wakeup(self) -> None:
+        self._loop.call_soon_threadsafe(self._on_wakeup)
+
+    def _remove_reader(self, fd: int) -> None:
+        try:
+            self._loop.remove_reader(fd)
+        except (OSError, ValueError):
+            # already closed
+            pass
+
+    def _call_in_loop(self, callback: Callable, *args: Any) -> None:
+        # the event loop's readers can only be changed from its own thread
+        if threading.get_ident() == self._loop_thread_id:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
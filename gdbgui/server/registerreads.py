@@ -0,0 +1,248 @@
+"""Read the debugged program's registers, sending only those that changed
+
+Clients watch the registers, and the values of a debug session's registers
+are read again whenever gdb stops or another frame or thread is selected,
+by asking gdb which registers changed with -data-list-changed-registers and
+reading only their values. gdb
+compares registers against the last time it was asked, so the first read
+asks it for every value, and every read after it asks which changed first.
+
+Registers whose values are composites (the vector registers of most
+architectures) are only read while a client expanded them, since they are
+most of the output of -data-list-register-values on a machine with large
+vector registers. When they change while nobody expanded them, their value
+is forgotten.
+
+Reads are sent to every client of the debug session as a register_values
+event:
+
+    {"version", "vector_registers": [number],
+     "values": [{"number", "value"}]}
+
+with every register (the value of vector registers only if it was read),
+or with only the registers that changed and "base_version", the version
+the changes apply to. Registers that are sent without a value are not
+known anymore. Clients that don't have the base version ask for every
+register.
+"""
+import itertools
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# well above the tokens of the frontend and of memory reads
+REGISTER_READ_TOKEN_BASE = 3_000_000_000
+# mi commands after which the registers are the ones of another frame
+_SELECT_COMMAND = re.compile(r"^\d*(-stack-select-frame|-thread-select)\b")
+
+
+class RegisterReader:
+    """The registers of a single debug session as of the last time gdb
+    stopped, and the commands reading them that wait for gdb's results"""
+
+    def __init__(self):
+        self._tokens = itertools.count(REGISTER_READ_TOKEN_BASE)
+        # the vector registers each watching client expanded
+        self._clients: Dict[str, Set[str]] = {}
+        # every register in gdb's order, once they were read
+        self.numbers: List[str] = []
+        self.values: Dict[str, str] = {}
+        self.vector_numbers: Set[str] = set()
+        self.version = -1
+        # whether the program ran since the last read
+        self.stale = True
+        # kind of the commands of the read in flight, by token
+        self._pending: Dict[int, str] = {}
+        # whether the read in flight reads every register, sends every
+        # register, and failed
+        self._reading_all = False
+        self._full = False
+        self._failed = False
+        # registers that are sent once the read in flight is done
+        self._updated: List[str] = []
+        self._read_again = False
+
+    def get_commands(
+        self, client_id: str, expanded: List[str], full: bool = True
+    ) -> List[str]:
+        """Make the client watch the registers, with the vector registers in
+        expanded, and return the commands that read them. Unless full is
+        set, only the registers that changed are sent."""
+        self._clients[client_id] = {str(number) for number in expanded}
+        if self._pending:
+            # the clients get the result of the read that is in flight, and
+            # registers that were expanded since are read right after it
+            self._full = self._full or full
+            return []
+        return self._start_read(full)
+
+    def unwatch(self, client_id: str) -> None:
+        self._clients.pop(client_id, None)
+
+    def get_snapshot(self, expanded: List[str]) -> Optional[Dict[str, Any]]:
+        """Return every register as of the last read, if the program did not
+        run since and the values of the expanded registers are known"""
+        if (
+            self.stale
+            or self._pending
+            or not self.numbers
+            or any(str(n) not in self.values for n in expanded)
+        ):
+            return None
+        return self._get_response(full=True)
+
+    def get_refresh_commands(self, responses: List[Dict[str, Any]]) -> List[str]:
+        """Return the commands that read the registers again, if gdb stopped
+        the program in responses, or another frame or thread was selected on
+        gdb's console, and clients watch the registers"""
+        if not any(
+            response.get("type") == "notify"
+            and response.get("message") in ("stopped", "thread-selected")
+            for response in responses
+        ):
+            return []
+        return self._read_again_if_watched()
+
+    def command_written(self, cmd: str) -> List[str]:
+        """Return the commands that read the registers again, if cmd selects
+        another frame or thread and clients watch the registers. gdb runs
+        them after cmd."""
+        if not _SELECT_COMMAND.match(cmd.strip()):
+            return []
+        return self._read_again_if_watched()
+
+    def _read_again_if_watched(self) -> List[str]:
+        self.stale = True
+        if not self._clients:
+            return []
+        if self._pending:
+            self._read_again = True
+            return []
+        return self._start_read(full=False)
+
+    def _start_read(self, full: bool) -> List[str]:
+        self._reading_all = not self.numbers
+        self._full = full or self._reading_all
+        self._failed = False
+        self._updated = []
+        token = next(self._tokens)
+        self._pending[token] = "changed"
+        commands = [f"{token}-data-list-changed-registers"]
+        if self._reading_all:
+            token = next(self._tokens)
+            self._pending[token] = "values"
+            commands.append(f"{token}-data-list-register-values x")
+        return commands
+
+    def _get_expanded(self) -> Set[str]:
+        return set().union(*self._clients.values())
+
+    def _read_values(self, changed: List[str]) -> List[str]:
+        """Return the command that reads the values of the registers that
+        changed, and of expanded registers whose values are not known"""
+        expanded = self._get_expanded()
+        numbers = []
+        # vector registers whose values the clients have to forget
+        forgotten = []
+        for number in changed:
+            if number not in self.vector_numbers or number in expanded:
+                numbers.append(number)
+            elif self.values.pop(number, None) is not None:
+                forgotten.append(number)
+        numbers += [
+            number
+            for number in self.numbers
+            if number in expanded
+            and number not in self.values
+            and number not in numbers
+        ]
+        self._updated = numbers + forgotten
+        if not numbers:
+            return []
+        token = next(self._tokens)
+        self._pending[token] = "values"
+        return [f"{token}-data-list-register-values x {' '.join(numbers)}"]
+
+    def take_results(
+        self, responses: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[str]]:
+        """Take the result records of register reads out of responses.
+        Returns the other responses, the register_values events of the reads
+        that were completed, and the commands to write next."""
+        if not self._pending and not self._clients:
+            return responses, [], []
+        other_responses = []
+        completed = []
+        commands: List[str] = []
+        for response in responses:
+            kind = None
+            if response.get("type") == "result" and response.get("token"):
+                kind = self._pending.pop(response["token"], None)
+            elif response.get("type") == "notify":
+                if response.get("message") == "running":
+                    self.stale = True
+                elif response.get("message") == "thread-group-started":
+                    # the program may have been built for another architecture
+                    self.numbers = []
+                    self.values = {}
+                    self.vector_numbers = set()
+            if kind is None:
+                other_responses.append(response)
+                continue
+            payload = response.get("payload") or {}
+            if response.get("message") == "error":
+                # i.e. there are no registers before the program starts
+                self._failed = True
+            elif kind == "changed" and not self._reading_all:
+                commands += self._read_values(payload.get("changed-registers", []))
+            elif kind == "values":
+                self._save_values(payload.get("register-values", []))
+            if not self._pending:
+                if not self._failed:
+                    self.version += 1
+                    self.stale = False
+                    completed.append(self._get_response(self._full))
+                commands += self._read_missing_values()
+        return other_responses, completed, commands
+
+    def _save_values(self, register_values: List[Dict[str, str]]) -> None:
+        expanded = self._get_expanded()
+        for register in register_values:
+            number, value = register["number"], register["value"]
+            if self._reading_all:
+                self.numbers.append(number)
+                if value.startswith("{"):
+                    self.vector_numbers.add(number)
+                    if number not in expanded:
+                        continue
+            self.values[number] = value
+
+    def _read_missing_values(self) -> List[str]:
+        """Start another read if gdb stopped again, or registers were
+        expanded, while the last one was in flight"""
+        read_again = self._read_again
+        self._read_again = False
+        if self._failed or not self.numbers:
+            return []
+        expanded = self._get_expanded()
+        if read_again or any(
+            number in expanded and number not in self.values for number in self.numbers
+        ):
+            return self._start_read(full=False)
+        return []
+
+    def _get_response(self, full: bool) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "version": self.version,
+            "vector_registers": sorted(self.vector_numbers, key=int),
+        }
+        numbers = self.numbers
+        if not full:
+            data["base_version"] = self.version - 1
+            numbers = self._updated
+        data["values"] = [
+            {"number": number, "value": self.values[number]}
+            if number in self.values
+            else {"number": number}
+            for number in numbers
+        ]
+        return data
@@ -44,8 +44,21 @@ def run_server(
     testing=False,
     private_key=None,
     certificate=None,
+    use_asyncio=False,
 ):
-    """Run the server of the gdb gui"""
+    """Run the server of the gdb gui
+
+    By default it runs on eventlet with Flask-SocketIO. With use_asyncio, it
+    runs on an asyncio event loop under uvicorn instead.
+    """
+    if use_asyncio:
+        try:
+            from .asyncserver import run_asyncio_server
+        except ImportError as e:
+            raise RuntimeError(
+                "Serving with asyncio requires optional dependencies. "
+                "Install them with `pip install gdbgui[asyncio]`"
+            ) from e
 
     kwargs = {}
     ssl_context = get_ssl_context(private_key, certificate)
@@ -64,8 +77,9 @@ def run_server(
         protocol = "http://"
         url_with_prefix = "http://" + url
 
-    socketio.server_options["allow_upgrades"] = False
-    socketio.init_app(app)
+    if not use_asyncio:
+        socketio.server_options["allow_upgrades"] = False
+        socketio.init_app(app)
 
     if testing is False:
         if host == DEFAULT_HOST:
@@ -90,6 +104,15 @@ def run_server(
         )
 
         print("exit gdbgui by pressing CTRL+C")
+        if use_asyncio:
+            run_asyncio_server(
+                host=host,
+                port=int(port),
+                debug=debug,
+                private_key=private_key,
+                certificate=certificate,
+            )
+            return
         try:
             socketio.run(
                 app,
@@ -3,15 +3,29 @@ import logging
 import os
 import signal
 import traceback
+import uuid
 from collections import defaultdict
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Union
 
 from pygdbmi.IoManager import IoManager
 
+from .deltas import ResponseDeltaEncoder
+from .disassemblycache import SessionDisassembly
+from .memoryreads import MemoryReader
+from .mioutput import MiOutputParser
+from .outputbuffer import PtyOutputBuffer
 from .ptylib import Pty
+from .registerreads import RegisterReader
+from .ptywatcher import AsyncioPtyWatcher, PtyWatcher
+from .sourcewatcher import SourceWatcher
+from .wireencoding import JSON
 
 logger = logging.getLogger(__name__)
 
+MI_PTY = "mi_pty"
+USER_PTY = "user_pty"
+PROGRAM_PTY = "program_pty"
+
 
 class DebugSession:
     def __init__(
@@ -34,6 +48,23 @@ class DebugSession:
         self.pid = pid
         self.start_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.client_ids: Set[str] = set()
+        # the encoding of websocket events each client negotiated
+        self.client_encodings: Dict[str, str] = {}
+        # all clients of this debug session join this socketio room (or the
+        # room of their encoding), so output is serialized once and broadcast
+        # to every client at the same time
+        self.room = f"debug_session_{pid}_{uuid.uuid4().hex}"
+        # output of the user and program ptys that is waiting to be sent
+        self.pty_output_buffers: Dict[str, PtyOutputBuffer] = {}
+        self.response_deltas = ResponseDeltaEncoder()
+        # clients that can apply diffs of gdb responses
+        self.delta_clients: Set[str] = set()
+        # memory reads waiting for the results of their gdb commands
+        self.memory_reader = MemoryReader()
+        # the registers as of the last time gdb stopped
+        self.register_reader = RegisterReader()
+        # what the results of -data-disassemble commands are cached by
+        self.disassembly = SessionDisassembly(command)
 
     def terminate(self):
         if self.pid:
@@ -43,6 +74,26 @@ class DebugSession:
                 logger.error(f"Failed to kill pid {self.pid}: {str(e)}")
 
         self.pygdbmi_controller = None
+        for pty in self.get_ptys().values():
+            pty.close()
+
+    def write_mi_commands(self, cmds: List[str]) -> None:
+        """Write commands gdbgui runs on its own to the mi pty"""
+        if self.pygdbmi_controller is None:
+            raise RuntimeError("gdb is not running")
+        self.pygdbmi_controller.write(
+            "\n".join(cmds) + "\n",
+            timeout_sec=0,
+            raise_error_on_timeout=False,
+            read_response=False,
+        )
+
+    def get_ptys(self) -> Dict[str, Pty]:
+        return {
+            MI_PTY: self.pty_for_gdbgui,
+            USER_PTY: self.pty_for_gdb,
+            PROGRAM_PTY: self.pty_for_debugged_program,
+        }
 
     def to_dict(self):
         return {
@@ -53,11 +104,30 @@ class DebugSession:
             "client_ids": list(self.client_ids),
         }
 
-    def add_client(self, client_id: str):
+    def get_room(self, encoding: str) -> str:
+        """Return the socketio room of the clients using encoding"""
+        if encoding == JSON:
+            return self.room
+        return f"{self.room}_{encoding}"
+
+    def get_client_room(self, client_id: str) -> str:
+        return self.get_room(self.client_encodings.get(client_id, JSON))
+
+    def get_client_encodings(self) -> Set[str]:
+        return set(self.client_encodings.values())
+
+    def sends_deltas(self) -> bool:
+        """Whether every client can apply diffs of gdb responses"""
+        return bool(self.client_ids) and self.client_ids <= self.delta_clients
+
+    def add_client(self, client_id: str, encoding: str = JSON):
         self.client_ids.add(client_id)
+        self.client_encodings[client_id] = encoding
 
     def remove_client(self, client_id: str):
         self.client_ids.discard(client_id)
+        self.client_encodings.pop(client_id, None)
+        self.delta_clients.discard(client_id)
         if len(self.client_ids) == 0:
             self.terminate()
 
@@ -67,22 +137,54 @@ class SessionManager(object):
         self.debug_session_to_client_ids: Dict[DebugSession, List[str]] = defaultdict(
             list
         )  # key is controller, val is list of client ids
+        # indexes into debug_session_to_client_ids, so websocket events can be
+        # dispatched without scanning every debug session
+        self._pid_to_debug_session: Dict[int, DebugSession] = {}
+        self._client_id_to_debug_session: Dict[str, DebugSession] = {}
 
         self.gdb_reader_thread = None
+        self.pty_watcher: Optional[Union[PtyWatcher, AsyncioPtyWatcher]] = None
+        self.mi_output_parser = MiOutputParser()
+        # watches the source files clients of debug sessions have open
+        self.source_watcher: Optional[SourceWatcher] = None
+
+    def watch_ptys(self, pty_watcher: Union[PtyWatcher, AsyncioPtyWatcher]) -> None:
+        """Register the ptys of all current and future debug sessions with pty_watcher"""
+        self.pty_watcher = pty_watcher
+        for debug_session in self.debug_session_to_client_ids:
+            self._register_ptys(debug_session)
+
+    def _register_ptys(self, debug_session: DebugSession) -> None:
+        if self.pty_watcher is None:
+            return
+        for pty_name, pty in debug_session.get_ptys().items():
+            self.pty_watcher.register(pty.stdout, (debug_session, pty_name))
+
+    def _unregister_ptys(self, debug_session: DebugSession) -> None:
+        if self.pty_watcher is None:
+            return
+        for pty in debug_session.get_ptys().values():
+            self.pty_watcher.unregister(pty.stdout)
 
     def connect_client_to_debug_session(
-        self, *, desired_gdbpid: int, client_id: str
+        self, *, desired_gdbpid: int, client_id: str, encoding: str = JSON
     ) -> DebugSession:
         debug_session = self.debug_session_from_pid(desired_gdbpid)
 
         if not debug_session:
             raise ValueError(f"No existing gdb process with pid {desired_gdbpid}")
-        debug_session.add_client(client_id)
+        debug_session.add_client(client_id, encoding)
         self.debug_session_to_client_ids[debug_session].append(client_id)
+        self._client_id_to_debug_session[client_id] = debug_session
         return debug_session
 
     def add_new_debug_session(
-        self, *, gdb_command: str, mi_version: str, client_id: str
+        self,
+        *,
+        gdb_command: str,
+        mi_version: str,
+        client_id: str,
+        encoding: str = JSON,
     ) -> DebugSession:
         pty_for_debugged_program = Pty()
         pty_for_gdbgui = Pty(echo=False)
@@ -100,8 +202,13 @@ class SessionManager(object):
         pid = pty_for_gdb.pid
         debug_session = DebugSession(
             pygdbmi_controller=IoManager(
-                os.fdopen(pty_for_gdbgui.stdin, mode="wb", buffering=0),  # type: ignore
-                os.fdopen(pty_for_gdbgui.stdout, mode="rb", buffering=0),  # type: ignore
+                # the pty closes its file descriptor when the session ends
+                os.fdopen(  # type: ignore
+                    pty_for_gdbgui.stdin, mode="wb", buffering=0, closefd=False
+                ),
+                os.fdopen(  # type: ignore
+                    pty_for_gdbgui.stdout, mode="rb", buffering=0, closefd=False
+                ),
                 None,
             ),
             pty_for_gdbgui=pty_for_gdbgui,
@@ -111,10 +218,24 @@ class SessionManager(object):
             mi_version=mi_version,
             pid=pid,
         )
-        debug_session.add_client(client_id)
-        self.debug_session_to_client_ids[debug_session] = [client_id]
+        # gdb may have been started with an executable to debug
+        debug_session.write_mi_commands(
+            debug_session.disassembly.get_executable_commands()
+        )
+        self.add_debug_session(debug_session, client_id, encoding)
         return debug_session
 
+    def add_debug_session(
+        self, debug_session: DebugSession, client_id: str, encoding: str = JSON
+    ) -> None:
+        """Start managing an already created debug session, with client_id as
+        its first client"""
+        debug_session.add_client(client_id, encoding)
+        self.debug_session_to_client_ids[debug_session] = [client_id]
+        self._pid_to_debug_session[debug_session.pid] = debug_session
+        self._client_id_to_debug_session[client_id] = debug_session
+        self._register_ptys(debug_session)
+
     def remove_debug_session_by_pid(self, gdbpid: int) -> List[str]:
         debug_session = self.debug_session_from_pid(gdbpid)
         if debug_session:
@@ -126,38 +247,31 @@ class SessionManager(object):
 
     def remove_debug_session(self, debug_session: DebugSession) -> List[str]:
         logger.info(f"Removing debug session for pid {debug_session.pid}")
+        self._unregister_ptys(debug_session)
+        self.mi_output_parser.remove(debug_session)
+        if self.source_watcher is not None:
+            self.source_watcher.unwatch(debug_session)
         try:
             debug_session.terminate()
         except Exception:
             logger.error(traceback.format_exc())
         orphaned_client_ids = self.debug_session_to_client_ids.pop(debug_session, [])
+        if self._pid_to_debug_session.get(debug_session.pid) is debug_session:
+            del self._pid_to_debug_session[debug_session.pid]
+        for client_id in orphaned_client_ids:
+            self._client_id_to_debug_session.pop(client_id, None)
         return orphaned_client_ids
 
-    def remove_debug_sessions_with_no_clients(self) -> None:
-        to_remove = []
-        for debug_session, _ in self.debug_session_to_client_ids.items():
-            if len(debug_session.client_ids) == 0:
-                to_remove.append(debug_session)
-        for debug_session in to_remove:
-            self.remove_debug_session(debug_session)
-
     def get_pid_from_debug_session(self, debug_session: DebugSession) -> Optional[int]:
         if debug_session and debug_session.pid:
             return debug_session.pid
         return None
 
     def debug_session_from_pid(self, pid: int) -> Optional[DebugSession]:
-        for debug_session in self.debug_session_to_client_ids:
-            this_pid = self.get_pid_from_debug_session(debug_session)
-            if this_pid == pid:
-                return debug_session
-        return None
+        return self._pid_to_debug_session.get(pid)
 
     def debug_session_from_client_id(self, client_id: str) -> Optional[DebugSession]:
-        for debug_session, client_ids in self.debug_session_to_client_ids.items():
-            if client_id in client_ids:
-                return debug_session
-        return None
+        return self._client_id_to_debug_session.get(client_id)
 
     def get_dashboard_data(self) -> List[DebugSession]:
         return [
@@ -166,8 +280,12 @@ class SessionManager(object):
         ]
 
     def disconnect_client(self, client_id: str):
-        for debug_session, client_ids in self.debug_session_to_client_ids.items():
-            if client_id in client_ids:
-                client_ids.remove(client_id)
-                debug_session.remove_client(client_id)
-        self.remove_debug_sessions_with_no_clients()
+        debug_session = self._client_id_to_debug_session.pop(client_id, None)
+        if debug_session is None:
+            return
+        client_ids = self.debug_session_to_client_ids.get(debug_session)
+        if client_ids is not None and client_id in client_ids:
+            client_ids.remove(client_id)
+        debug_session.remove_client(client_id)
+        if len(debug_session.client_ids) == 0:
+            self.remove_debug_session(debug_session)
@@ -0,0 +1,508 @@
+"""In-memory cache of the source files served by /read_file
+
+Splitting, lexing and formatting a source file with pygments takes much
+longer than sending it, and the same files are requested over and over,
+by every tab and every time gdb stops in them. Files are highlighted as a
+whole, once, and requests are served from slices of the cached lines.
+
+Large files, such as generated sources and amalgamations, are not read
+as a whole. An index of the byte offset of every line is built once, and
+blocks of lines around the requested ones are sliced out of a memory map
+of the file, decoded and highlighted on their own. Lexing of a block
+starts at a blank line some lines before it, so that constructs spanning
+several lines (like comments) are usually highlighted as they would be
+if the whole file was lexed.
+"""
+import functools
+import hashlib
+import locale
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import pygments  # type: ignore
+from pygments.lexers import get_lexer_for_filename  # type: ignore
+
+from gdbgui import __version__, htmllistformatter
+
+from .highlightcache import HighlightCache
+
+# rough size of a str object, in addition to its characters
+_LINE_OVERHEAD_BYTES = 50
+# files at least this big are read in blocks of lines rather than as a whole
+RANGED_READ_MIN_BYTES = 512 * 1024
+BLOCK_LINES = 1000
+# lexing of a block starts at a blank line between these many lines before it
+MIN_CONTEXT_LINES = 20
+MAX_CONTEXT_LINES = 200
+# source files are only highlighted ahead of time while the cache is less
+# than this full, so they never evict files that were requested
+PREHIGHLIGHT_MAX_CACHE_FRACTION = 0.5
+# what open() decodes files with
+_ENCODING = locale.getpreferredencoding(False)
+
+T = TypeVar("T")
+
+
+class SourceFile(NamedTuple):
+    """A source file, or a block of its lines"""
+
+    # lines of the file, as html if highlighted. Blank lines are " ".
+    lines: List[str]
+    highlighted: bool
+    last_modified_unix_sec: float
+    size_bytes: int
+
+
+class LineIndex(NamedTuple):
+    # byte offset of the start of every line
+    offsets: array
+    size_bytes: int
+
+
+class SourceLines(NamedTuple):
+    """Lines start_line to end_line (inclusive, starting at 1) of a file"""
+
+    lines: List[str]
+    highlighted: bool
+    last_modified_unix_sec: float
+    start_line: int
+    end_line: int
+    num_lines_in_file: int
+
+
+@functools.lru_cache(maxsize=4096)
+def get_lexer_class(filename: str) -> Any:
+    """Return the lexer class for a file name, or None. Pygments matches the
+    file name against the patterns of every lexer, importing lexer modules as
+    it goes, so this is slow the first time for each language."""
+    try:
+        return type(get_lexer_for_filename(filename))
+    except Exception:
+        return None
+
+
+def get_lexer(path: str) -> Any:
+    lexer_class = get_lexer_class(os.path.basename(path))
+    return lexer_class() if lexer_class is not None else None
+
+
+def get_etag(
+    path: str, stat: os.stat_result, start_line: int, end_line: int, highlight: bool
+) -> str:
+    """Return an entity tag for lines start_line to end_line of a file, which
+    changes whenever the file, or how it is highlighted, does. It only needs
+    the file to be stat-ed, not read."""
+    lexer_class = get_lexer_class(os.path.basename(path)) if highlight else None
+    key = (
+        path,
+        stat.st_mtime_ns,
+        stat.st_size,
+        start_line,
+        end_line,
+        lexer_class.__name__ if lexer_class else None,
+        pygments.__version__,
+        __version__,
+    )
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def preload_lexers(paths: Iterable[str]) -> int:
+    """Import and compile the lexers of paths, so the first file highlighted
+    with each of them is not slowed down by it. Returns the number of
+    lexers loaded."""
+    lexer_names = set()
+    checked = set()
+    for path in paths:
+        filename = os.path.basename(path)
+        # files with the same extension have the same lexer, except for
+        # patterns like CMakeLists.txt, which are rare enough to not matter
+        extension = os.path.splitext(filename)[1] or filename
+        if extension in checked:
+            continue
+        checked.add(extension)
+        # the first instance of a lexer class compiles its regular expressions
+        lexer = get_lexer(filename)
+        if lexer is not None:
+            lexer_names.add(lexer.name)
+    return len(lexer_names)
+
+
+def preload_lexers_in_background(paths: Iterable[str]) -> threading.Thread:
+    thread = threading.Thread(
+        target=preload_lexers, args=(paths,), name="gdbgui_lexer_preload", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def find_source_files(directory: str, max_files: int = 10000) -> Iterator[str]:
+    """Yield the paths of up to max_files files in directory, not including
+    hidden files and directories"""
+    num_files = 0
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for filename in files:
+            if filename.startswith("."):
+                continue
+            yield os.path.join(root, filename)
+            num_files += 1
+            if num_files >= max_files:
+                return
+
+
+def highlight_lines(
+    lines: List[str], lexer: Any, disk_cache: Optional[HighlightCache] = None
+) -> List[str]:
+    # if leading lines are '', then the lexer will strip them out, but we want
+    # to preserve blank lines. Insert a space whenever we find a blank line.
+    lines = [line if line else " " for line in lines]
+    if lexer is None:
+        return lines
+    text = "\n".join(lines)
+    if disk_cache is not None:
+        key = disk_cache.get_key(text, lexer)
+        cached = disk_cache.get(key)
+        if cached is not None:
+            return cached
+    # convert string into tokens
+    tokens = lexer.get_tokens(text)
+    # format tokens into nice, marked up list of html
+    highlighted = htmllistformatter.get_marked_up_list(tokens)
+    if disk_cache is not None:
+        disk_cache.put(key, highlighted)
+    return highlighted
+
+
+def get_size_bytes(lines: List[str]) -> int:
+    return sum(len(line) for line in lines) + _LINE_OVERHEAD_BYTES * len(lines)
+
+
+def load_source_file(
+    path: str,
+    stat: os.stat_result,
+    lexer: Any,
+    disk_cache: Optional[HighlightCache] = None,
+) -> SourceFile:
+    with open(path, "r") as f:
+        lines = highlight_lines(f.read().split("\n"), lexer, disk_cache)
+    return SourceFile(
+        lines=lines,
+        highlighted=lexer is not None,
+        last_modified_unix_sec=stat.st_mtime,
+        size_bytes=get_size_bytes(lines),
+    )
+
+
+def build_line_index(path: str) -> LineIndex:
+    offsets = array("Q", [0])
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        offsets.extend(match.end() for match in re.finditer(b"\n", m))
+    return LineIndex(offsets=offsets, size_bytes=offsets.itemsize * len(offsets))
+
+
+def find_restart_line(m: mmap.mmap, offsets: array, line: int) -> int:
+    """Return the index of a line a little before line where lexing can
+    start without being in the middle of a construct that spans several
+    lines: a blank line followed by an unindented line, which is usually
+    between top level declarations. Falls back to MAX_CONTEXT_LINES before
+    line."""
+    first_candidate = max(0, line - MAX_CONTEXT_LINES)
+    for i in range(line - MIN_CONTEXT_LINES, first_candidate, -1):
+        if offsets[i + 1] - offsets[i] == 1 and m[offsets[i + 1]] not in b" \t\r\n":
+            return i
+    return first_candidate
+
+
+def load_block(
+    path: str,
+    stat: os.stat_result,
+    index: LineIndex,
+    block: int,
+    lexer: Any,
+    disk_cache: Optional[HighlightCache] = None,
+) -> SourceFile:
+    """Read and highlight lines block * BLOCK_LINES to
+    (block + 1) * BLOCK_LINES of the file (starting at 0)"""
+    offsets = index.offsets
+    first_line = block * BLOCK_LINES
+    end_line = min(first_line + BLOCK_LINES, len(offsets))
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        lexing_start_line = first_line
+        if lexer is not None and first_line > 0:
+            lexing_start_line = find_restart_line(m, offsets, first_line)
+        end_byte = offsets[end_line] - 1 if end_line < len(offsets) else len(m)
+        text = m[offsets[lexing_start_line] : end_byte].decode(_ENCODING)
+    # like files opened in text mode, which translate "\r\n" to "\n"
+    lines = [line[:-1] if line.endswith("\r") else line for line in text.split("\n")]
+    lines = highlight_lines(lines, lexer, disk_cache)[first_line - lexing_start_line :]
+    return SourceFile(
+        lines=lines,
+        highlighted=lexer is not None,
+        last_modified_unix_sec=stat.st_mtime,
+        size_bytes=get_size_bytes(lines),
+    )
+
+
+class SourceCache:
+    """LRU cache of source files, highlighted if pygments has a lexer for
+    them, holding up to max_bytes of lines
+
+    Entries are keyed on the path, modification time and size of the file,
+    and the lexer it is highlighted with, so a file that changes on disk gets
+    a new entry and the outdated one ages out, unless it is invalidated
+    sooner. All keys start with the path of the file. The html of a highlighted file
+    only contains css classes, so it is the same for every theme.
+
+    Concurrent requests for a file that is not cached yet wait for the
+    request that loads it rather than each loading it.
+
+    If disk_cache is set, highlighted lines are also looked up in and added
+    to it, so they are shared with other gdbgui processes and restarts.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ranged_read_min_bytes=RANGED_READ_MIN_BYTES,
+        disk_cache: Optional[HighlightCache] = None,
+    ):
+        self.max_bytes = max_bytes
+        # highlighted lines shared with other processes, if set
+        self.disk_cache = disk_cache
+        self.ranged_read_min_bytes = ranged_read_min_bytes
+        # values are SourceFile and LineIndex objects
+        self._entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._num_bytes = 0
+        self._loading: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def num_bytes(self) -> int:
+        """Size of the lines that are cached"""
+        return self._num_bytes
+
+    def get(self, path: str, highlight: bool) -> SourceFile:
+        """Return all lines of a file"""
+        stat = os.stat(path)
+        lexer = get_lexer(path) if highlight else None
+        return self._get_file(path, stat, lexer)
+
+    def read(
+        self,
+        path: str,
+        start_line: int,
+        end_line: int,
+        highlight: bool,
+        stat: Optional[os.stat_result] = None,
+    ) -> SourceLines:
+        """Return lines start_line to end_line (inclusive, starting at 1) of a
+        file. Lines past the end of the file are left out. The file is looked
+        up in the cache by stat, such as the one its entity tag was made from,
+        or by the file's current stat if it is not given."""
+        chunks = list(self.iter_read(path, start_line, end_line, highlight, stat))
+        return chunks[0]._replace(
+            lines=[line for chunk in chunks for line in chunk.lines],
+            end_line=chunks[-1].end_line,
+        )
+
+    def iter_read(
+        self,
+        path: str,
+        start_line: int,
+        end_line: int,
+        highlight: bool,
+        stat: Optional[os.stat_result] = None,
+    ) -> Iterator[SourceLines]:
+        """Like read, but yield the lines in chunks of up to BLOCK_LINES lines,
+        each one as soon as it is highlighted. The lines of a large file are
+        highlighted a block at a time, so the first chunk does not take
+        longer for larger files. At least one (maybe empty) chunk is yielded."""
+        if stat is None:
+            stat = os.stat(path)
+        lexer = get_lexer(path) if highlight else None
+        source_file = None
+        index = None
+        if stat.st_size < self.ranged_read_min_bytes:
+            source_file = self._get_file(path, stat, lexer)
+            num_lines_in_file = len(source_file.lines)
+        else:
+            index = self._load(
+                (path, "index", stat.st_mtime_ns, stat.st_size),
+                lambda: build_line_index(path),
+            )
+            num_lines_in_file = len(index.offsets)
+        end_line = min(end_line, num_lines_in_file)
+
+        chunk_start_line = start_line
+        while True:
+            block = (chunk_start_line - 1) // BLOCK_LINES
+            chunk_end_line = min(end_line, (block + 1) * BLOCK_LINES)
+            if source_file is not None:
+                lines = source_file.lines[chunk_start_line - 1 : chunk_end_line]
+            elif index is not None and chunk_start_line <= chunk_end_line:
+                block_lines = self._get_block(path, stat, index, block, lexer).lines
+                first_line = block * BLOCK_LINES + 1
+                lines = block_lines[
+                    chunk_start_line - first_line : chunk_end_line - first_line + 1
+                ]
+            else:
+                # past the end of the file
+                lines = []
+            yield SourceLines(
+                lines=lines,
+                highlighted=lexer is not None,
+                last_modified_unix_sec=stat.st_mtime,
+                start_line=chunk_start_line,
+                end_line=chunk_end_line,
+                num_lines_in_file=num_lines_in_file,
+            )
+            chunk_start_line = chunk_end_line + 1
+            if chunk_start_line > end_line:
+                return
+
+    def invalidate(self, path: str) -> None:
+        """Drop every cached version of a file, such as after it changed"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self._num_bytes -= self._entries.pop(key).size_bytes
+
+    def _get_file(self, path: str, stat: os.stat_result, lexer: Any) -> SourceFile:
+        key = (path, stat.st_mtime_ns, stat.st_size, lexer.name if lexer else None)
+        return self._load(
+            key, lambda: load_source_file(path, stat, lexer, self.disk_cache)
+        )
+
+    def _get_block(
+        self, path: str, stat: os.stat_result, index: LineIndex, block: int, lexer: Any
+    ) -> SourceFile:
+        key = (
+            path,
+            stat.st_mtime_ns,
+            stat.st_size,
+            lexer.name if lexer else None,
+            block,
+        )
+        return self._load(
+            key, lambda: load_block(path, stat, index, block, lexer, self.disk_cache)
+        )
+
+    def _load(self, key: Tuple, load: Callable[[], T]) -> T:
+        """Return the cached value of key, or the value returned by load"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+            future = self._loading.get(key)
+            is_loading = future is not None
+            if future is None:
+                future = self._loading[key] = Future()
+        if is_loading:
+            return future.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._add(key, value)
+            del self._loading[key]
+        future.set_result(value)
+        return value
+
+    def _add(self, key: Tuple, value: Any) -> None:
+        if value.size_bytes > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._num_bytes += value.size_bytes
+        while self._num_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._num_bytes -= evicted.size_bytes
+
+
+def lower_thread_priority() -> None:
+    """Make the os schedule the calling thread after other threads of the
+    process, where the os supports priorities of threads (Linux)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+class SourcePrehighlighter:
+    """Highlight source files into a SourceCache before they are requested,
+    so they are shown right away when gdb stops in them
+
+    Files are highlighted one at a time, in the order they were added, on a
+    thread with a low priority. Priority files, such as the ones in the
+    backtrace, are moved to the front of the queue. Files are only
+    highlighted while the cache is less than PREHIGHLIGHT_MAX_CACHE_FRACTION
+    full.
+    """
+
+    def __init__(self, cache: SourceCache):
+        self.cache = cache
+        self._queue: Deque[str] = deque()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, paths: Iterable[str], priority_paths: Iterable[str] = ()) -> None:
+        with self._condition:
+            queued = set(self._queue)
+            for path in paths:
+                if path not in queued:
+                    self._queue.append(path)
+                    queued.add(path)
+            for path in reversed(list(priority_paths)):
+                if path in queued:
+                    self._queue.remove(path)
+                self._queue.appendleft(path)
+                queued.add(path)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="gdbgui_prehighlight", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        lower_thread_priority()
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                path = self._queue.popleft()
+            self.prehighlight(path)
+
+    def prehighlight(self, path: str) -> bool:
+        """Highlight a file into the cache, or the first block of lines of a
+        large file. Returns False if there was no room or it failed."""
+        cache = self.cache
+        if cache.num_bytes >= cache.max_bytes * PREHIGHLIGHT_MAX_CACHE_FRACTION:
+            return False
+        try:
+            cache.read(path, 1, 1, highlight=True)
+        except Exception:
+            return False
+        return True
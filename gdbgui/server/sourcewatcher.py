@@ -0,0 +1,268 @@
+"""Watch the source files that clients have open for changes
+
+On Linux, the directories of the watched files are watched with inotify,
+so nothing is done until a file in one of them changes. Elsewhere, or if
+inotify is not available, the watched files are stat-ed periodically.
+Either way, a file is only reported as changed if its modification time or
+size did, so events for files in the same directory, or several events for
+one change, are not reported.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import selectors
+import struct
+import threading
+import time
+from types import ModuleType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL_SEC = 1.0
+# a file was written, moved or deleted, or its modification time was set
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_WATCH_MASK = (
+    _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_ONLYDIR
+)
+_EVENT = struct.Struct("iIII")
+
+
+class SourceFileChange(NamedTuple):
+    path: str
+    # None if the file was deleted
+    last_modified_unix_sec: Optional[float]
+    # keys the file was watched with
+    keys: Set[Any]
+
+
+def get_file_version(path: str) -> Optional[Tuple[int, int, float]]:
+    """Return the modification time (in ns and in seconds) and size of a
+    file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_mtime)
+
+
+class Inotify:
+    """Directories watched with the inotify api of Linux, through libc"""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._inotify_add_watch = libc.inotify_add_watch
+        self._inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self._inotify_rm_watch = libc.inotify_rm_watch
+        self._inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._wd_to_directory: Dict[int, str] = {}
+        self._directory_to_wd: Dict[str, int] = {}
+
+    def add_directory(self, directory: str) -> None:
+        wd = self._inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self._wd_to_directory[wd] = directory
+        self._directory_to_wd[directory] = wd
+
+    def remove_directory(self, directory: str) -> None:
+        wd = self._directory_to_wd.pop(directory, None)
+        if wd is not None:
+            self._wd_to_directory.pop(wd, None)
+            self._inotify_rm_watch(self.fd, wd)
+
+    def read_changed_paths(self) -> Optional[Set[str]]:
+        """Return the paths of the files that changed since the last call, or
+        None if events were lost and any file may have changed"""
+        changed_paths: Optional[Set[str]] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed_paths
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, name_len = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + name_len].rstrip(b"\0")
+                offset += name_len
+                if mask & _IN_Q_OVERFLOW:
+                    changed_paths = None
+                if mask & _IN_IGNORED:
+                    # the directory was deleted
+                    directory = self._wd_to_directory.pop(wd, None)
+                    if directory is not None:
+                        self._directory_to_wd.pop(directory, None)
+                    continue
+                directory = self._wd_to_directory.get(wd)
+                if directory is not None and name and changed_paths is not None:
+                    changed_paths.add(os.path.join(directory, os.fsdecode(name)))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class SourceWatcher:
+    """Files watched on behalf of keys (such as debug sessions)
+
+    `wait` blocks until some of the watched files changed, and returns them
+    along with the keys that watch them. It uses a selector from
+    selectors_module to wait on inotify, and sleep between polls, so both
+    can be made to cooperate with eventlet or gevent.
+    """
+
+    def __init__(
+        self,
+        selectors_module: ModuleType = selectors,
+        sleep: Callable[[float], None] = time.sleep,
+        use_inotify: bool = True,
+    ):
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._path_to_keys: Dict[str, Set[Hashable]] = {}
+        self._versions: Dict[str, Optional[Tuple[int, int, float]]] = {}
+        self._directory_to_paths: Dict[str, Set[str]] = {}
+        self._inotify: Optional[Inotify] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError, TypeError):
+                # not Linux, or inotify is not available
+                logger.info("inotify is not available, polling source files")
+        if self._inotify is not None:
+            self._selector = selectors_module.DefaultSelector()
+            self._selector.register(self._inotify.fd, selectors.EVENT_READ)
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def watch(self, path: str, key: Hashable) -> None:
+        path = os.path.abspath(path)
+        with self._lock:
+            keys = self._path_to_keys.get(path)
+            if keys is not None:
+                keys.add(key)
+                return
+            self._path_to_keys[path] = {key}
+            self._versions[path] = get_file_version(path)
+            directory = os.path.dirname(path)
+            paths = self._directory_to_paths.setdefault(directory, set())
+            paths.add(path)
+            if self._inotify is not None and len(paths) == 1:
+                try:
+                    self._inotify.add_directory(directory)
+                except OSError as e:
+                    logger.warning(f"Failed to watch {directory}: {e}")
+
+    def unwatch(self, key: Hashable) -> None:
+        """Stop watching files on behalf of key"""
+        with self._lock:
+            for path, keys in list(self._path_to_keys.items()):
+                keys.discard(key)
+                if not keys:
+                    self._remove_path(path)
+
+    def _remove_path(self, path: str) -> None:
+        del self._path_to_keys[path]
+        del self._versions[path]
+        directory = os.path.dirname(path)
+        paths = self._directory_to_paths[directory]
+        paths.discard(path)
+        if not paths:
+            del self._directory_to_paths[directory]
+            if self._inotify is not None:
+                self._inotify.remove_directory(directory)
+
+    def fileno(self) -> Optional[int]:
+        """Return the inotify file descriptor, which is readable when watched
+        files may have changed, or None if files are polled"""
+        return self._inotify.fd if self._inotify is not None else None
+
+    def read_changes(self) -> List[SourceFileChange]:
+        """Return the watched files that changed since they were last
+        checked. Does not block."""
+        if self._inotify is not None:
+            return self.check(self._inotify.read_changed_paths())
+        return self.check()
+
+    def wait(self, timeout_sec: Optional[float] = None) -> List[SourceFileChange]:
+        """Wait for changes, for up to timeout_sec if it is not None"""
+        deadline = None if timeout_sec is None else time.monotonic() + timeout_sec
+        while True:
+            remaining = (
+                None if deadline is None else max(0, deadline - time.monotonic())
+            )
+            if self._selector is None or self._selector.select(remaining):
+                changes = self.read_changes()
+                if changes:
+                    return changes
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+            if self._selector is None:
+                self._sleep(
+                    POLL_INTERVAL_SEC
+                    if remaining is None
+                    else min(POLL_INTERVAL_SEC, remaining)
+                )
+
+    def check(self, paths: Optional[Set[str]] = None) -> List[SourceFileChange]:
+        """Return the watched files out of paths (all of them if None) that
+        changed since they were last checked"""
+        with self._lock:
+            if paths is None:
+                paths = set(self._path_to_keys)
+            changes = []
+            for path in paths:
+                keys = self._path_to_keys.get(path)
+                if keys is None:
+                    continue
+                version = get_file_version(path)
+                if version == self._versions[path]:
+                    continue
+                self._versions[path] = version
+                changes.append(
+                    SourceFileChange(
+                        path=path,
+                        last_modified_unix_sec=(
+                            version[2] if version is not None else None
+                        ),
+                        keys=set(keys),
+                    )
+                )
+            return changes
@@ -0,0 +1,50 @@
+"""Encodings of the websocket events that carry most of gdbgui's traffic
+
+By default every event is sent as JSON. Clients can opt in to MessagePack
+when they connect, if the optional msgpack package is installed. gdb mi
+records are then sent as arrays of their fields in the order of
+GDB_RESPONSE_FIELDS rather than as objects, so their keys are not repeated
+in every record, and pty output is sent as raw utf-8 bytes, which xterm
+writes without decoding.
+"""
+from typing import Any, Dict, List, Optional
+
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+# the schema of gdb mi records sent with msgpack
+GDB_RESPONSE_FIELDS = ("type", "message", "payload", "stream", "token")
+BINARY_EVENTS = {"gdb_response", "user_pty_response", "program_pty_response"}
+
+
+def negotiate_encoding(requested: Optional[str]) -> str:
+    """Return the encoding to use for a client that requested an encoding
+    when connecting. Falls back to json if it is not available."""
+    if requested == MSGPACK and msgpack is not None:
+        return MSGPACK
+    return JSON
+
+
+def encode_event_data(event: str, data: Any, encoding: str) -> Any:
+    if encoding == JSON or event not in BINARY_EVENTS:
+        return data
+    elif encoding == MSGPACK:
+        if event == "gdb_response":
+            return msgpack.packb([_gdb_response_to_row(r) for r in data])
+        return data.encode("utf-8")
+    raise ValueError(f"Unknown encoding {encoding}")
+
+
+def _gdb_response_to_row(response: Dict[str, Any]) -> List[Any]:
+    row = [response.get(field) for field in GDB_RESPONSE_FIELDS]
+    extra_fields = {
+        key: value for key, value in response.items() if key not in GDB_RESPONSE_FIELDS
+    }
+    if extra_fields:
+        # not part of the schema, so sent as a map after the known fields
+        row.append(extra_fields)
+    return row
@@ -3,6 +3,7 @@ import GdbApi from "./GdbApi";
 import SourceCode from "./SourceCode";
 import Locals from "./Locals";
 import Memory from "./Memory";
+import Registers from "./Registers";
 import constants from "./constants";
 import React from "react";
 void React; // using jsx implicity uses React
@@ -46,8 +47,7 @@ const Actions = {
     store.set("inferior_program", constants.inferior_states.exited);
     store.set("disassembly_for_missing_file", []);
     store.set("root_gdb_tree_var", null);
-    store.set("previous_register_values", {});
-    store.set("current_register_values", {});
+    Registers.clear_cached_values();
     store.set("inferior_pid", null);
     Actions.clear_program_state();
   },
@@ -55,7 +55,10 @@ const Actions = {
    * Request relevant store information from gdb to refresh UI
    */
   refresh_state_for_gdb_pause: function() {
+    // the server reads the memory and registers that are displayed again when
+    // gdb pauses, once they were read
     GdbApi.run_gdb_command(GdbApi._get_refresh_state_for_pause_cmds());
+    Registers.watch_values();
   },
   execute_console_command: function(command: any) {
     if (store.get("refresh_state_after_sending_console_command")) {
@@ -66,7 +69,7 @@ const Actions = {
   },
   onConsoleCommandRun: function() {
     if (store.get("refresh_state_after_sending_console_command")) {
-      GdbApi.run_gdb_command(GdbApi._get_refresh_state_for_pause_cmds());
+      GdbApi.run_command_and_refresh_state([]);
     }
   },
   clear_console: function() {
@@ -211,6 +214,12 @@ const Actions = {
     }
     store.set("cached_source_files", cached_source_files);
   },
+  remove_cached_source_file(fullname: string) {
+    store.set(
+      "cached_source_files",
+      store.get("cached_source_files").filter((f: any) => f.fullname !== fullname)
+    );
+  },
   update_max_lines_of_code_to_fetch(new_value: any) {
     if (new_value <= 0) {
       new_value = constants.default_max_lines_of_code_to_fetch;
@@ -16,104 +16,147 @@ if (debug) {
   };
 }
 
+type SourceFetch = { fullname: string; start_line: number; end_line: number };
+
+/**
+ * Fetches lines of source files. Everything requested while requests are in
+ * flight (or in the same tick) is fetched at once, with a request to
+ * /read_file per file. The server reads the files in parallel and streams
+ * them back in blocks of lines, each one as a line of json as soon as it is
+ * highlighted, so the first lines of a large file are shown while the rest
+ * are arriving. Responses have an ETag, so the browser only gets a file it
+ * already has again if it changed.
+ */
 let FileFetcher = {
   _is_fetching: false,
-  _queue: [],
-  _fetch: function(fullname: any, start_line: any, end_line: any) {
-    if (FileOps.is_missing_file(fullname)) {
-      // file doesn't exist and we already know about it
-      // don't keep trying to fetch disassembly
-      console.warn(`tried to fetch a file known to be missing ${fullname}`);
-      FileFetcher._is_fetching = false;
-      FileFetcher._fetch_next();
-      return;
-    }
-
-    // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
-    if (!_.isString(fullname)) {
-      console.warn(`trying to fetch filename that is not a string`, fullname);
-      FileOps.add_missing_file(fullname);
-      FileFetcher._is_fetching = false;
-      FileFetcher._fetch_next();
-    }
-
+  _fetch_scheduled: false,
+  _queue: [] as Array<SourceFetch>,
+  _in_flight: [] as Array<SourceFetch>,
+  _fetch: function(fetches: Array<SourceFetch>) {
     FileFetcher._is_fetching = true;
-
-    const data = {
-      start_line: start_line,
-      end_line: end_line,
-      path: fullname,
-      highlight: store.get("highlight_source_code")
+    FileFetcher._in_flight = fetches;
+    store.set("files_being_fetched", fetches.map(fetch => fetch.fullname));
+    let num_in_flight = fetches.length;
+    for (const fetch of fetches) {
+      FileFetcher._fetch_file(fetch, function() {
+        num_in_flight--;
+        if (num_in_flight === 0) {
+          FileFetcher._is_fetching = false;
+          FileFetcher._in_flight = [];
+          store.set("files_being_fetched", []);
+          FileFetcher._fetch_next();
+        }
+      });
+    }
+  },
+  _fetch_file: function(fetch: SourceFetch, done: () => void) {
+    const xhr = new XMLHttpRequest();
+    const query = $.param({
+      path: fetch.fullname,
+      start_line: fetch.start_line,
+      end_line: fetch.end_line,
+      highlight: store.get("highlight_source_code"),
+      stream: true
+    });
+    xhr.open("GET", `/read_file?${query}`);
+    xhr.setRequestHeader(
+      "x-csrftoken",
+      // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name 'initial_data'.
+      initial_data.csrf_token
+    ); /* global initial_data */
+
+    let num_chars_processed = 0;
+    const process_received_lines = function() {
+      // only complete lines, the last one may still be arriving
+      const end = xhr.responseText.lastIndexOf("\n") + 1;
+      const lines = xhr.responseText.slice(num_chars_processed, end).split("\n");
+      num_chars_processed = end;
+      for (const line of lines) {
+        if (line) {
+          FileFetcher._receive_file(JSON.parse(line));
+        }
+      }
     };
-
-    $.ajax({
-      beforeSend: function(xhr) {
-        xhr.setRequestHeader(
-          "x-csrftoken",
-          // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name 'initial_data'.
-          initial_data.csrf_token
-        ); /* global initial_data */
-      },
-      url: "/read_file",
-      cache: false,
-      type: "GET",
-      data: data,
-      success: function(response) {
-        response.source_code;
-        let source_code_obj = {};
-        let linenum = response.start_line;
-        for (let line of response.source_code_array) {
-          // @ts-expect-error ts-migrate(7053) FIXME: Element implicitly has an 'any' type because expre... Remove this comment to see the full error message
-          source_code_obj[linenum] = line;
-          linenum++;
+    xhr.onprogress = function() {
+      if (xhr.status === 200) {
+        process_received_lines();
+      }
+    };
+    xhr.onload = function() {
+      if (xhr.status === 200) {
+        process_received_lines();
+      } else {
+        let message = `${xhr.statusText} (${xhr.status} error)`;
+        try {
+          message = JSON.parse(xhr.responseText).message || message;
+        } catch (e) {
+          // not a json error message
         }
-
-        FileOps.add_source_file_to_cache(
-          fullname,
-          source_code_obj,
-          response.last_modified_unix_sec,
-          response.num_lines_in_file
+        Actions.add_console_entries(
+          // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
+          _.escape(message),
+          constants.console_entry_type.STD_ERR
         );
-      },
-      error: function(response) {
-        if (response.responseJSON && response.responseJSON.message) {
-          Actions.add_console_entries(
-            // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
-            _.escape(response.responseJSON.message),
-            constants.console_entry_type.STD_ERR
-          );
-        } else {
-          Actions.add_console_entries(
-            `${response.statusText} (${response.status} error)`,
-            constants.console_entry_type.STD_ERR
-          );
-        }
-        FileOps.add_missing_file(fullname);
-      },
-      complete: function() {
-        FileFetcher._is_fetching = false;
-
-        // @ts-expect-error ts-migrate(2339) FIXME: Property 'fullname' does not exist on type 'never'... Remove this comment to see the full error message
-        FileFetcher._queue = FileFetcher._queue.filter(o => o.fullname !== fullname);
-
-        FileFetcher._fetch_next();
+        FileOps.add_missing_file(fetch.fullname);
       }
-    });
+    };
+    xhr.onloadend = done;
+    xhr.send();
+  },
+  _receive_file: function(response: any) {
+    if (!response.source_code_array) {
+      Actions.add_console_entries(
+        // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
+        _.escape(response.message),
+        constants.console_entry_type.STD_ERR
+      );
+      FileOps.add_missing_file(response.path);
+      return;
+    }
+    let source_code_obj = {};
+    let linenum = response.start_line;
+    for (let line of response.source_code_array) {
+      // @ts-expect-error ts-migrate(7053) FIXME: Element implicitly has an 'any' type because expre... Remove this comment to see the full error message
+      source_code_obj[linenum] = line;
+      linenum++;
+    }
+
+    FileOps.add_source_file_to_cache(
+      response.path,
+      source_code_obj,
+      response.last_modified_unix_sec,
+      response.num_lines_in_file
+    );
   },
   _fetch_next: function() {
+    FileFetcher._fetch_scheduled = false;
     if (FileFetcher._is_fetching) {
       return;
     }
-    if (FileFetcher._queue.length) {
-      let obj = FileFetcher._queue.shift();
-      // @ts-expect-error ts-migrate(2532) FIXME: Object is possibly 'undefined'.
-      FileFetcher._fetch(obj.fullname, obj.start_line, obj.end_line);
+    const fetches = FileFetcher._queue.filter(fetch => {
+      if (FileOps.lines_are_cached(fetch.fullname, fetch.start_line, fetch.end_line)) {
+        // streamed by the previous request
+        return false;
+      }
+      if (FileOps.is_missing_file(fetch.fullname)) {
+        // file doesn't exist and we already know about it
+        // don't keep trying to fetch disassembly
+        console.warn(`tried to fetch a file known to be missing ${fetch.fullname}`);
+        return false;
+      }
+      // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
+      if (!_.isString(fetch.fullname)) {
+        console.warn(`trying to fetch filename that is not a string`, fetch.fullname);
+        FileOps.add_missing_file(fetch.fullname);
+        return false;
+      }
+      return true;
+    });
+    FileFetcher._queue = [];
+    if (fetches.length) {
+      FileFetcher._fetch(fetches);
     }
   },
-  fetch_complete() {
-    FileFetcher._is_fetching = false;
-    FileFetcher._fetch_next();
-  },
   fetch: function(fullname: any, start_line: any, end_line: any) {
     if (!start_line) {
       start_line = 1;
@@ -131,15 +174,32 @@ let FileFetcher = {
       return;
     }
 
-    // @ts-expect-error ts-migrate(2322) FIXME: Type 'any' is not assignable to type 'never'.
+    if (
+      FileFetcher._in_flight.some(
+        fetch =>
+          fetch.fullname === fullname &&
+          fetch.start_line <= start_line &&
+          end_line <= fetch.end_line
+      )
+    ) {
+      // the lines are still being streamed
+      return;
+    }
+
     FileFetcher._queue.push({ fullname, start_line, end_line });
-    FileFetcher._fetch_next();
+    if (!FileFetcher._fetch_scheduled) {
+      // fetch everything requested in this tick at once
+      FileFetcher._fetch_scheduled = true;
+      setTimeout(FileFetcher._fetch_next, 0);
+    }
   }
 };
 
 const FileOps = {
   warning_shown_for_old_binary: false,
   unfetchable_disassembly_addresses: {},
+  // paths sent to be prehighlighted, true if they were sent as priority paths
+  prehighlight_requested: {} as { [path: string]: boolean },
   disassembly_addr_being_fetched: null,
   init: function() {
     // @ts-expect-error ts-migrate(2339) FIXME: Property 'subscribeToKeys' does not exist on type ... Remove this comment to see the full error message
@@ -406,6 +466,8 @@ const FileOps = {
 
       cached_source_files.push(new_source_file);
       store.set("cached_source_files", cached_source_files);
+      // the server sends source_file_changed when it changes on disk
+      GdbApi.getSocket().emit("watch_source_files", { paths: [fullname] });
       FileOps.warning_shown_for_old_binary = false;
       FileOps.show_modal_if_file_modified_after_binary(
         fullname,
@@ -462,8 +524,40 @@ const FileOps = {
     }
     return [];
   },
+  /**
+   * Check the modification times of all cached files in one request, and drop the files
+   * that changed from the cache so they are fetched again
+   */
   refresh_cached_source_files: function() {
-    FileOps.clear_cached_source_files();
+    let paths = store.get("cached_source_files").map((f: any) => f.fullname);
+    if (paths.length === 0) {
+      return;
+    }
+    $.ajax({
+      beforeSend: function(xhr) {
+        xhr.setRequestHeader(
+          "x-csrftoken",
+          // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name 'initial_data'.
+          initial_data.csrf_token
+        ); /* global initial_data */
+      },
+      url: "/get_last_modified_unix_secs",
+      cache: false,
+      type: "POST",
+      contentType: "application/json",
+      data: JSON.stringify({ paths: paths }),
+      success: function(data: { last_modified_unix_secs: { [path: string]: any } }) {
+        let cached_source_files = store.get("cached_source_files"),
+          unchanged_files = cached_source_files.filter(
+            (f: any) =>
+              data.last_modified_unix_secs[f.fullname] === f.last_modified_unix_sec
+          );
+        if (unchanged_files.length !== cached_source_files.length) {
+          store.set("cached_source_files", unchanged_files);
+        }
+      },
+      error: FileOps.clear_cached_source_files
+    });
   },
   clear_cached_source_files: function() {
     store.set("cached_source_files", []);
@@ -527,6 +621,76 @@ const FileOps = {
     missing_files.push(fullname);
     store.set("missing_files", missing_files);
   },
+  /**
+   * Ask the server to load the syntax highlighters of the source files of
+   * a newly loaded executable, if it was started with --preload-lexers
+   */
+  preload_lexers: function(source_file_paths: Array<string>) {
+    // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name 'initial_data'.
+    if (!initial_data.preload_lexers) {
+      return;
+    }
+    $.ajax({
+      beforeSend: function(xhr) {
+        xhr.setRequestHeader(
+          "x-csrftoken",
+          // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name 'initial_data'.
+          initial_data.csrf_token
+        ); /* global initial_data */
+      },
+      url: "/preload_lexers",
+      cache: false,
+      type: "POST",
+      contentType: "application/json",
+      data: JSON.stringify({ paths: source_file_paths })
+    });
+  },
+  /**
+   * Have the server highlight source files in the background, starting with
+   * priority_paths. Paths that were sent before are not sent again, unless
+   * they become priority paths.
+   */
+  prehighlight_source_files: function(
+    source_file_paths: Array<string>,
+    priority_paths: Array<string>
+  ) {
+    // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name 'initial_data'.
+    if (!initial_data.prehighlight_source_files) {
+      return;
+    }
+    const requested = FileOps.prehighlight_requested;
+    source_file_paths = source_file_paths.filter(path => !(path in requested));
+    priority_paths = priority_paths.filter(path => requested[path] !== true);
+    if (source_file_paths.length === 0 && priority_paths.length === 0) {
+      return;
+    }
+    for (const path of source_file_paths) {
+      requested[path] = false;
+    }
+    for (const path of priority_paths) {
+      requested[path] = true;
+    }
+    $.ajax({
+      beforeSend: function(xhr) {
+        xhr.setRequestHeader(
+          "x-csrftoken",
+          // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name 'initial_data'.
+          initial_data.csrf_token
+        ); /* global initial_data */
+      },
+      url: "/prehighlight_source_files",
+      cache: false,
+      type: "POST",
+      contentType: "application/json",
+      data: JSON.stringify({ paths: source_file_paths, priority_paths: priority_paths })
+    });
+  },
+  get_backtrace_paths: function(): Array<string> {
+    return store
+      .get("stack")
+      .map((frame: any) => frame.fullname)
+      .filter((fullname: any) => typeof fullname === "string");
+  },
   /**
    * gdb changed its api for the data-disassemble command
    * see https://www.sourceware.org/gdb/onlinedocs/gdb/GDB_002fMI-Data-Manipulation.html
@@ -9,6 +9,8 @@ import Actions from "./Actions";
 import GdbVariable from "./GdbVariable";
 import constants from "./constants";
 import process_gdb_response from "./process_gdb_response";
+import { decodeGdbResponse } from "./msgpack";
+import { resetPayloads, restorePayloads } from "./ResponseDeltas";
 import React from "react";
 import io from "socket.io-client";
 void React; // needed when using JSX, but not marked as used
@@ -48,7 +50,11 @@ const GdbApi = {
       query: {
         csrf_token: initial_data.csrf_token,
         gdbpid: initial_data.gdbpid,
-        gdb_command: initial_data.gdb_command
+        gdb_command: initial_data.gdb_command,
+        // the server falls back to json if it can't send msgpack
+        encoding: store.get("binary_websocket_messages") ? "msgpack" : "json",
+        // results of repeated commands can be sent as diffs
+        delta_updates: "1"
       }
     });
 
@@ -65,8 +71,24 @@ const GdbApi = {
       // @ts-expect-error ts-migrate(2769) FIXME: Argument of type 'null' is not assignable to param... Remove this comment to see the full error message
       clearTimeout(GdbApi._waiting_for_response_timeout);
       store.set("waiting_for_response", false);
+      if (!Array.isArray(response_array)) {
+        // sent as msgpack
+        response_array = decodeGdbResponse(response_array);
+      }
+      response_array = restorePayloads(response_array, (command_ids: Array<number>) =>
+        socket.emit("resync_gdb_responses", { command_ids: command_ids })
+      );
       process_gdb_response(response_array);
     });
+    socket.on("memory_response", Memory.save_memory_response);
+    socket.on("register_values", Registers.save_values);
+    socket.on("source_file_changed", function(data: {
+      path: string;
+      last_modified_unix_sec: number | null;
+    }) {
+      // it is fetched again if it is being displayed
+      Actions.remove_cached_source_file(data.path);
+    });
     socket.on("fatal_server_error", function(data: { message: null | string }) {
       Actions.add_console_entries(
         `Message from server: ${data.message}`,
@@ -113,6 +135,8 @@ const GdbApi = {
         return;
       }
       store.set("gdb_pid", gdb_pid);
+      // results of the previous session must not be taken for this one's
+      resetPayloads();
 
       if (started_new_gdb_process) {
         GdbApi.run_initial_commands();
@@ -329,6 +353,37 @@ const GdbApi = {
       store.set("queuedGdbCommands", queuedGdbCommands);
     }
   },
+  /**
+   * Read num_bytes of memory starting at start_addr. The server reads it with
+   * a few gdb commands, and sends it back as a single memory_response event.
+   * A watched range is read again whenever gdb pauses, and only the bytes
+   * that changed are sent unless full is set.
+   */
+  read_memory: function(
+    start_addr: number,
+    num_bytes: number,
+    watch: boolean = false,
+    full: boolean = true
+  ) {
+    if (socket.connected) {
+      socket.emit("read_memory", {
+        start_addr: "0x" + start_addr.toString(16),
+        num_bytes: num_bytes,
+        watch: watch,
+        full: full
+      });
+    }
+  },
+  /**
+   * Read the registers that changed, or every register if full is set, and
+   * the vector registers in expanded. The server sends them back as a
+   * register_values event, and again whenever gdb pauses.
+   */
+  read_registers: function(expanded: Array<string>, full: boolean) {
+    if (socket.connected) {
+      socket.emit("read_registers", { expanded: expanded, full: full });
+    }
+  },
   run_command_and_refresh_state: function(user_cmd: string | any[]) {
     let cmds: any[] = [];
     if (Array.isArray(user_cmd)) {
@@ -339,12 +394,17 @@ const GdbApi = {
     }
     cmds = cmds.concat(GdbApi._get_refresh_state_for_pause_cmds());
     GdbApi.run_gdb_command(cmds);
+    // re-fetch memory over desired range as specified by DOM inputs
+    Memory.read_memory_from_state();
+    Registers.watch_values();
   },
   backtrace: function() {
     let cmds = ["backtrace"];
     cmds = cmds.concat(GdbApi._get_refresh_state_for_pause_cmds());
     store.set("inferior_program", constants.inferior_states.paused);
     GdbApi.run_gdb_command(cmds);
+    Memory.read_memory_from_state();
+    Registers.watch_values();
   },
   /**
    * Get array of commands to send to gdb that refreshes everything in the
@@ -366,9 +426,6 @@ const GdbApi = {
     // update registers
     cmds = cmds.concat(Registers.get_update_cmds());
 
-    // re-fetch memory over desired range as specified by DOM inputs
-    cmds = cmds.concat(Memory.get_gdb_commands_from_state());
-
     // refresh breakpoints
     cmds.push(GdbApi.get_break_list_cmd());
 
@@ -42,6 +42,7 @@ const initial_store_data = {
   highlight_source_code: true, // get saved boolean to highlight source code
   max_lines_of_code_to_fetch: constants.default_max_lines_of_code_to_fetch,
   auto_add_breakpoint_to_main: true,
+  binary_websocket_messages: false, // request msgpack encoded gdb and pty output from the server
 
   pretty_print: true, // whether gdb should "pretty print" variables. There is an option for this in Settings
   refresh_state_after_sending_console_command: true, // If true, send commands to refresh GUI store after each command is sent from console
@@ -74,6 +75,8 @@ const initial_store_data = {
   source_code_selection_state: constants.source_code_selection_states.PAUSED_FRAME,
 
   source_code_infinite_scrolling: false,
+  // scrollTop of the code container the visible rows were rendered for
+  source_code_scroll_top: 0,
   source_linenum_to_display_start: 0,
   source_linenum_to_display_end: 0,
 
@@ -85,9 +88,19 @@ const initial_store_data = {
   register_names: [],
   previous_register_values: {},
   current_register_values: {},
+  // version of current_register_values the server last sent
+  register_version: null,
+  vector_registers: [],
+  // vector registers whose values are shown, by number
+  expanded_registers: {},
 
   // memory
   memory_cache: {},
+  // range of memory_cache, the version of it the server last sent, and the
+  // addresses of the bytes that changed in that version
+  memory_range: null,
+  memory_version: null,
+  memory_changed_addrs: {},
   start_addr: "",
   end_addr: "",
   bytes_per_line: "8",
@@ -12,12 +12,30 @@ import ReactTable from "./ReactTable";
 // @ts-expect-error ts-migrate(2691) FIXME: An import path cannot end with a '.tsx' extension.... Remove this comment to see the full error message
 import MemoryLink from "./MemoryLink.tsx";
 import Actions from "./Actions";
+import { getChangedAddrs } from "./MemoryChanges";
 import React from "react";
 
 type State = any;
 
+type MemoryBlock = { begin: string; contents: string };
+type MemoryRange = { start_addr: number; num_bytes: number };
+// sent with blocks when the whole range is read, and with base_version and
+// changed_blocks when only what changed in a watched range is sent
+type MemoryResponse = {
+  start_addr: string;
+  num_bytes: number;
+  errors: Array<string>;
+  blocks?: Array<MemoryBlock>;
+  version?: number;
+  base_version?: number;
+  changed_blocks?: Array<MemoryBlock>;
+  changed_bitmap?: [number, string];
+};
+
 class Memory extends React.Component<{}, State> {
-  static MAX_ADDRESS_DELTA_BYTES = 1000;
+  // ranges are read by the server with a few gdb commands, so this is only
+  // limited by how many rows the table can render
+  static MAX_ADDRESS_DELTA_BYTES = 65536;
   static DEFAULT_ADDRESS_DELTA_BYTES = 31;
   static DEFAULT_BYTES_PER_LINE = 8;
 
@@ -27,6 +45,7 @@ class Memory extends React.Component<{}, State> {
     // @ts-expect-error ts-migrate(2339) FIXME: Property 'connectComponentState' does not exist on... Remove this comment to see the full error message
     store.connectComponentState(this, [
       "memory_cache",
+      "memory_changed_addrs",
       "start_addr",
       "end_addr",
       "bytes_per_line"
@@ -47,6 +66,7 @@ class Memory extends React.Component<{}, State> {
       i = 0,
       hex_addr_to_display = null;
 
+    const changed_addrs = store.get("memory_changed_addrs");
     let bytes_per_line =
       parseInt(store.get("bytes_per_line")) || Memory.DEFAULT_BYTES_PER_LINE;
     bytes_per_line = Math.max(bytes_per_line, 1);
@@ -73,7 +93,7 @@ class Memory extends React.Component<{}, State> {
         // begin new row
         data.push([
           Memory.make_addrs_into_links_react(hex_addr_to_display),
-          hex_vals_for_this_addr.join(" "),
+          Memory.join_hex_vals(hex_vals_for_this_addr),
           char_vals_for_this_addr
         ]);
 
@@ -84,7 +104,16 @@ class Memory extends React.Component<{}, State> {
         char_vals_for_this_addr = [];
       }
       let hex_value = store.get("memory_cache")[hex_addr];
-      hex_vals_for_this_addr.push(hex_value);
+      // bytes that changed since gdb last paused are highlighted
+      hex_vals_for_this_addr.push(
+        changed_addrs[hex_addr] ? (
+          <span key={hex_addr} className="highlight bold">
+            {hex_value}
+          </span>
+        ) : (
+          hex_value
+        )
+      );
       let char = String.fromCharCode(parseInt(hex_value, 16)).replace(/\W/g, ".");
       char_vals_for_this_addr.push(
         <span key={i} className="memory_char">
@@ -99,7 +128,7 @@ class Memory extends React.Component<{}, State> {
       // add the remaining memory
       data.push([
         Memory.make_addrs_into_links_react(hex_addr_to_display),
-        hex_vals_for_this_addr.join(" "),
+        Memory.join_hex_vals(hex_vals_for_this_addr),
         char_vals_for_this_addr
       ]);
     }
@@ -122,6 +151,16 @@ class Memory extends React.Component<{}, State> {
     // @ts-expect-error ts-migrate(2769) FIXME: Type 'string' is not assignable to type 'never'.
     return <ReactTable data={data} header={["address", "hex", "char"]} />;
   }
+  static join_hex_vals(hex_vals: Array<any>) {
+    let joined: Array<any> = [];
+    for (const hex_val of hex_vals) {
+      if (joined.length) {
+        joined.push(" ");
+      }
+      joined.push(hex_val);
+    }
+    return joined;
+  }
   render() {
     let input_style = {
         display: "inline",
@@ -185,7 +224,11 @@ class Memory extends React.Component<{}, State> {
     Memory.fetch_memory_from_state();
   }
 
-  static get_gdb_commands_from_state() {
+  /**
+   * Return the range of memory to read, as set by the inputs, and update the
+   * inputs to show the range that is read
+   */
+  static get_range_from_state(): MemoryRange | null {
     // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
     let start_addr = parseInt(_.trim(store.get("start_addr")), 16),
       // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
@@ -195,7 +238,7 @@ class Memory extends React.Component<{}, State> {
       end_addr = start_addr + Memory.DEFAULT_ADDRESS_DELTA_BYTES;
     }
 
-    let cmds = [];
+    let range: MemoryRange | null = null;
     // @ts-expect-error ts-migrate(2304) FIXME: Cannot find name '_'.
     if (_.isInteger(start_addr) && end_addr) {
       if (start_addr > end_addr) {
@@ -213,13 +256,8 @@ class Memory extends React.Component<{}, State> {
           constants.console_entry_type.STD_ERR
         );
       }
-
-      let cur_addr = start_addr;
-      while (cur_addr <= end_addr) {
-        // TODO read more than 1 byte at a time?
-        cmds.push(`-data-read-memory-bytes ${"0x" + cur_addr.toString(16)} 1`);
-        cur_addr = cur_addr + 1;
-      }
+      // the end address is included
+      range = { start_addr: start_addr, num_bytes: end_addr - start_addr + 1 };
     }
 
     if (!window.isNaN(start_addr)) {
@@ -229,13 +267,64 @@ class Memory extends React.Component<{}, State> {
       store.set("end_addr", "0x" + end_addr.toString(16));
     }
 
-    return cmds;
+    return range;
   }
 
   static fetch_memory_from_state() {
-    let cmds = Memory.get_gdb_commands_from_state();
     Memory.clear_cache();
-    GdbApi.run_gdb_command(cmds);
+    Memory.read_memory_from_state();
+  }
+
+  /**
+   * Re-read the range of memory set by the inputs. The range is watched, so
+   * the server reads it again whenever gdb pauses, and only sends what
+   * changed once the whole range was received.
+   */
+  static read_memory_from_state() {
+    const range = Memory.get_range_from_state();
+    if (range) {
+      store.set("memory_range", range);
+      GdbApi.read_memory(
+        range.start_addr,
+        range.num_bytes,
+        true,
+        store.get("memory_version") === null
+      );
+    }
+  }
+
+  static save_memory_response(data: MemoryResponse) {
+    const range = store.get("memory_range");
+    if (
+      !range ||
+      parseInt(data.start_addr, 16) !== range.start_addr ||
+      data.num_bytes !== range.num_bytes
+    ) {
+      // read for another client of the same gdb session
+      return;
+    }
+    if (data.errors.length) {
+      Actions.add_console_entries(data.errors, constants.console_entry_type.STD_ERR);
+    }
+    if (data.blocks) {
+      store.set("memory_cache", Memory.add_blocks_to_cache(data.blocks, {}));
+    } else if (
+      data.changed_blocks &&
+      data.base_version === store.get("memory_version") &&
+      store.get("memory_version") !== null
+    ) {
+      Memory.add_blocks_to_store(data.changed_blocks);
+    } else {
+      // the changes are relative to a version this client does not have
+      store.set("memory_version", null);
+      GdbApi.read_memory(range.start_addr, range.num_bytes, true, true);
+      return;
+    }
+    store.set("memory_version", data.version === undefined ? null : data.version);
+    store.set(
+      "memory_changed_addrs",
+      data.changed_bitmap ? getChangedAddrs(range.start_addr, data.changed_bitmap) : {}
+    );
   }
 
   static click_read_preceding_memory() {
@@ -285,18 +374,34 @@ class Memory extends React.Component<{}, State> {
     }
   }
 
-  static add_value_to_cache(hex_str: any, hex_val: any) {
-    // strip leading zeros off address provided by gdb
-    // i.e. 0x000123 turns to
-    // 0x123
-    let hex_str_truncated = "0x" + parseInt(hex_str, 16).toString(16);
-    let cache = store.get("memory_cache");
-    cache[hex_str_truncated] = hex_val;
-    store.set("memory_cache", cache);
+  /**
+   * Add the bytes of blocks of memory read by gdb to cache, keyed by their
+   * address without leading zeros, i.e. 0x000123 turns to 0x123
+   */
+  static add_blocks_to_cache(
+    blocks: Array<MemoryBlock>,
+    cache: { [addr: string]: string }
+  ) {
+    for (const block of blocks) {
+      const begin = parseInt(block.begin, 16);
+      for (let i = 0; i < block.contents.length / 2; i++) {
+        cache["0x" + (begin + i).toString(16)] = block.contents.substr(i * 2, 2);
+      }
+    }
+    return cache;
+  }
+
+  static add_blocks_to_store(blocks: Array<MemoryBlock>) {
+    store.set(
+      "memory_cache",
+      Memory.add_blocks_to_cache(blocks, store.get("memory_cache"))
+    );
   }
 
   static clear_cache() {
     store.set("memory_cache", {});
+    store.set("memory_changed_addrs", {});
+    store.set("memory_version", null);
   }
 }
 
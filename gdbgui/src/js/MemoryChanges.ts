@@ -0,0 +1,26 @@
+/**
+ * The server sends the bytes of a watched memory region that changed since
+ * it was last read, along with a bitmap of which bytes changed
+ * (see memoryreads.py). This turns the bitmap into the addresses to highlight.
+ */
+
+/**
+ * Return the addresses of the bytes set in a changed_bitmap of the region
+ * starting at start_addr, keyed the same way as the memory cache
+ */
+export function getChangedAddrs(
+  start_addr: number,
+  bitmap: [number, string]
+): { [addr: string]: boolean } {
+  const [first_byte, hex] = bitmap;
+  const changed: { [addr: string]: boolean } = {};
+  for (let i = 0; i < hex.length / 2; i++) {
+    const bits = parseInt(hex.substr(i * 2, 2), 16);
+    for (let j = 0; j < 8; j++) {
+      if (bits & (1 << j)) {
+        changed["0x" + (start_addr + (first_byte + i) * 8 + j).toString(16)] = true;
+      }
+    }
+  }
+  return changed;
+}
@@ -38,6 +38,7 @@ class MiddleLeft extends React.Component {
   }
 
   onscroll_container() {
+    SourceCode.on_scroll();
     clearTimeout(this.onscroll_timeout);
     this.onscroll_timeout = setTimeout(this.check_to_autofetch_more_source, 100);
   }
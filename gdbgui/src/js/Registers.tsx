@@ -1,5 +1,8 @@
 /**
  * A component to display, fetch, and store register
+ *
+ * The server reads the registers again whenever gdb pauses, and only sends
+ * those that changed. Vector registers are only read while they are expanded.
  */
 
 import React from "react";
@@ -16,6 +19,16 @@ let register_name_fetch_count = 0,
 
 type State = any;
 
+type RegisterValue = { number: string; value?: string };
+// sent with every register, or with base_version and the registers that
+// changed since (see registerreads.py)
+type RegisterValues = {
+  version: number;
+  base_version?: number;
+  vector_registers: Array<string>;
+  values: Array<RegisterValue>;
+};
+
 class Registers extends React.Component<{}, State> {
   constructor() {
     // @ts-expect-error ts-migrate(2554) FIXME: Expected 1-2 arguments, but got 0.
@@ -26,6 +39,8 @@ class Registers extends React.Component<{}, State> {
       "previous_register_values",
       "current_register_values",
       "register_names",
+      "vector_registers",
+      "expanded_registers",
       "can_fetch_register_values"
     ]);
   }
@@ -52,13 +67,72 @@ class Registers extends React.Component<{}, State> {
           }, 5000);
         }
       }
-      // update all registers values
-      cmds.push(constants.IGNORE_ERRORS_TOKEN_STR + "-data-list-register-values x");
     } else {
       Registers.clear_cached_values();
     }
     return cmds;
   }
+  /**
+   * Ask the server for the registers that changed, or for every register if
+   * full is set. The server keeps sending the registers that changed
+   * whenever gdb pauses.
+   */
+  static read_values(full: boolean = store.get("register_version") === null) {
+    if (
+      store.get("can_fetch_register_values") === true &&
+      [constants.inferior_states.paused, constants.inferior_states.running].indexOf(
+        store.get("inferior_program")
+      ) !== -1
+    ) {
+      GdbApi.read_registers(Object.keys(store.get("expanded_registers")), full);
+    }
+  }
+  /**
+   * Ask the server for every register, unless it already sends the
+   * registers that changed whenever gdb pauses
+   */
+  static watch_values() {
+    if (store.get("register_version") === null) {
+      Registers.read_values(true);
+    }
+  }
+  static save_values(data: RegisterValues) {
+    let values: Array<RegisterValue>;
+    if (data.base_version === undefined) {
+      values = data.values;
+    } else if (
+      data.base_version === store.get("register_version") &&
+      store.get("register_version") !== null
+    ) {
+      const changed: { [number: string]: RegisterValue } = {};
+      for (const register of data.values) {
+        changed[register.number] = register;
+      }
+      values = store
+        .get("current_register_values")
+        .map((register: RegisterValue) => changed[register.number] || register);
+    } else {
+      // the changes are relative to a version this client does not have
+      store.set("register_version", null);
+      Registers.read_values(true);
+      return;
+    }
+    store.set("previous_register_values", store.get("current_register_values"));
+    store.set("current_register_values", values);
+    store.set("vector_registers", data.vector_registers);
+    store.set("register_version", data.version);
+  }
+  static toggle_expanded(number: string) {
+    const expanded = Object.assign({}, store.get("expanded_registers"));
+    if (expanded[number]) {
+      delete expanded[number];
+    } else {
+      expanded[number] = true;
+    }
+    store.set("expanded_registers", expanded);
+    // the server reads the values of the registers that are expanded
+    Registers.read_values(false);
+  }
   static cache_register_names(names: any) {
     // filter out non-empty names
     store.set(
@@ -72,6 +146,7 @@ class Registers extends React.Component<{}, State> {
   static clear_cached_values() {
     store.set("previous_register_values", {});
     store.set("current_register_values", {});
+    store.set("register_version", null);
   }
   static inferior_program_exited() {
     Registers.clear_cached_values();
@@ -95,12 +170,15 @@ class Registers extends React.Component<{}, State> {
       Registers.clear_register_name_cache();
       Registers.clear_cached_values();
       GdbApi.run_gdb_command(Registers.get_update_cmds());
+      Registers.read_values(true);
     } else if (num_register_names === num_register_values) {
       let columns = ["name", "value (hex)", "value (decimal)", "description"],
         register_table_data = [],
         register_names = store.get("register_names"),
         register_values = store.get("current_register_values"),
-        prev_register_values = store.get("previous_register_values");
+        prev_register_values = store.get("previous_register_values"),
+        vector_registers = store.get("vector_registers"),
+        expanded_registers = store.get("expanded_registers");
 
       for (let i in register_names) {
         let name = register_names[i],
@@ -112,6 +190,27 @@ class Registers extends React.Component<{}, State> {
           // @ts-expect-error ts-migrate(7053) FIXME: Element implicitly has an 'any' type because expre... Remove this comment to see the full error message
           register_description = register_descriptions[name] || "";
 
+        if (vector_registers.indexOf(i) !== -1) {
+          // vector registers are only read while they are expanded
+          const expanded = expanded_registers[i] === true;
+          register_table_data.push([
+            name,
+            <span>
+              <span
+                className="pointer"
+                style={{ fontStyle: "italic" }}
+                onClick={() => Registers.toggle_expanded(i)}
+              >
+                {expanded ? "hide" : "show"}
+              </span>{" "}
+              {expanded && obj && obj.value ? obj.value : ""}
+            </span>,
+            "",
+            register_description
+          ]);
+          continue;
+        }
+
         if (obj && obj.value) {
           hex_val_raw = obj["value"];
 
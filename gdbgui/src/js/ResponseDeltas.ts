@@ -0,0 +1,102 @@
+/**
+ * The server sends the results of commands that run every time gdb pauses
+ * as diffs against their previous result (see deltas.py).
+ * This restores their payloads before they are processed.
+ */
+
+// latest version and payload of each command id
+const latest: { [command_id: number]: { version: number; payload: any } } = {};
+// command ids a resync was requested for, and not received yet
+const resyncing: Set<number> = new Set();
+
+/**
+ * Forget every payload. Called when the client connects to a debug
+ * session, since the server numbers the commands and versions of each
+ * session from 0.
+ */
+export function resetPayloads(): void {
+  for (const command_id in latest) {
+    delete latest[command_id];
+  }
+  resyncing.clear();
+}
+
+export function applyDiff(old: any, diff: any): any {
+  if (diff === null || diff === undefined) {
+    return old;
+  }
+  const op = diff[0];
+  if (op === "r") {
+    return diff[1];
+  } else if (op === "d") {
+    const changed = diff[1];
+    const removed: Array<string> = diff[2];
+    const result: { [key: string]: any } = {};
+    for (const key in old) {
+      if (removed.indexOf(key) === -1) {
+        result[key] = old[key];
+      }
+    }
+    for (const key in changed) {
+      result[key] = applyDiff(old ? old[key] : undefined, changed[key]);
+    }
+    return result;
+  } else if (op === "l") {
+    const length: number = diff[1];
+    const changed = diff[2];
+    const result = old.slice(0, length);
+    while (result.length < length) {
+      result.push(null);
+    }
+    for (const index in changed) {
+      const i = parseInt(index);
+      result[i] = applyDiff(result[i], changed[index]);
+    }
+    return result;
+  }
+  throw new Error(`Unknown diff operation ${op}`);
+}
+
+/**
+ * Return the responses with the payloads of diffed results restored.
+ * Results whose previous version is unknown are dropped, and
+ * requestResync is called with their command ids, so the server sends
+ * their latest full results.
+ */
+export function restorePayloads(
+  responses: Array<any>,
+  requestResync: (command_ids: Array<number>) => void
+): Array<any> {
+  const restored = [];
+  const missing: Array<number> = [];
+  for (const response of responses) {
+    if (!response.payload_version) {
+      restored.push(response);
+      continue;
+    }
+    const [command_id, version] = response.payload_version;
+    if (response.payload_delta) {
+      const [base_version, diff] = response.payload_delta;
+      const base = latest[command_id];
+      if (!base || base.version !== base_version) {
+        if (!resyncing.has(command_id) && missing.indexOf(command_id) === -1) {
+          missing.push(command_id);
+        }
+        continue;
+      }
+      response.payload = applyDiff(base.payload, diff);
+      delete response.payload_delta;
+    } else if (latest[command_id] && latest[command_id].version > version) {
+      // a resync that is older than a result received since it was requested
+      continue;
+    }
+    resyncing.delete(command_id);
+    latest[command_id] = { version: version, payload: response.payload };
+    restored.push(response);
+  }
+  if (missing.length) {
+    missing.forEach(command_id => resyncing.add(command_id));
+    requestResync(missing);
+  }
+  return restored;
+}
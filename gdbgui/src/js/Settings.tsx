@@ -25,7 +25,8 @@ class Settings extends React.Component {
       "pretty_print",
       "refresh_state_after_sending_console_command",
       "show_all_sent_commands_in_console",
-      "highlight_source_code"
+      "highlight_source_code",
+      "binary_websocket_messages"
     ]);
     this.get_update_max_lines_of_code_to_fetch = this.get_update_max_lines_of_code_to_fetch.bind(
       this
@@ -103,6 +104,10 @@ class Settings extends React.Component {
             "highlight_source_code",
             "Add syntax highlighting to source files"
           )}
+          {Settings.get_checkbox_row(
+            "binary_websocket_messages",
+            "Receive gdb and terminal output as compact binary messages (requires reload)"
+          )}
 
           <tr>
             <td>
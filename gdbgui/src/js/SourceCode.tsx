@@ -1,5 +1,9 @@
 /**
  * A component to render source code, assembly, and break points
+ *
+ * Only the rows that are scrolled into view are rendered, along with
+ * OVERSCAN_ROWS on either side, so files with many lines of source and
+ * assembly can be displayed (see VirtualRows.ts).
  */
 
 import { store } from "statorgfc";
@@ -10,8 +14,15 @@ import Memory from "./Memory";
 import MemoryLink from "./MemoryLink";
 import constants from "./constants";
 import Actions from "./Actions";
+import { containsRows, getRowOffsets, getRowsToRender, RowRange } from "./VirtualRows";
 
 type State = any;
+// a row of the table, as high as its number of lines of text
+type Row = { height: number; render: () => React.ReactNode };
+
+const OVERSCAN_ROWS = 50;
+// rendered before the height of the code container is known
+const DEFAULT_VISIBLE_LINES = 100;
 
 class SourceCode extends React.Component<{}, State> {
   static el_code_container = null; // todo: no jquery
@@ -19,6 +30,13 @@ class SourceCode extends React.Component<{}, State> {
   static code_container_node = null;
   static view_more_top_node = null;
   static view_more_bottom_node = null;
+  // height of a line of text, measured once rows are rendered
+  static line_height_px = 20;
+  static row_offsets: Array<number> = [0];
+  static rendered_rows: RowRange = { start: 0, end: 0 };
+  // row of the line to scroll to, if any
+  static scroll_target_row: number | null = null;
+  code_body_node: HTMLTableSectionElement | null = null;
 
   constructor() {
     // @ts-expect-error ts-migrate(2554) FIXME: Expected 1-2 arguments, but got 0.
@@ -40,7 +58,9 @@ class SourceCode extends React.Component<{}, State> {
       "source_linenum_to_display_start",
       "source_linenum_to_display_end",
       "max_lines_of_code_to_fetch",
-      "source_code_infinite_scrolling"
+      "source_code_infinite_scrolling",
+      "files_being_fetched",
+      "source_code_scroll_top"
     ]);
 
     // bind methods
@@ -52,6 +72,35 @@ class SourceCode extends React.Component<{}, State> {
   }
 
   render() {
+    const rows = this.get_body(),
+      offsets = getRowOffsets(rows.map(row => row.height)),
+      line_height = SourceCode.line_height_px,
+      container: any = SourceCode.el_code_container;
+    let top = 0,
+      visible_lines = DEFAULT_VISIBLE_LINES;
+    if (container) {
+      top = container.scrollTop() / line_height;
+      visible_lines = container.height() / line_height;
+    }
+    const rendered = getRowsToRender(offsets, top, visible_lines, OVERSCAN_ROWS);
+    SourceCode.row_offsets = offsets;
+    SourceCode.rendered_rows = rendered;
+
+    let body = [];
+    if (rendered.start > 0) {
+      body.push(SourceCode.get_spacer_tr("top_spacer", offsets[rendered.start]));
+    }
+    for (let i = rendered.start; i < rendered.end; i++) {
+      body.push(rows[i].render());
+    }
+    if (rendered.end < rows.length) {
+      body.push(
+        SourceCode.get_spacer_tr(
+          "bottom_spacer",
+          offsets[rows.length] - offsets[rendered.end]
+        )
+      );
+    }
     return (
       <div className={this.state.current_theme} style={{ height: "100%" }}>
         <table
@@ -59,13 +108,72 @@ class SourceCode extends React.Component<{}, State> {
           className={this.state.current_theme}
           style={{ width: "100%" }}
         >
-          <tbody id="code_body">{this.get_body()}</tbody>
+          <tbody id="code_body" ref={el => (this.code_body_node = el)}>
+            {body}
+          </tbody>
         </table>
       </div>
     );
   }
+  /**
+   * Empty space in place of the rows that are not rendered
+   */
+  static get_spacer_tr(key: string, num_lines: number) {
+    return (
+      <tr key={key} style={{ height: num_lines * SourceCode.line_height_px }}>
+        <td colSpan={3} style={{ padding: 0 }} />
+      </tr>
+    );
+  }
+  /**
+   * Render the rows that were scrolled into view, if they are not rendered
+   * already. Called whenever the code container is scrolled.
+   */
+  static on_scroll() {
+    const container: any = SourceCode.el_code_container;
+    if (!container) {
+      return;
+    }
+    const visible = getRowsToRender(
+      SourceCode.row_offsets,
+      container.scrollTop() / SourceCode.line_height_px,
+      container.height() / SourceCode.line_height_px,
+      0
+    );
+    if (!containsRows(SourceCode.rendered_rows, visible)) {
+      store.set("source_code_scroll_top", container.scrollTop());
+    }
+  }
+  /**
+   * Measure the height of a line from the rendered rows, so the space in
+   * place of the other rows is as high as they would be
+   */
+  measure_line_height() {
+    const { start, end } = SourceCode.rendered_rows,
+      num_lines = SourceCode.row_offsets[end] - SourceCode.row_offsets[start];
+    if (!this.code_body_node || num_lines < 1) {
+      return;
+    }
+    const trs = this.code_body_node.children,
+      first = trs[start > 0 ? 1 : 0] as HTMLElement,
+      last = trs[start > 0 ? end - start : end - start - 1] as HTMLElement;
+    if (!first || !last) {
+      return;
+    }
+    const line_height =
+      (last.offsetTop + last.offsetHeight - first.offsetTop) / num_lines;
+    if (line_height > 0 && Math.abs(line_height - SourceCode.line_height_px) > 0.5) {
+      SourceCode.line_height_px = line_height;
+      this.forceUpdate();
+    }
+  }
+
+  componentDidMount() {
+    this.measure_line_height();
+  }
 
   componentDidUpdate() {
+    this.measure_line_height();
     let source_is_displayed =
       this.state.source_code_state === constants.source_code_states.SOURCE_CACHED ||
       this.state.source_code_state ===
@@ -80,15 +188,16 @@ class SourceCode extends React.Component<{}, State> {
     }
   }
 
-  get_body() {
+  get_body(): Array<Row> {
     const states = constants.source_code_states;
+    SourceCode.scroll_target_row = null;
     switch (this.state.source_code_state) {
       case states.ASSM_AND_SOURCE_CACHED: // fallthrough
       case states.SOURCE_CACHED: {
         let obj = FileOps.get_source_file_obj_from_cache(this.state.fullname_to_render);
         if (!obj) {
           console.error("expected to find source file");
-          return this.get_body_empty();
+          return SourceCode.as_rows(this.get_body_empty());
         }
         let paused_addr = this.state.paused_on_frame
             ? this.state.paused_on_frame.addr
@@ -106,7 +215,7 @@ class SourceCode extends React.Component<{}, State> {
         );
       }
       case states.FETCHING_SOURCE: {
-        return (
+        return SourceCode.as_rows(
           <tr>
             <td>fetching source, please wait</td>
           </tr>
@@ -120,7 +229,7 @@ class SourceCode extends React.Component<{}, State> {
         return this.get_body_assembly_only(assm_array, paused_addr);
       }
       case states.FETCHING_ASSM: {
-        return (
+        return SourceCode.as_rows(
           <tr>
             <td>fetching assembly, please wait</td>
           </tr>
@@ -130,28 +239,34 @@ class SourceCode extends React.Component<{}, State> {
         let paused_addr = this.state.paused_on_frame
           ? this.state.paused_on_frame.addr
           : null;
-        return (
+        return SourceCode.as_rows(
           <tr>
             <td>cannot access address {paused_addr}</td>
           </tr>
         );
       }
       case states.FILE_MISSING: {
-        return (
+        return SourceCode.as_rows(
           <tr>
             <td>file not found: {this.state.fullname_to_render}</td>
           </tr>
         );
       }
       case states.NONE_AVAILABLE: {
-        return this.get_body_empty();
+        return SourceCode.as_rows(this.get_body_empty());
       }
       default: {
         console.error("developer error: unhandled state");
-        return this.get_body_empty();
+        return SourceCode.as_rows(this.get_body_empty());
       }
     }
   }
+  /**
+   * A single row of one line, i.e. a message
+   */
+  static as_rows(tr: React.ReactNode): Array<Row> {
+    return [{ height: 1, render: () => tr }];
+  }
   click_gutter(line_num: any) {
     Breakpoints.add_or_remove_breakpoint(this.state.fullname_to_render, line_num);
   }
@@ -175,22 +290,9 @@ class SourceCode extends React.Component<{}, State> {
       row_class.push("flash");
     }
 
-    let id = "";
-    if (
-      this.state.source_code_selection_state ===
-      constants.source_code_selection_states.PAUSED_FRAME
-    ) {
-      if (is_gdb_paused_on_this_line) {
-        id = "scroll_to_line";
-      }
-    } else if (
-      this.state.source_code_selection_state ===
-      constants.source_code_selection_states.USER_SELECTION
-    ) {
-      if (line_should_flash) {
-        id = "scroll_to_line";
-      }
-    }
+    let id = this.is_scroll_target(line_should_flash, is_gdb_paused_on_this_line)
+      ? "scroll_to_line"
+      : "";
 
     let gutter_cls = "";
     if (has_disabled_bkpt) {
@@ -223,6 +325,20 @@ class SourceCode extends React.Component<{}, State> {
       </tr>
     );
   }
+  is_scroll_target(line_should_flash: any, is_gdb_paused_on_this_line: any) {
+    if (
+      this.state.source_code_selection_state ===
+      constants.source_code_selection_states.PAUSED_FRAME
+    ) {
+      return is_gdb_paused_on_this_line;
+    } else if (
+      this.state.source_code_selection_state ===
+      constants.source_code_selection_states.USER_SELECTION
+    ) {
+      return line_should_flash;
+    }
+    return false;
+  }
   get_linenum_td(linenum: any, gutter_cls = "") {
     return (
       <td
@@ -297,6 +413,13 @@ class SourceCode extends React.Component<{}, State> {
       return false;
     }
   }
+  get_view_more_row(fullname: any, linenum: any, node_key: any): Row {
+    // the node is set while the row is rendered
+    return {
+      height: 1,
+      render: () => this.get_view_more_tr(fullname, linenum, node_key)
+    };
+  }
   get_view_more_tr(fullname: any, linenum: any, node_key: any) {
     return (
       // @ts-expect-error ts-migrate(7053) FIXME: Element implicitly has an 'any' type because expre... Remove this comment to see the full error message
@@ -314,6 +437,16 @@ class SourceCode extends React.Component<{}, State> {
       </tr>
     );
   }
+  get_loading_tr(linenum: any) {
+    return (
+      <tr key={linenum}>
+        <td />
+        <td style={{ fontStyle: "italic", paddingLeft: "10px", fontSize: "0.8em" }}>
+          loading...
+        </td>
+      </tr>
+    );
+  }
   get_end_of_file_tr(linenum: any) {
     return (
       <tr key={linenum}>
@@ -364,8 +497,8 @@ class SourceCode extends React.Component<{}, State> {
     start_linenum: any,
     end_linenum: any,
     num_lines_in_file: any
-  ) {
-    let body = [];
+  ): Array<Row> {
+    let body: Array<Row> = [];
 
     let bkpt_lines = Breakpoints.get_breakpoint_lines_for_file(
         this.state.fullname_to_render
@@ -391,6 +524,24 @@ class SourceCode extends React.Component<{}, State> {
       end_linenum
     );
 
+    SourceCode.view_more_top_node = null;
+    SourceCode.view_more_bottom_node = null;
+
+    // add "view more" buttons if necessary
+    if (start_linenum_to_render > start_linenum) {
+      body.push(
+        this.get_view_more_row(
+          fullname,
+          start_linenum_to_render - 1,
+          "view_more_top_node"
+        )
+      );
+    } else if (start_linenum !== 1) {
+      body.push(
+        this.get_view_more_row(fullname, start_linenum - 1, "view_more_top_node")
+      );
+    }
+
     let line_num_being_rendered = start_linenum_to_render;
     while (line_num_being_rendered <= end_linenum_to_render) {
       let cur_line_of_code = source_code_obj[line_num_being_rendered];
@@ -403,41 +554,41 @@ class SourceCode extends React.Component<{}, State> {
           line_num_being_rendered,
           line_gdb_is_paused_on
         ),
-        assembly_for_line = assembly[line_num_being_rendered];
+        assembly_for_line = assembly[line_num_being_rendered],
+        line_should_flash = line_of_source_to_flash === line_num_being_rendered,
+        linenum = line_num_being_rendered;
 
-      body.push(
-        this._get_source_line(
-          cur_line_of_code,
-          line_of_source_to_flash === line_num_being_rendered,
-          is_gdb_paused_on_this_line,
-          line_num_being_rendered,
-          has_bkpt,
-          has_disabled_bkpt,
-          has_conditional_bkpt,
-          assembly_for_line,
-          paused_addr
-        )
-      );
+      if (this.is_scroll_target(line_should_flash, is_gdb_paused_on_this_line)) {
+        SourceCode.scroll_target_row = body.length;
+      }
+      // rendered once the line is scrolled into view
+      body.push({
+        height: Math.max(assembly_for_line ? assembly_for_line.length : 0, 1),
+        render: () =>
+          this._get_source_line(
+            cur_line_of_code,
+            line_should_flash,
+            is_gdb_paused_on_this_line,
+            linenum,
+            has_bkpt,
+            has_disabled_bkpt,
+            has_conditional_bkpt,
+            assembly_for_line,
+            paused_addr
+          )
+      });
       line_num_being_rendered++;
     }
 
-    SourceCode.view_more_top_node = null;
-    SourceCode.view_more_bottom_node = null;
-
-    // add "view more" buttons if necessary
-    if (start_linenum_to_render > start_linenum) {
-      body.unshift(
-        this.get_view_more_tr(fullname, start_linenum_to_render - 1, "view_more_top_node")
-      );
-    } else if (start_linenum !== 1) {
-      body.unshift(
-        this.get_view_more_tr(fullname, start_linenum - 1, "view_more_top_node")
-      );
-    }
-
-    if (end_linenum_to_render < end_linenum) {
+    if (
+      end_linenum_to_render < end_linenum &&
+      this.state.files_being_fetched.indexOf(fullname) !== -1
+    ) {
+      // the rest of the lines are still being streamed
+      body.push(...SourceCode.as_rows(this.get_loading_tr(end_linenum_to_render + 1)));
+    } else if (end_linenum_to_render < end_linenum) {
       body.push(
-        this.get_view_more_tr(
+        this.get_view_more_row(
           fullname,
           end_linenum_to_render + 1,
           "view_more_bottom_node"
@@ -445,21 +596,22 @@ class SourceCode extends React.Component<{}, State> {
       );
     } else if (end_linenum < num_lines_in_file) {
       body.push(
-        this.get_view_more_tr(fullname, line_num_being_rendered, "view_more_bottom_node")
+        this.get_view_more_row(fullname, line_num_being_rendered, "view_more_bottom_node")
       );
     }
 
     if (end_linenum_to_render === num_lines_in_file) {
-      body.push(this.get_end_of_file_tr(num_lines_in_file + 1));
+      body.push(...SourceCode.as_rows(this.get_end_of_file_tr(num_lines_in_file + 1)));
     }
     return body;
   }
 
-  get_body_assembly_only(assm_array: any, paused_addr: any) {
-    let body = [],
+  get_body_assembly_only(assm_array: any, paused_addr: any): Array<Row> {
+    let body: Array<Row> = [],
       i = 0;
     for (let assm of assm_array) {
-      body.push(this._get_assm_row(i, assm, paused_addr));
+      const key = i;
+      body.push({ height: 1, render: () => this._get_assm_row(key, assm, paused_addr) });
       i++;
     }
     return body;
@@ -472,8 +624,30 @@ class SourceCode extends React.Component<{}, State> {
       </tr>
     );
   }
+  /**
+   * Scroll the line gdb is paused on, or the line the user selected, into
+   * the middle of the code container if it is out of view. Returns true on
+   * success.
+   */
   static make_current_line_visible() {
-    return SourceCode._make_jq_selector_visible($("#scroll_to_line"));
+    const container: any = SourceCode.el_code_container,
+      row = SourceCode.scroll_target_row;
+    if (!container || row === null || row >= SourceCode.row_offsets.length - 1) {
+      return false;
+    }
+    const top_of_line = SourceCode.row_offsets[row] * SourceCode.line_height_px,
+      bottom_of_line = SourceCode.row_offsets[row + 1] * SourceCode.line_height_px,
+      top_of_container = container.scrollTop(),
+      height_of_container = container.height();
+    if (
+      top_of_line < top_of_container ||
+      bottom_of_line > top_of_container + height_of_container
+    ) {
+      // line is out of view, scroll so it's in the middle of the table
+      container.scrollTop(top_of_line - height_of_container / 2);
+      store.set("source_code_scroll_top", container.scrollTop());
+    }
+    return true;
   }
   static is_source_line_visible(jq_selector: any) {
     if (jq_selector.length !== 1) {
@@ -498,33 +672,6 @@ class SourceCode extends React.Component<{}, State> {
       return { is_visible: false, top_of_line, top_of_table, height_of_container };
     }
   }
-  /**
-   * Scroll to a jQuery selection in the source code table
-   * Used to jump around to various lines
-   * returns true on success
-   */
-  static _make_jq_selector_visible(jq_selector: any) {
-    if (jq_selector.length === 1) {
-      // make sure something is selected before trying to scroll to it
-      const {
-        is_visible,
-        top_of_line,
-        top_of_table,
-        height_of_container
-      } = SourceCode.is_source_line_visible(jq_selector);
-
-      if (!is_visible) {
-        // line is out of view, scroll so it's in the middle of the table
-        const time_to_scroll = 0;
-        let scroll_top = top_of_line - (top_of_table + height_of_container / 2);
-        // @ts-expect-error ts-migrate(2531) FIXME: Object is possibly 'null'.
-        SourceCode.el_code_container.animate({ scrollTop: scroll_top }, time_to_scroll);
-      }
-      return true;
-    } else {
-      return false;
-    }
-  }
 }
 
 export default SourceCode;
@@ -6,6 +6,7 @@ import { store } from "statorgfc";
 import "xterm/css/xterm.css";
 import constants from "./constants";
 import Actions from "./Actions";
+import { ptyOutput } from "./msgpack";
 
 function customKeyEventHandler(config: {
   pty_name: string;
@@ -39,6 +40,17 @@ function customKeyEventHandler(config: {
     return true;
   };
 }
+
+/**
+ * Tell the server this output was rendered, so it sends the next frame of output.
+ * Until then, the server coalesces (and if needed, drops) output for this pty.
+ */
+function ackPtyResponse(pty_name: string) {
+  GdbApi.getSocket().emit("pty_interaction", {
+    data: { pty_name: pty_name, action: "ack" }
+  });
+}
+
 export class Terminals extends React.Component {
   userPtyRef: React.RefObject<any>;
   programPtyRef: React.RefObject<any>;
@@ -94,8 +106,8 @@ export class Terminals extends React.Component {
         pidStoreKey: "gdb_pid"
       })
     );
-    GdbApi.getSocket().on("user_pty_response", function(data: string) {
-      userPty.write(data);
+    GdbApi.getSocket().on("user_pty_response", function(data: string | ArrayBuffer) {
+      userPty.write(ptyOutput(data), () => ackPtyResponse("user_pty"));
     });
     userPty.onKey((data, ev) => {
       GdbApi.getSocket().emit("pty_interaction", {
@@ -128,8 +140,10 @@ export class Terminals extends React.Component {
         "You can read output and send input to the program from here."
     );
     programPty.writeln(constants.xtermColors.reset);
-    GdbApi.getSocket().on("program_pty_response", function(pty_response: string) {
-      programPty.write(pty_response);
+    GdbApi.getSocket().on("program_pty_response", function(
+      pty_response: string | ArrayBuffer
+    ) {
+      programPty.write(ptyOutput(pty_response), () => ackPtyResponse("program_pty"));
     });
     programPty.onKey((data, ev) => {
       GdbApi.getSocket().emit("pty_interaction", {
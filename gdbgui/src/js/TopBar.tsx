@@ -293,7 +293,7 @@ class TopBar extends React.Component<{}, State> {
       <button
         onClick={FileOps.refresh_cached_source_files}
         type="button"
-        title="Erase file from local cache and re-fetch it"
+        title="Re-fetch files that changed on disk"
         className={"btn btn-default btn-xs " + reload_button_disabled}
       >
         <span>reload file</span>
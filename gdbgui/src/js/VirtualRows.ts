@@ -0,0 +1,66 @@
+/**
+ * The source code table only renders the rows that are scrolled into view,
+ * plus a few on either side, and pads the rest with empty space. Row heights
+ * are counted in lines of text: a line of source with its interleaved
+ * assembly is as high as its number of instructions.
+ */
+
+export type RowRange = { start: number; end: number };
+
+/**
+ * Return the offset of each row from the top, and the total height as the
+ * last element
+ */
+export function getRowOffsets(row_heights: Array<number>): Array<number> {
+  const offsets = [0];
+  for (const height of row_heights) {
+    offsets.push(offsets[offsets.length - 1] + height);
+  }
+  return offsets;
+}
+
+/**
+ * Return the index of the row at position, clamped to the rows there are
+ */
+export function findRow(offsets: Array<number>, position: number): number {
+  let low = 0,
+    high = offsets.length - 2;
+  while (low < high) {
+    const middle = Math.ceil((low + high) / 2);
+    if (offsets[middle] <= position) {
+      low = middle;
+    } else {
+      high = middle - 1;
+    }
+  }
+  return Math.max(low, 0);
+}
+
+/**
+ * Return the rows that are at least partly between top and top + height,
+ * with overscan more rows on either side. end is exclusive.
+ */
+export function getRowsToRender(
+  offsets: Array<number>,
+  top: number,
+  height: number,
+  overscan: number
+): RowRange {
+  const num_rows = offsets.length - 1;
+  if (num_rows <= 0) {
+    return { start: 0, end: 0 };
+  }
+  const first = findRow(offsets, top),
+    last = findRow(offsets, top + Math.max(height, 1) - 1e-9);
+  return {
+    start: Math.max(first - overscan, 0),
+    end: Math.min(last + 1 + overscan, num_rows)
+  };
+}
+
+/**
+ * Whether every row of inner is rendered when outer is
+ */
+export function containsRows(outer: RowRange, inner: RowRange): boolean {
+  return outer.start <= inner.start && inner.end <= outer.end;
+}
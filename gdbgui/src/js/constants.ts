@@ -48,7 +48,8 @@ let constants = {
 
   tree_component_id: "tree",
 
-  default_max_lines_of_code_to_fetch: 500,
+  // only the lines scrolled into view are rendered
+  default_max_lines_of_code_to_fetch: 5000,
 
   keys_to_not_log_changes_in_console: ["gdb_mi_output"],
   xtermColors: {
@@ -0,0 +1,189 @@
+/**
+ * Decoding of the MessagePack encoded websocket messages the server sends
+ * when the "binary websocket messages" setting is on.
+ * Supports every MessagePack type the server sends, which is all of them
+ * except extension types.
+ */
+
+// fields of gdb mi records, in the order the server sends them.
+// Must match GDB_RESPONSE_FIELDS in wireencoding.py
+const GDB_RESPONSE_FIELDS = ["type", "message", "payload", "stream", "token"];
+
+const textDecoder = typeof TextDecoder === "undefined" ? null : new TextDecoder("utf-8");
+
+function decodeUtf8(bytes: Uint8Array): string {
+  if (textDecoder) {
+    return textDecoder.decode(bytes);
+  }
+  let percentEncoded = "";
+  for (let i = 0; i < bytes.length; i++) {
+    percentEncoded += "%" + ("0" + bytes[i].toString(16)).slice(-2);
+  }
+  return decodeURIComponent(percentEncoded);
+}
+
+class Decoder {
+  view: DataView;
+  bytes: Uint8Array;
+  offset: number;
+  constructor(bytes: Uint8Array) {
+    this.bytes = bytes;
+    this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    this.offset = 0;
+  }
+  uint(numBytes: number): number {
+    const view = this.view;
+    const offset = this.offset;
+    this.offset += numBytes;
+    switch (numBytes) {
+      case 1:
+        return view.getUint8(offset);
+      case 2:
+        return view.getUint16(offset);
+      case 4:
+        return view.getUint32(offset);
+      default:
+        return view.getUint32(offset) * 2 ** 32 + view.getUint32(offset + 4);
+    }
+  }
+  int(numBytes: number): number {
+    const view = this.view;
+    const offset = this.offset;
+    this.offset += numBytes;
+    switch (numBytes) {
+      case 1:
+        return view.getInt8(offset);
+      case 2:
+        return view.getInt16(offset);
+      case 4:
+        return view.getInt32(offset);
+      default:
+        return view.getInt32(offset) * 2 ** 32 + view.getUint32(offset + 4);
+    }
+  }
+  str(length: number): string {
+    const start = this.offset;
+    this.offset += length;
+    return decodeUtf8(this.bytes.subarray(start, this.offset));
+  }
+  bin(length: number): Uint8Array {
+    const start = this.offset;
+    this.offset += length;
+    return this.bytes.slice(start, this.offset);
+  }
+  array(length: number): Array<any> {
+    const result = new Array(length);
+    for (let i = 0; i < length; i++) {
+      result[i] = this.decode();
+    }
+    return result;
+  }
+  map(length: number): { [key: string]: any } {
+    const result: { [key: string]: any } = {};
+    for (let i = 0; i < length; i++) {
+      const key = this.decode();
+      result[key] = this.decode();
+    }
+    return result;
+  }
+  decode(): any {
+    const type = this.uint(1);
+    if (type <= 0x7f) {
+      return type;
+    } else if (type <= 0x8f) {
+      return this.map(type & 0x0f);
+    } else if (type <= 0x9f) {
+      return this.array(type & 0x0f);
+    } else if (type <= 0xbf) {
+      return this.str(type & 0x1f);
+    } else if (type >= 0xe0) {
+      return type - 0x100;
+    }
+    switch (type) {
+      case 0xc0:
+        return null;
+      case 0xc2:
+        return false;
+      case 0xc3:
+        return true;
+      case 0xc4:
+        return this.bin(this.uint(1));
+      case 0xc5:
+        return this.bin(this.uint(2));
+      case 0xc6:
+        return this.bin(this.uint(4));
+      case 0xca: {
+        const value = this.view.getFloat32(this.offset);
+        this.offset += 4;
+        return value;
+      }
+      case 0xcb: {
+        const value = this.view.getFloat64(this.offset);
+        this.offset += 8;
+        return value;
+      }
+      case 0xcc:
+        return this.uint(1);
+      case 0xcd:
+        return this.uint(2);
+      case 0xce:
+        return this.uint(4);
+      case 0xcf:
+        return this.uint(8);
+      case 0xd0:
+        return this.int(1);
+      case 0xd1:
+        return this.int(2);
+      case 0xd2:
+        return this.int(4);
+      case 0xd3:
+        return this.int(8);
+      case 0xd9:
+        return this.str(this.uint(1));
+      case 0xda:
+        return this.str(this.uint(2));
+      case 0xdb:
+        return this.str(this.uint(4));
+      case 0xdc:
+        return this.array(this.uint(2));
+      case 0xdd:
+        return this.array(this.uint(4));
+      case 0xde:
+        return this.map(this.uint(2));
+      case 0xdf:
+        return this.map(this.uint(4));
+      default:
+        throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}`);
+    }
+  }
+}
+
+function toUint8Array(data: ArrayBuffer | Uint8Array): Uint8Array {
+  return data instanceof Uint8Array ? data : new Uint8Array(data);
+}
+
+export function decode(data: ArrayBuffer | Uint8Array): any {
+  return new Decoder(toUint8Array(data)).decode();
+}
+
+/**
+ * Decode a gdb_response sent as MessagePack, where each mi record is an
+ * array of its fields rather than an object
+ */
+export function decodeGdbResponse(data: ArrayBuffer | Uint8Array): Array<any> {
+  return decode(data).map((row: Array<any>) => {
+    const record: { [key: string]: any } = {};
+    GDB_RESPONSE_FIELDS.forEach((field, i) => {
+      record[field] = row[i];
+    });
+    // fields that are not part of the schema
+    return Object.assign(record, row[GDB_RESPONSE_FIELDS.length]);
+  });
+}
+
+/**
+ * pty output sent as binary is raw utf-8, which xterm writes as is
+ */
+export function ptyOutput(data: string | ArrayBuffer | Uint8Array): string | Uint8Array {
+  return typeof data === "string" ? data : toUint8Array(data);
+}
@@ -124,6 +124,7 @@ const process_gdb_response = function(response_array: any) {
       }
       if ("stack" in r.payload) {
         Threads.update_stack(r.payload.stack);
+        FileOps.prehighlight_source_files([], FileOps.get_backtrace_paths());
       }
       if ("threads" in r.payload) {
         store.set("threads", r.payload.threads);
@@ -151,6 +152,11 @@ const process_gdb_response = function(response_array: any) {
             r.payload.files.map((f: any) => f.fullname)
           ).sort();
           store.set("source_file_paths", source_file_paths);
+          FileOps.preload_lexers(source_file_paths);
+          FileOps.prehighlight_source_files(
+            source_file_paths,
+            FileOps.get_backtrace_paths()
+          );
 
           let language = "c_family";
           if (source_file_paths.some((p: any) => p.endsWith(".rs"))) {
@@ -194,10 +200,7 @@ const process_gdb_response = function(response_array: any) {
         }
       }
       if ("memory" in r.payload) {
-        Memory.add_value_to_cache(
-          r.payload.memory[0].begin,
-          r.payload.memory[0].contents
-        );
+        Memory.add_blocks_to_store(r.payload.memory);
       }
       // gdb returns local variables as "variables" which is confusing, because you can also create variables
       // in gdb with '-var-create'. *Those* types of variables are referred to as "expressions" in gdbgui, and
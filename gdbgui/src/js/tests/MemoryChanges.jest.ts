@@ -0,0 +1,11 @@
+import { getChangedAddrs } from "../MemoryChanges";
+
+test("turns changed bitmaps into addresses", () => {
+  expect(getChangedAddrs(0x1000, [0, ""])).toEqual({});
+  expect(getChangedAddrs(0x1000, [0, "0a0010"])).toEqual({
+    "0x1001": true,
+    "0x1003": true,
+    "0x1014": true
+  });
+  expect(getChangedAddrs(0x1000, [2, "80"])).toEqual({ "0x1017": true });
+});
@@ -0,0 +1,55 @@
+import { applyDiff, resetPayloads, restorePayloads } from "../ResponseDeltas";
+
+test("applies diffs", () => {
+  expect(applyDiff({ a: "1" }, null)).toEqual({ a: "1" });
+  expect(applyDiff("1", ["r", { a: "1" }])).toEqual({ a: "1" });
+  expect(
+    applyDiff({ a: "1", b: "2", c: ["x", "y"] }, [
+      "d",
+      { a: ["r", "3"], c: ["l", 3, { "1": ["r", "z"], "2": ["r", "w"] }] },
+      ["b"]
+    ])
+  ).toEqual({ a: "3", c: ["x", "z", "w"] });
+  expect(applyDiff(["x", "y"], ["l", 1, {}])).toEqual(["x"]);
+});
+
+test("restores payloads and requests a resync of unknown versions", () => {
+  const requestResync = jest.fn();
+  const full = { type: "result", payload: { locals: [] }, payload_version: [0, 0] };
+  expect(restorePayloads([full], requestResync)).toEqual([full]);
+
+  const delta = {
+    type: "result",
+    payload_version: [0, 1],
+    payload_delta: [0, ["d", { locals: ["l", 1, { "0": ["r", "i"] }] }, []]]
+  };
+  expect(restorePayloads([delta], requestResync)).toEqual([
+    { type: "result", payload: { locals: ["i"] }, payload_version: [0, 1] }
+  ]);
+
+  const unknownBase = { type: "result", payload_version: [1, 4], payload_delta: [3, null] };
+  expect(restorePayloads([unknownBase, unknownBase], requestResync)).toEqual([]);
+  expect(requestResync).toHaveBeenCalledTimes(1);
+  expect(requestResync).toHaveBeenCalledWith([1]);
+});
+
+test("forgets the payloads of the previous session", () => {
+  const requestResync = jest.fn();
+  resetPayloads();
+  const later = { type: "result", payload: { stack: ["a"] }, payload_version: [2, 5] };
+  expect(restorePayloads([later], requestResync)).toEqual([later]);
+
+  // the server numbers the versions of a new session from 0
+  resetPayloads();
+  const full = { type: "result", payload: { stack: ["b"] }, payload_version: [2, 0] };
+  expect(restorePayloads([full], requestResync)).toEqual([full]);
+  const delta = {
+    type: "result",
+    payload_version: [2, 1],
+    payload_delta: [0, ["d", { stack: ["l", 2, { "1": ["r", "c"] }] }, []]]
+  };
+  expect(restorePayloads([delta], requestResync)).toEqual([
+    { type: "result", payload: { stack: ["b", "c"] }, payload_version: [2, 1] }
+  ]);
+  expect(requestResync).not.toHaveBeenCalled();
+});
@@ -0,0 +1,19 @@
+import { containsRows, findRow, getRowOffsets, getRowsToRender } from "../VirtualRows";
+
+test("finds the rows scrolled into view", () => {
+  // the second line of source has three instructions
+  const offsets = getRowOffsets([1, 3, 1, 1, 1]);
+  expect(offsets).toEqual([0, 1, 4, 5, 6, 7]);
+  expect(findRow(offsets, 0)).toEqual(0);
+  expect(findRow(offsets, 3.5)).toEqual(1);
+  expect(findRow(offsets, 4)).toEqual(2);
+  expect(findRow(offsets, 100)).toEqual(4);
+
+  expect(getRowsToRender(offsets, 2, 2, 0)).toEqual({ start: 1, end: 2 });
+  expect(getRowsToRender(offsets, 2, 3, 1)).toEqual({ start: 0, end: 4 });
+  expect(getRowsToRender(offsets, 6, 10, 2)).toEqual({ start: 2, end: 5 });
+  expect(getRowsToRender(getRowOffsets([]), 0, 10, 2)).toEqual({ start: 0, end: 0 });
+
+  expect(containsRows({ start: 0, end: 4 }, { start: 1, end: 2 })).toBe(true);
+  expect(containsRows({ start: 0, end: 4 }, { start: 3, end: 5 })).toBe(false);
+});
@@ -0,0 +1,50 @@
+import { decode, decodeGdbResponse, ptyOutput } from "../msgpack";
+
+/* eslint-env jest */
+
+test("decodes msgpack types", () => {
+  // fixint, negative fixint, nil, true, false
+  expect(decode(new Uint8Array([0x05]))).toEqual(5);
+  expect(decode(new Uint8Array([0xff]))).toEqual(-1);
+  expect(decode(new Uint8Array([0xc0]))).toEqual(null);
+  expect(decode(new Uint8Array([0xc3]))).toEqual(true);
+  expect(decode(new Uint8Array([0xc2]))).toEqual(false);
+  // uint16, int32, float64
+  expect(decode(new Uint8Array([0xcd, 0x01, 0x00]))).toEqual(256);
+  expect(decode(new Uint8Array([0xd2, 0xff, 0xff, 0xff, 0xfe]))).toEqual(-2);
+  expect(decode(new Uint8Array([0xcb, 0x3f, 0xf8, 0, 0, 0, 0, 0, 0]))).toEqual(1.5);
+  // fixstr with a multibyte character, str8
+  expect(decode(new Uint8Array([0xa3, 0x68, 0xc3, 0xa9]))).toEqual("hé");
+  expect(decode(new Uint8Array([0xd9, 0x02, 0x68, 0x69]))).toEqual("hi");
+  // fixarray, fixmap
+  expect(decode(new Uint8Array([0x92, 0x01, 0xa1, 0x61]))).toEqual([1, "a"]);
+  expect(decode(new Uint8Array([0x81, 0xa1, 0x61, 0x01]))).toEqual({ a: 1 });
+});
+
+test("decodes gdb responses sent as rows of fields", () => {
+  // [["done", "result", {"a": 1}, "stdout", null]]
+  const encoded = new Uint8Array([
+    0x91,
+    0x95,
+    0xa4,
+    ...Array.from("done").map(c => c.charCodeAt(0)),
+    0xa6,
+    ...Array.from("result").map(c => c.charCodeAt(0)),
+    0x81,
+    0xa1,
+    0x61,
+    0x01,
+    0xa6,
+    ...Array.from("stdout").map(c => c.charCodeAt(0)),
+    0xc0
+  ]);
+  expect(decodeGdbResponse(encoded.buffer)).toEqual([
+    { type: "done", message: "result", payload: { a: 1 }, stream: "stdout", token: null }
+  ]);
+});
+
+test("passes pty output to xterm as is", () => {
+  expect(ptyOutput("hi")).toEqual("hi");
+  const bytes = new Uint8Array([0x68, 0x69]);
+  expect(ptyOutput(bytes.buffer)).toEqual(bytes);
+});
@@ -29,14 +29,16 @@ lint_dependencies = [
     "check-manifest",
 ]
 vulture_whitelist = ".vulture_whitelist.py"
-files_to_lint = ["gdbgui", "tests"] + [str(p) for p in Path(".").glob("*.py")]
+files_to_lint = ["gdbgui", "tests", "benchmarks"] + [
+    str(p) for p in Path(".").glob("*.py")
+]
 files_to_lint.remove(vulture_whitelist)
 publish_deps = ["setuptools", "wheel", "twine"]
 
 
 @nox.session(reuse_venv=True)
 def python_tests(session):
-    session.install(".", "pytest", "pytest-cov")
+    session.install(".[asyncio,msgpack]", "pytest", "pytest-cov", "aiohttp")
     tests = session.posargs or ["tests"]
     session.run(
         "pytest", "--cov=gdbgui", "--cov-config", ".coveragerc", "--cov-report=", *tests
@@ -44,6 +46,17 @@ def python_tests(session):
     session.notify("cover")
 
 
+@nox.session(reuse_venv=True)
+def benchmarks(session):
+    """Run the performance benchmarks and print their results"""
+    session.install(".")
+    session.run("python", "-m", "benchmarks.bench_sessionmanager")
+    # round trips and forwarded output against fake gdb processes
+    session.run("python", "-m", "benchmarks.bench_forwarding", *session.posargs)
+    # formatting of highlighted source code, on the largest system headers
+    session.run("python", "-m", "benchmarks.bench_highlight")
+
+
 @nox.session(reuse_venv=True)
 def js_tests(session):
     session.run("yarn", "install", external=True)
@@ -87,7 +100,7 @@ def vulture(session):
 
 @nox.session()
 def lint(session):
-    session.install(".", *lint_dependencies)
+    session.install(".[asyncio,msgpack]", *lint_dependencies)
     session.run("black", "--check", *files_to_lint)
     session.run("flake8", *files_to_lint)
     session.run("mypy", *files_to_lint)
@@ -62,6 +62,12 @@ setup(
     install_requires=distutils.text_file.TextFile(
         filename="./requirements.txt"
     ).readlines(),
+    extras_require={
+        # serve from an asyncio event loop with `gdbgui --asyncio`
+        "asyncio": ["uvicorn>=0.20", "a2wsgi>=1.7"],
+        # let browsers opt in to msgpack encoded websocket messages
+        "msgpack": ["msgpack>=1.0"],
+    },
     classifiers=[
         "Intended Audience :: Developers",
         "Operating System :: MacOS",
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+
+import pytest  # type: ignore
+
+pytest.importorskip("uvicorn")
+pytest.importorskip("a2wsgi")
+aiohttp = pytest.importorskip("aiohttp")
+import socketio  # type: ignore # noqa: E402
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def asyncio_server_url():
+    """Run the asyncio server in its own process, so its debug sessions are
+    not mixed with the ones of the eventlet server the other tests use"""
+    port = get_free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "from gdbgui.server.asyncserver import run_asyncio_server; "
+            f"run_asyncio_server(host='127.0.0.1', port={port}, debug=False)",
+        ]
+    )
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except ConnectionRefusedError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_asyncio_server_broadcasts_pty_output(asyncio_server_url):
+    fake_gdb = (
+        f"{sys.executable} -c 'import time; input(); print(\"ready\"); time.sleep(30)'"
+    )
+
+    async def run_clients():
+        cookie_jar = aiohttp.CookieJar(unsafe=True)
+        async with aiohttp.ClientSession(cookie_jar=cookie_jar) as http:
+            # http routes are served by the flask app
+            async with http.get(asyncio_server_url + "/") as response:
+                assert response.status == 200
+                html = await response.text()
+        csrf_token = re.search(r'"csrf_token": "(\w+)"', html).group(1)  # type: ignore
+        cookie = "; ".join(f"{c.key}={c.value}" for c in cookie_jar)
+
+        received = []
+
+        async def connect(client_num: int, gdbpid: int):
+            client = socketio.AsyncClient()
+            for event in ["debug_session_connection_event", "user_pty_response"]:
+                client.on(
+                    event,
+                    lambda data, event=event: received.append(
+                        (client_num, event, data)
+                    ),
+                    namespace="/gdb_listener",
+                )
+            query_string = urllib.parse.urlencode(
+                {"csrf_token": csrf_token, "gdb_command": fake_gdb, "gdbpid": gdbpid}
+            )
+            await client.connect(
+                f"{asyncio_server_url}/?{query_string}",
+                namespaces=["/gdb_listener"],
+                headers={"Cookie": cookie},
+                transports=["websocket"],
+            )
+            return client
+
+        async def wait_for(condition):
+            deadline = time.time() + 5
+            while not condition() and time.time() < deadline:
+                await asyncio.sleep(0.05)
+            assert condition()
+
+        first = await connect(0, 0)
+        await wait_for(lambda: received)
+        assert received[0][1] == "debug_session_connection_event"
+        connection_event = received[0][2]
+        assert connection_event["started_new_gdb_process"]
+        second = await connect(1, connection_event["pid"])
+        await first.emit(
+            "pty_interaction",
+            {"data": {"pty_name": "user_pty", "action": "write", "key": "\n"}},
+            namespace="/gdb_listener",
+        )
+
+        def user_pty_output(client_num):
+            return "".join(
+                data
+                for num, event, data in received
+                if num == client_num and event == "user_pty_response"
+            )
+
+        await wait_for(lambda: "ready" in user_pty_output(0))
+        await wait_for(lambda: "ready" in user_pty_output(1))
+        await first.disconnect()
+        await second.disconnect()
+
+    asyncio.run(run_clients())
+
+
+def test_asyncio_server_streams_http_responses_of_the_flask_app(
+    asyncio_server_url, tmp_path
+):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"{i}.c"
+        path.write_text(f"int x{i};\n" * 1500)
+        paths.append(str(path))
+
+    async def read_files():
+        cookie_jar = aiohttp.CookieJar(unsafe=True)
+        async with aiohttp.ClientSession(cookie_jar=cookie_jar) as http:
+            async with http.get(asyncio_server_url + "/") as response:
+                html = await response.text()
+            csrf_token = re.search(r'"csrf_token": "(\w+)"', html).group(1)  # type: ignore
+
+            async def read_file(path, etag=None):
+                headers = {"X-CSRFToken": csrf_token}
+                if etag:
+                    headers["If-None-Match"] = etag
+                params = {
+                    "path": path,
+                    "start_line": "1",
+                    "end_line": "2000",
+                    "stream": "true",
+                }
+                async with http.get(
+                    asyncio_server_url + "/read_file", params=params, headers=headers
+                ) as response:
+                    return (
+                        response.status,
+                        response.headers.get("ETag"),
+                        [
+                            json.loads(line)
+                            for line in (await response.text()).splitlines()
+                        ],
+                    )
+
+            # the requests are handled on a pool of threads
+            results = await asyncio.gather(*(read_file(path) for path in paths))
+            not_modified = await read_file(paths[0], etag=results[0][1])
+        return results, not_modified
+
+    results, not_modified = asyncio.run(read_files())
+    for status, _, chunks in results:
+        assert status == 200
+        assert [(c["start_line"], c["end_line"]) for c in chunks] == [
+            (1, 1000),
+            (1001, 1501),
+        ]
+    assert not_modified[0] == 304
@@ -1,9 +1,15 @@
+import json
+import os
+import sys
+import time
+
 from flask_socketio import send, SocketIO  # type: ignore
 import pytest  # type: ignore
 
 from gdbgui.server.server import run_server
-from gdbgui.server.app import app, socketio
+from gdbgui.server.app import app, manager, socketio
 from gdbgui import cli
+from gdbgui.server.constants import DEFAULT_PTY_READ_BUDGET_BYTES
 
 run_server(testing=True, app=app, socketio=socketio)
 
@@ -27,6 +33,35 @@ def test_client():
     return app.test_client()
 
 
+@pytest.fixture
+def flask_client():
+    """A test client with a session, as after loading the main page"""
+    client = app.test_client()
+    client.get("/")
+    return client
+
+
+@pytest.fixture
+def csrf_token(flask_client):
+    with flask_client.session_transaction() as flask_session:
+        return flask_session["csrf_token"]
+
+
+# a gdb command that prints ready once enter is pressed
+READY_ON_ENTER = (
+    f"{sys.executable} -c 'import time; input(); print(\"ready\"); time.sleep(30)'"
+)
+
+
+def connect_to_gdb(flask_client, csrf_token, query_string):
+    return socketio.test_client(
+        app,
+        namespace="/gdb_listener",
+        flask_test_client=flask_client,
+        query_string=f"csrf_token={csrf_token}&{query_string}",
+    )
+
+
 def test_load_main_page(test_client):
     response = test_client.get("/")
     assert response.status_code == 200
@@ -58,3 +93,243 @@ def test_get_initial_binary_and_args():
         "./program",
         "--args",
     ]
+
+
+def test_pty_output_limits_can_be_set_on_the_command_line():
+    args = cli.get_parser().parse_args(
+        ["--pty-read-budget-bytes", "4096", "--pty-output-buffer-max-chars", "1000"]
+    )
+    assert args.pty_read_budget_bytes == 4096
+    assert args.pty_output_buffer_max_chars == 1000
+    args = cli.get_parser().parse_args([])
+    assert args.pty_read_budget_bytes == DEFAULT_PTY_READ_BUDGET_BYTES
+
+
+def test_pty_output_is_broadcast_to_every_client_of_a_debug_session(
+    flask_client, csrf_token
+):
+    first = connect_to_gdb(flask_client, csrf_token, f"gdb_command={READY_ON_ENTER}")
+    pid = first.get_received("/gdb_listener")[0]["args"][0]["pid"]
+    second = connect_to_gdb(flask_client, csrf_token, f"gdbpid={pid}")
+    second.get_received("/gdb_listener")
+    first.emit(
+        "pty_interaction",
+        {"data": {"pty_name": "user_pty", "action": "write", "key": "\n"}},
+        namespace="/gdb_listener",
+    )
+
+    def user_pty_output(client):
+        return "".join(
+            "".join(r["args"])
+            for r in client.get_received("/gdb_listener")
+            if r["name"] == "user_pty_response"
+        )
+
+    first_output = second_output = ""
+    deadline = time.time() + 5
+    while time.time() < deadline and not (
+        "ready" in first_output and "ready" in second_output
+    ):
+        socketio.sleep(0.05)
+        first_output += user_pty_output(first)
+        second_output += user_pty_output(second)
+    assert "ready" in first_output
+    assert "ready" in second_output
+    first.disconnect(namespace="/gdb_listener")
+    second.disconnect(namespace="/gdb_listener")
+
+
+def test_clients_receive_pty_output_in_the_encoding_they_negotiated(
+    flask_client, csrf_token
+):
+    pytest.importorskip("msgpack")
+    json_client = connect_to_gdb(
+        flask_client, csrf_token, f"gdb_command={READY_ON_ENTER}"
+    )
+    connection_event = json_client.get_received("/gdb_listener")[0]["args"][0]
+    assert connection_event["encoding"] == "json"
+    msgpack_client = connect_to_gdb(
+        flask_client, csrf_token, f"gdbpid={connection_event['pid']}&encoding=msgpack"
+    )
+    connection_event = msgpack_client.get_received("/gdb_listener")[0]["args"][0]
+    assert connection_event["encoding"] == "msgpack"
+    json_client.emit(
+        "pty_interaction",
+        {"data": {"pty_name": "user_pty", "action": "write", "key": "\n"}},
+        namespace="/gdb_listener",
+    )
+
+    json_output = ""
+    msgpack_output = b""
+    deadline = time.time() + 5
+    while time.time() < deadline and not (
+        "ready" in json_output and b"ready" in msgpack_output
+    ):
+        socketio.sleep(0.05)
+        for r in json_client.get_received("/gdb_listener"):
+            if r["name"] == "user_pty_response":
+                json_output += r["args"][0]
+        for r in msgpack_client.get_received("/gdb_listener"):
+            if r["name"] == "user_pty_response":
+                msgpack_output += r["args"][0]
+    assert "ready" in json_output
+    assert b"ready" in msgpack_output
+    json_client.disconnect(namespace="/gdb_listener")
+    msgpack_client.disconnect(namespace="/gdb_listener")
+
+
+def test_read_file_serves_a_range_of_highlighted_lines(
+    tmp_path, flask_client, csrf_token
+):
+    path = tmp_path / "main.c"
+    path.write_text("/* a\n b */\nint main() {\n  return 0;\n}\n")
+    response = flask_client.get(
+        "/read_file",
+        query_string={"path": str(path), "start_line": 2, "end_line": 100},
+        headers={"X-CSRFToken": csrf_token},
+    )
+    assert response.status_code == 200
+    assert response.json["highlighted"]
+    assert response.json["start_line"] == 2
+    assert response.json["end_line"] == response.json["num_lines_in_file"] == 6
+    assert response.json["source_code_array"][0] == '<span class="cm"> b */</span>\n'
+
+
+def test_read_file_streams_lines_in_blocks(tmp_path, flask_client, csrf_token):
+    path = tmp_path / "main.c"
+    path.write_text("int x;\n" * 1500)
+    response = flask_client.get(
+        "/read_file",
+        query_string={
+            "path": str(path),
+            "start_line": 1,
+            "end_line": 2000,
+            "stream": "true",
+        },
+        headers={"X-CSRFToken": csrf_token},
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    chunks = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [(c["start_line"], c["end_line"]) for c in chunks] == [
+        (1, 1000),
+        (1001, 1501),
+    ]
+    assert len(chunks[1]["source_code_array"]) == 501
+
+
+def test_read_file_responds_not_modified_until_the_file_changes(
+    tmp_path, flask_client, csrf_token
+):
+    path = tmp_path / "main.c"
+    path.write_text("int main() {\n  return 0;\n}\n")
+    query_string = {"path": str(path), "start_line": 1, "end_line": 100}
+    response = flask_client.get(
+        "/read_file", query_string=query_string, headers={"X-CSRFToken": csrf_token}
+    )
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = flask_client.get(
+        "/read_file",
+        query_string=query_string,
+        # as flask-compress would have changed the etag of a compressed response
+        headers={"X-CSRFToken": csrf_token, "If-None-Match": etag[:-1] + ':gzip"'},
+    )
+    assert response.status_code == 304
+    assert response.data == b""
+    # as the frontend fetches files
+    response = flask_client.get(
+        "/read_file",
+        query_string=dict(query_string, stream="true"),
+        headers={"X-CSRFToken": csrf_token},
+    )
+    streamed_etag = response.headers["ETag"]
+    response = flask_client.get(
+        "/read_file",
+        query_string=dict(query_string, stream="true"),
+        headers={"X-CSRFToken": csrf_token, "If-None-Match": streamed_etag},
+    )
+    assert response.status_code == 304
+
+    path.write_text("int main() {\n  return 10;\n}\n")
+    response = flask_client.get(
+        "/read_file",
+        query_string=query_string,
+        headers={"X-CSRFToken": csrf_token, "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_get_last_modified_unix_secs_of_several_files(
+    tmp_path, flask_client, csrf_token
+):
+    path = tmp_path / "main.c"
+    path.write_text("int x;\n")
+    missing_path = str(tmp_path / "missing.c")
+    response = flask_client.post(
+        "/get_last_modified_unix_secs",
+        json={"paths": [str(path), missing_path]},
+        headers={"X-CSRFToken": csrf_token},
+    )
+    assert response.status_code == 200
+    assert response.json["last_modified_unix_secs"] == {
+        str(path): path.stat().st_mtime,
+        missing_path: None,
+    }
+
+
+def test_clients_are_notified_when_a_source_file_they_watch_changes(
+    tmp_path, flask_client, csrf_token
+):
+    path = tmp_path / "main.c"
+    path.write_text("int x;\n")
+    fake_gdb = f"{sys.executable} -c 'import time; time.sleep(30)'"
+    client = connect_to_gdb(flask_client, csrf_token, f"gdb_command={fake_gdb}")
+    client.get_received("/gdb_listener")
+    client.emit("watch_source_files", {"paths": [str(path)]}, namespace="/gdb_listener")
+    path.write_text("int x, y;\n")
+
+    changes = []
+    deadline = time.time() + 5
+    while time.time() < deadline and not changes:
+        socketio.sleep(0.05)
+        changes = [
+            r["args"][0]
+            for r in client.get_received("/gdb_listener")
+            if r["name"] == "source_file_changed"
+        ]
+    assert changes == [
+        {"path": str(path), "last_modified_unix_sec": os.path.getmtime(path)}
+    ]
+    client.disconnect(namespace="/gdb_listener")
+
+
+def test_debug_session_ends_when_gdb_exits(flask_client, csrf_token):
+    fake_gdb = f"{sys.executable} -c 'input()'"
+    client = connect_to_gdb(flask_client, csrf_token, f"gdb_command={fake_gdb}")
+    pid = client.get_received("/gdb_listener")[0]["args"][0]["pid"]
+    debug_session = manager.debug_session_from_pid(pid)
+    client.emit(
+        "pty_interaction",
+        {"data": {"pty_name": "user_pty", "action": "write", "key": "\n"}},
+        namespace="/gdb_listener",
+    )
+
+    received = []
+    deadline = time.time() + 5
+    while time.time() < deadline and manager.debug_session_from_pid(pid):
+        socketio.sleep(0.05)
+        received += client.get_received("/gdb_listener")
+    received += client.get_received("/gdb_listener")
+    assert manager.debug_session_from_pid(pid) is None
+    assert all(pty.closed for pty in debug_session.get_ptys().values())
+    assert "fatal_server_error" not in [r["name"] for r in received]
+    assert [
+        response["payload"]
+        for r in received
+        if r["name"] == "gdb_response"
+        for response in r["args"][0]
+    ] == ["gdb exited. This tab will no longer function as expected."]
+    client.disconnect(namespace="/gdb_listener")
@@ -0,0 +1,24 @@
+from benchmarks import bench_forwarding, bench_highlight
+from gdbgui.server.app import app, socketio
+from gdbgui.server.server import run_server
+
+run_server(testing=True, app=app, socketio=socketio)
+
+
+def test_forwarding_benchmark_against_fake_gdb():
+    result = bench_forwarding.run(
+        num_sessions=2, num_commands=8, flood_bytes=10000, delta_updates=True
+    )
+    assert result["sessions"] == 2
+    assert 0 < result["p50_ms"] <= result["p99_ms"]
+    assert result["mi_bytes_per_sec"] > 0
+    assert result["pty_bytes_per_sec"] > 0
+
+
+def test_highlight_benchmark_checks_formatters_agree(tmp_path):
+    path = tmp_path / "main.cpp"
+    path.write_text("/* a\n b */\nint main() {\n  return 1 < 2;\n}\n" * 50)
+    result = bench_highlight.run([str(path)])
+    assert result["files"] == 1
+    assert result["lines"] == 250
+    assert result["gdbgui_format_sec"] > 0
@@ -0,0 +1,74 @@
+import pytest  # type: ignore
+
+from gdbgui.server.deltas import ResponseDeltaEncoder, apply_diff, diff
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ({"a": "1", "b": ["x", "y"]}, {"a": "1", "b": ["x", "z", "w"]}),
+        ({"a": "1", "b": "2"}, {"a": "1"}),
+        ([{"name": "i", "value": "1"}], []),
+        ("1", {"a": "1"}),
+        (None, [1]),
+    ],
+)
+def test_diff_round_trip(old, new):
+    value_diff = diff(old, new)
+    assert value_diff is not None
+    assert apply_diff(old, value_diff) == new
+
+
+def test_diff_of_equal_values_is_none():
+    assert diff({"a": ["1", {"b": "2"}]}, {"a": ["1", {"b": "2"}]}) is None
+    assert apply_diff({"a": "1"}, None) == {"a": "1"}
+
+
+def test_diff_only_contains_changes():
+    old = {"locals": [{"name": "i", "value": "1"}, {"name": "j", "value": "2"}]}
+    new = {"locals": [{"name": "i", "value": "1"}, {"name": "j", "value": "3"}]}
+    assert diff(old, new) == [
+        "d",
+        {"locals": ["l", 2, {"1": ["d", {"value": ["r", "3"]}, []]}]},
+        [],
+    ]
+
+
+def result(payload):
+    return {"type": "result", "message": "done", "payload": payload, "token": None}
+
+
+def test_results_are_matched_to_the_commands_written():
+    encoder = ResponseDeltaEncoder()
+    encoder.command_written("-break-insert main")
+    encoder.command_written("12-stack-list-locals --simple-values")
+    console = {"type": "console", "payload": "hi"}
+    encoded = encoder.encode(
+        [result({"bkpt": {}}), console, result({"locals": []})], True
+    )
+    assert encoded == [
+        result({"bkpt": {}}),
+        console,
+        dict(result({"locals": []}), payload_version=[0, 0]),
+    ]
+
+    # the same command with a different token is diffed against the previous result
+    encoder.command_written("13-stack-list-locals --simple-values")
+    (encoded_result,) = encoder.encode([result({"locals": ["i"]})], True)
+    assert "payload" not in encoded_result
+    assert encoded_result["payload_version"] == [0, 1]
+    base_version, value_diff = encoded_result["payload_delta"]
+    assert base_version == 0
+    assert apply_diff({"locals": []}, value_diff) == {"locals": ["i"]}
+
+    assert encoder.get_latest([0, 5]) == [
+        dict(result({"locals": ["i"]}), payload_version=[0, 1])
+    ]
+
+
+def test_full_payloads_are_sent_without_deltas():
+    encoder = ResponseDeltaEncoder()
+    for i in range(2):
+        encoder.command_written("-thread-info")
+        (encoded,) = encoder.encode([result({"threads": [i]})], False)
+        assert encoded == dict(result({"threads": [i]}), payload_version=[0, i])
@@ -0,0 +1,161 @@
+import struct
+import time
+
+from benchmarks import bench_forwarding
+from gdbgui.server.disassemblycache import (
+    DISASSEMBLY_TOKEN_BASE,
+    DisassemblyCache,
+    SessionDisassembly,
+    get_build_id,
+    get_executable_key,
+)
+from tests.test_memoryreads import connect_to_fake_gdb
+
+
+def make_elf_with_build_id(build_id: bytes) -> bytes:
+    """Return a 64 bit little endian ELF file with only a PT_NOTE segment"""
+    notes = struct.pack("<III", 4, len(build_id), 3) + b"GNU\0" + build_id
+    header = b"\x7fELF" + bytes([2, 1, 1]) + bytes(9)
+    header += struct.pack("<HHIQQQIHHHHHH", 2, 62, 1, 0, 64, 0, 0, 64, 56, 1, 0, 0, 0)
+    program_header = struct.pack("<IIQQQQQQ", 4, 4, 120, 0, 0, len(notes), 0, 4)
+    return header + program_header + notes
+
+
+def test_executables_are_identified_by_their_build_id(tmp_path):
+    elf = tmp_path / "program"
+    elf.write_bytes(make_elf_with_build_id(bytes(range(20))))
+    assert get_build_id(str(elf)) == bytes(range(20)).hex()
+    assert get_executable_key(str(elf)) == f"build-id:{bytes(range(20)).hex()}"
+
+    script = tmp_path / "script"
+    script.write_text("#!/bin/sh\n")
+    assert get_build_id(str(script)) is None
+    assert get_executable_key(str(script)).startswith(f"{script}:10:")
+    assert get_executable_key(str(tmp_path / "missing")) is None
+
+
+def test_least_recently_used_disassembly_is_evicted():
+    cache = DisassemblyCache(max_bytes=40)
+    cache.put(("a",), {"asm_insns": []})
+    cache.put(("b",), {"asm_insns": []})
+    assert cache.get(("a",)) == {"asm_insns": []}
+    cache.put(("c",), {"asm_insns": []})
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None
+    cache.put(("d",), {"asm_insns": ["x" * 30]})
+    assert cache.get(("d",)) is None
+
+
+def found_executable(disassembly, path, token, started=False):
+    group = {"id": "i1", "type": "process", "executable": path}
+    if started:
+        group["pid"] = "1"
+    result = {"type": "result", "message": "done", "payload": {"groups": [group]}}
+    return disassembly.take_results([dict(result, token=token)])
+
+
+def test_disassembly_is_cached_by_executable_and_settings(tmp_path):
+    path = str(tmp_path / "program")
+    (tmp_path / "program").write_text("program")
+    disassembly = SessionDisassembly("gdb")
+    cmd = "4-data-disassemble -s 0x1000 -e 0x1100 -- 0"
+    # gdb did not say which executable it debugs yet
+    (lookup,) = disassembly.command_written(f"-file-exec-and-symbols {path}")
+    assert lookup == f"{DISASSEMBLY_TOKEN_BASE}-list-thread-groups"
+    assert disassembly.get_key(cmd) is None
+    assert found_executable(disassembly, path, DISASSEMBLY_TOKEN_BASE) == ([], [])
+    key = disassembly.get_key(cmd)
+    assert key is not None
+    assert disassembly.get_key("-break-list") is None
+    assert disassembly.get_key("5-data-disassemble -f main.c -l 10 -n 1000 -- 4")
+    # the program counter changes as the program runs
+    assert disassembly.get_key("6-data-disassemble -s $pc -e $pc+100 -- 0") is None
+    assert disassembly.get_key("7-data-disassemble -a main -- 0") is None
+
+    rewritten = disassembly.rewrite_command(cmd, key)
+    assert (
+        rewritten
+        == f"{DISASSEMBLY_TOKEN_BASE + 1}-data-disassemble -s 0x1000 -e 0x1100 -- 0"
+    )
+    result = {
+        "type": "result",
+        "message": "done",
+        "payload": {"asm_insns": []},
+        "token": DISASSEMBLY_TOKEN_BASE + 1,
+        "stream": "stdout",
+    }
+    responses, to_cache = disassembly.take_results([result])
+    # the client gets the result of its own command
+    assert responses == [dict(result, token=4)]
+    assert to_cache == [(key, {"asm_insns": []})]
+    cache = DisassemblyCache(max_bytes=1000)
+    cache.put(key, {"asm_insns": []})
+    assert disassembly.get_cached_response(cmd, key, cache) == dict(result, token=4)
+
+    disassembly.command_written("set disassembly-flavor intel")
+    assert disassembly.get_key(cmd) != key
+    disassembly.take_results(
+        [
+            {
+                "type": "notify",
+                "message": "cmd-param-changed",
+                "payload": {"param": "disassembly-flavor", "value": "att"},
+                "token": None,
+            }
+        ]
+    )
+    assert disassembly.get_key(cmd) == key
+
+    # addresses change once the program is started
+    started = {
+        "type": "notify",
+        "message": "thread-group-started",
+        "payload": {"id": "i1", "pid": "1"},
+        "token": None,
+    }
+    assert disassembly.take_results([started]) == ([started], [])
+    assert disassembly.get_key(cmd) not in (key, None)
+    disassembly.command_written("set disable-randomization off")
+    assert disassembly.get_key(cmd) is None
+
+
+def test_executable_is_looked_up_after_console_commands_that_change_it():
+    disassembly = SessionDisassembly("gdb")
+    assert disassembly.console_input_written("info registers\r") == []
+    assert disassembly.console_input_written("fil") == []
+    (lookup,) = disassembly.console_input_written("e /bin/true\r")
+    assert lookup.endswith("-list-thread-groups")
+    # edited with backspace, and discarded with ctrl-u
+    assert disassembly.console_input_written("cdx\x7f\x7f\x7fbt\r") == []
+    assert disassembly.console_input_written("file a\x15\r") == []
+    # a line recalled from history may be any command
+    assert len(disassembly.console_input_written("\x1b[A\r")) == 1
+    assert disassembly.console_input_written("bt\r") == []
+
+
+def test_sessions_of_the_same_executable_share_disassembly(tmp_path):
+    executable = tmp_path / "program"
+    executable.write_text("program")
+    sessions = []
+    try:
+        for _ in range(2):
+            session = connect_to_fake_gdb(fake_gdb_args="--disassemble-sec 0.5")
+            sessions.append(session)
+            bench_forwarding.run_commands(
+                [session], f"-file-exec-and-symbols {executable}"
+            )
+            # gdbgui asks gdb which executable it loaded right after this, and
+            # gdb answers in order
+            bench_forwarding.run_commands([session], "-break-list")
+        times = []
+        for session in sessions:
+            start = time.perf_counter()
+            bench_forwarding.run_commands(
+                [session], "-data-disassemble -s 0x401000 -e 0x402000 -- 0"
+            )
+            times.append(time.perf_counter() - start)
+    finally:
+        for session in sessions:
+            session.disconnect()
+    assert times[0] >= 0.5
+    assert times[1] < 0.5
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+from gdbgui.server import sourcecache
+from gdbgui.server.highlightcache import HighlightCache
+from gdbgui.server.sourcecache import SourceCache, get_lexer
+
+
+def test_entries_are_keyed_by_the_lexed_text_and_lexer(tmp_path):
+    cache = HighlightCache(str(tmp_path), max_bytes=1024 * 1024)
+    key = cache.get_key("int x;", get_lexer("main.c"))
+    assert cache.get(key) is None
+    cache.put(key, ['<span class="kt">int</span> x;'])
+    assert cache.get(key) == ['<span class="kt">int</span> x;']
+    assert cache.get_key("int x;", get_lexer("main.c")) == key
+    assert cache.get_key("int y;", get_lexer("main.c")) != key
+    assert cache.get_key("int x;", get_lexer("main.py")) != key
+
+
+def test_entries_are_shared_with_other_processes(tmp_path):
+    key = HighlightCache(str(tmp_path), 1024 * 1024).get_key("x", get_lexer("a.c"))
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from gdbgui.server.highlightcache import HighlightCache; "
+            f"HighlightCache({str(tmp_path)!r}, 1024 * 1024).put({key!r}, ['x'])",
+        ],
+        check=True,
+    )
+    assert HighlightCache(str(tmp_path), 1024 * 1024).get(key) == ["x"]
+    # nothing but the entry is left behind
+    assert [files for _, _, files in os.walk(tmp_path) if files] == [[key]]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    lines = [f"line {i} " * 20 for i in range(100)]
+    cache = HighlightCache(str(tmp_path), max_bytes=1024 * 1024)
+    cache.put("aa", lines)
+    entry_size = os.path.getsize(tmp_path / "aa" / "aa")
+    cache = HighlightCache(str(tmp_path), max_bytes=entry_size * 3 + 1)
+    cache.put("bb", lines)
+    cache.put("cc", lines)
+    for key, mtime in [("aa", 1), ("bb", 3), ("cc", 2)]:
+        os.utime(tmp_path / key / key, (mtime, mtime))
+    # "bb" is touched when it is used
+    assert cache.get("bb") == lines
+    cache.put("dd", lines)
+    assert [key for key in ["aa", "bb", "cc", "dd"] if cache.get(key)] == ["bb", "dd"]
+
+
+def test_invalid_entries_are_ignored(tmp_path):
+    cache = HighlightCache(str(tmp_path), max_bytes=1024 * 1024)
+    (tmp_path / "ab").mkdir()
+    (tmp_path / "ab" / "abcd").write_bytes(b"not compressed json")
+    assert cache.get("abcd") is None
+
+
+def test_source_cache_highlights_each_text_once_across_processes(tmp_path, monkeypatch):
+    path = tmp_path / "main.c"
+    path.write_text("/* a\n b */\nint main() {\n  return 0;\n}\n")
+    cache_dir = str(tmp_path / "cache")
+    first = SourceCache(1024 * 1024, disk_cache=HighlightCache(cache_dir, 1024 * 1024))
+    lines = first.get(str(path), highlight=True).lines
+
+    def fail(*args):
+        raise AssertionError("highlighted again")
+
+    monkeypatch.setattr(sourcecache.htmllistformatter, "get_marked_up_list", fail)
+    second = SourceCache(1024 * 1024, disk_cache=HighlightCache(cache_dir, 1024 * 1024))
+    assert second.get(str(path), highlight=True).lines == lines
@@ -0,0 +1,31 @@
+import pytest
+from pygments.lexers import CLexer, CppLexer, PythonLexer, TextLexer  # type: ignore
+
+from gdbgui import htmllistformatter
+
+SOURCES = [
+    (CLexer, " \n/* a\n b */\nint main() {\n\n  return 0;\n}\n"),
+    (CLexer, '#include <stdio.h>\nchar *s = "<&>\\"\'";\n// a && b\nint x = 1 << 2;'),
+    (CppLexer, "template <typename T>\nstd::vector<T> f(T a) { return {a, a}; }\n"),
+    (CppLexer, 'const char *s = R"(\n  raw\n\n  string\n)";\n /**\n  * doc\n  */\n'),
+    (PythonLexer, 's = """\n<multi>\n\n  line\n"""\n\n\nx = \'a\' + "b"  # c\n'),
+    (TextLexer, " \n\nplain <text>\n"),
+    (CLexer, ""),
+]
+
+
+@pytest.mark.parametrize("lexer_class, source", SOURCES)
+def test_same_html_as_pygments_formatter(lexer_class, source):
+    tokens = list(lexer_class().get_tokens(source))
+    expected = htmllistformatter.HtmlListFormatter().get_marked_up_list(tokens)
+    assert htmllistformatter.get_marked_up_list(tokens) == expected
+
+
+def test_multi_line_tokens_are_split_into_lines():
+    tokens = CLexer().get_tokens("/* a\n b */ int x;\n")
+    assert htmllistformatter.get_marked_up_list(tokens) == [
+        '<span class="cm">/* a</span>\n',
+        '<span class="cm"> b */</span><span class="w"> </span>'
+        '<span class="kt">int</span><span class="w"> </span>'
+        '<span class="n">x</span><span class="p">;</span>\n',
+    ]
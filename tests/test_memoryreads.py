@@ -0,0 +1,247 @@
+import time
+
+import pytest
+
+from benchmarks import bench_forwarding, fakegdb
+from gdbgui.server.app import app, socketio
+from gdbgui.server.memoryreads import (
+    MAX_MEMORY_READ_BYTES,
+    MEMORY_READ_CHUNK_BYTES,
+    MEMORY_READ_TOKEN_BASE,
+    MemoryReader,
+    get_changed_bitmap,
+    get_changed_ranges,
+)
+from gdbgui.server.server import run_server
+
+run_server(testing=True, app=app, socketio=socketio)
+
+
+def memory_result(token, begin, contents):
+    block = {"begin": hex(begin), "offset": "0x0", "end": "0x0", "contents": contents}
+    return {
+        "type": "result",
+        "message": "done",
+        "payload": {"memory": [block]},
+        "token": token,
+    }
+
+
+def test_ranges_are_read_in_chunks():
+    reader = MemoryReader()
+    num_bytes = MEMORY_READ_CHUNK_BYTES * 2 + 10
+    assert reader.get_commands(0x1000, num_bytes) == [
+        f"{MEMORY_READ_TOKEN_BASE}-data-read-memory-bytes 0x1000 {MEMORY_READ_CHUNK_BYTES}",
+        f"{MEMORY_READ_TOKEN_BASE + 1}-data-read-memory-bytes "
+        f"{hex(0x1000 + MEMORY_READ_CHUNK_BYTES)} {MEMORY_READ_CHUNK_BYTES}",
+        f"{MEMORY_READ_TOKEN_BASE + 2}-data-read-memory-bytes "
+        f"{hex(0x1000 + MEMORY_READ_CHUNK_BYTES * 2)} 10",
+    ]
+    with pytest.raises(ValueError):
+        reader.get_commands(0x1000, MAX_MEMORY_READ_BYTES + 1)
+    with pytest.raises(ValueError):
+        reader.get_commands(0x1000, 0)
+
+
+def test_results_are_taken_out_of_the_responses():
+    reader = MemoryReader()
+    reader.get_commands(0x1000, MEMORY_READ_CHUNK_BYTES + 2)
+    first_token = MEMORY_READ_TOKEN_BASE
+    other = {"type": "result", "message": "done", "payload": {}, "token": 1}
+    console = {"type": "console", "message": None, "payload": "hi", "token": None}
+    first_chunk = "ab" * MEMORY_READ_CHUNK_BYTES
+    responses, completed = reader.take_results(
+        [other, memory_result(first_token, 0x1000, first_chunk), console]
+    )
+    assert responses == [other, console]
+    assert completed == []
+
+    second_chunk = memory_result(
+        first_token + 1, 0x1000 + MEMORY_READ_CHUNK_BYTES, "cdef"
+    )
+    responses, completed = reader.take_results([second_chunk])
+    assert responses == []
+    # the chunks are adjacent, so they are a single block
+    assert completed == [
+        {
+            "start_addr": "0x1000",
+            "num_bytes": MEMORY_READ_CHUNK_BYTES + 2,
+            "blocks": [{"begin": "0x1000", "contents": first_chunk + "cdef"}],
+            "errors": [],
+        }
+    ]
+    # the tokens are not reused
+    assert reader.take_results([second_chunk]) == ([second_chunk], [])
+
+
+def test_unreadable_chunks_are_reported_as_errors():
+    reader = MemoryReader()
+    reader.get_commands(0x0, 2)
+    error = {
+        "type": "result",
+        "message": "error",
+        "payload": {"msg": "Unable to read memory."},
+        "token": MEMORY_READ_TOKEN_BASE,
+    }
+    assert reader.take_results([error]) == (
+        [],
+        [
+            {
+                "start_addr": "0x0",
+                "num_bytes": 2,
+                "blocks": [],
+                "errors": ["Unable to read memory."],
+            }
+        ],
+    )
+
+
+def connect_to_fake_gdb(fake_gdb_args=""):
+    flask_client = app.test_client()
+    flask_client.get("/")
+    with flask_client.session_transaction() as flask_session:
+        csrf_token = flask_session["csrf_token"]
+    session = bench_forwarding.BenchmarkSession(
+        flask_client, csrf_token, fake_gdb_args, {}
+    )
+    bench_forwarding.run_commands([session], "-gdb-set confirm off")
+    return session
+
+
+def receive_until(session, event_name):
+    received = []
+    deadline = time.monotonic() + bench_forwarding.TIMEOUT_SEC
+    while not any(event["name"] == event_name for event in received):
+        assert time.monotonic() < deadline
+        socketio.sleep(bench_forwarding.POLL_INTERVAL_SEC)
+        received += session.client.get_received(bench_forwarding.NAMESPACE)
+    return received
+
+
+def test_read_memory_sends_one_response_for_the_range():
+    session = connect_to_fake_gdb()
+    try:
+        # the last 16 bytes are past the end of the fake gdb's memory
+        start_addr = fakegdb.MEMORY_START + fakegdb.MEMORY_BYTES - 100000
+        session.client.emit(
+            "read_memory",
+            {"start_addr": hex(start_addr), "num_bytes": 100016},
+            namespace=bench_forwarding.NAMESPACE,
+        )
+        received = receive_until(session, "memory_response")
+    finally:
+        session.disconnect()
+    assert [event["name"] for event in received] == ["memory_response"]
+    memory_response = received[0]["args"][0]
+    assert memory_response["start_addr"] == hex(start_addr)
+    assert memory_response["errors"] == []
+    (block,) = memory_response["blocks"]
+    assert block["begin"] == hex(start_addr)
+    assert len(block["contents"]) == 100000 * 2
+    assert (
+        block["contents"][:4] == f"{start_addr & 0xFF:02x}{(start_addr + 1) & 0xFF:02x}"
+    )
+
+
+def read_watched_region(reader, client_id, full):
+    (command,) = reader.get_commands(0x1000, 32, client_id, full)
+    return int(command.split("-")[0])
+
+
+def test_watched_regions_are_sent_as_changes_since_the_last_read():
+    reader = MemoryReader()
+    token = read_watched_region(reader, "client", full=True)
+    old = bytes(range(32))
+    _, (first,) = reader.take_results([memory_result(token, 0x1000, old.hex())])
+    assert first["version"] == 0
+    assert first["blocks"] == [{"begin": "0x1000", "contents": old.hex()}]
+    assert reader.get_snapshot(0x1000, 32) == first
+
+    running = {"type": "notify", "message": "running", "payload": {}, "token": None}
+    stopped = {"type": "notify", "message": "stopped", "payload": {}, "token": None}
+    assert reader.take_results([running]) == ([running], [])
+    assert reader.get_snapshot(0x1000, 32) is None
+    (command,) = reader.get_refresh_commands([stopped])
+    assert command.endswith("-data-read-memory-bytes 0x1000 32")
+    # a client refreshing at the same time gets the result of the same read
+    assert reader.get_commands(0x1000, 32, "other client", full=False) == []
+
+    new = bytearray(old)
+    new[1] = new[3] = new[20] = 0xFF
+    token = int(command.split("-")[0])
+    _, (changes,) = reader.take_results([memory_result(token, 0x1000, new.hex())])
+    assert changes == {
+        "start_addr": "0x1000",
+        "num_bytes": 32,
+        "errors": [],
+        "version": 1,
+        "base_version": 0,
+        "changed_blocks": [
+            # bytes 1 and 3 are close enough to be sent as one block
+            {"begin": "0x1001", "contents": "ff02ff"},
+            {"begin": "0x1014", "contents": "ff"},
+        ],
+        # bytes 1 and 3 of the first byte of the bitmap, and byte 4 of the third
+        "changed_bitmap": [0, "0a0010"],
+    }
+
+    # clients that don't have the previous version get the whole region
+    token = read_watched_region(reader, "client", full=True)
+    _, (whole,) = reader.take_results([memory_result(token, 0x1000, new.hex())])
+    assert whole["blocks"] == [{"begin": "0x1000", "contents": new.hex()}]
+    assert whole["changed_bitmap"] == [0, ""]
+
+
+def test_regions_are_only_watched_while_clients_display_them():
+    reader = MemoryReader()
+    stopped = {"type": "notify", "message": "stopped", "payload": {}, "token": None}
+    reader.get_commands(0x1000, 32, "client")
+    reader.get_commands(0x2000, 32, "client")
+    reader.take_results(
+        [
+            memory_result(MEMORY_READ_TOKEN_BASE, 0x1000, "00" * 32),
+            memory_result(MEMORY_READ_TOKEN_BASE + 1, 0x2000, "00" * 32),
+        ]
+    )
+    (command,) = reader.get_refresh_commands([stopped])
+    assert "0x2000" in command
+    reader.unwatch("client")
+    assert reader.get_refresh_commands([stopped]) == []
+
+
+def test_changed_bitmap_starts_at_the_first_changed_byte():
+    assert get_changed_bitmap([], 0x1000) == [0, ""]
+    assert get_changed_bitmap([(0x1011, 0x1013), (0x1020, 0x1021)], 0x1000) == [
+        2,
+        "0600" + "01",
+    ]
+    assert get_changed_ranges(bytes(200), bytes(199) + b"\x01") == [(199, 200)]
+
+
+def test_watched_memory_is_read_again_when_gdb_stops():
+    session = connect_to_fake_gdb()
+    start_addr = fakegdb.MEMORY_START
+    try:
+        session.client.emit(
+            "read_memory",
+            {"start_addr": hex(start_addr), "num_bytes": 256, "watch": True},
+            namespace=bench_forwarding.NAMESPACE,
+        )
+        (first,) = [
+            event["args"][0]
+            for event in receive_until(session, "memory_response")
+            if event["name"] == "memory_response"
+        ]
+        bench_forwarding.run_commands([session], "-exec-next")
+        (changes,) = [
+            event["args"][0]
+            for event in receive_until(session, "memory_response")
+            if event["name"] == "memory_response"
+        ]
+    finally:
+        session.disconnect()
+    assert changes["base_version"] == first["version"]
+    # the line the fake program is on is in every 64th byte
+    assert [block["begin"] for block in changes["changed_blocks"]] == [
+        hex(start_addr + offset) for offset in range(0, 256, 64)
+    ]
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest  # type: ignore
+
+from gdbgui.server.mioutput import MiOutputParser, parse_mi_output
+
+
+def test_parse_mi_output():
+    responses = parse_mi_output('^done,value="1"\n(gdb) \n~"hello\\n"\n')
+    assert responses == [
+        {
+            "type": "result",
+            "message": "done",
+            "payload": {"value": "1"},
+            "token": None,
+            "stream": "stdout",
+        },
+        {
+            "type": "console",
+            "message": None,
+            "payload": "hello\n",
+            "stream": "stdout",
+        },
+    ]
+
+
+def test_incomplete_lines_are_buffered():
+    parser = MiOutputParser()
+    parser.feed("session", "^done,val")
+    parser.feed("session", 'ue="1"')
+    assert parser.get_parsed() == []
+    parser.feed("session", '\n~"partial')
+    ((key, responses),) = parser.get_parsed()
+    assert key == "session"
+    assert [r["payload"] for r in responses] == [{"value": "1"}]
+
+
+@pytest.mark.parametrize("executor", [None, ThreadPoolExecutor()])
+def test_responses_are_returned_in_order_per_key(executor):
+    parser = MiOutputParser(executor)
+    for i in range(20):
+        parser.feed("first", f'~"first {i}"\n')
+        parser.feed("second", f'~"second {i}"\n')
+    if executor:
+        executor.shutdown(wait=True)
+    parsed = dict(parser.get_parsed())
+    assert [r["payload"] for r in parsed["first"]] == [f"first {i}" for i in range(20)]
+    assert [r["payload"] for r in parsed["second"]] == [
+        f"second {i}" for i in range(20)
+    ]
+    assert parser.get_parsed() == []
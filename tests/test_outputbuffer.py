@@ -0,0 +1,40 @@
+from unittest import mock
+
+from gdbgui.server.outputbuffer import PtyOutputBuffer
+
+
+def test_output_is_coalesced_until_clients_ack():
+    buffer = PtyOutputBuffer(max_chars=100, ack_timeout_sec=60)
+    buffer.append("a")
+    assert buffer.take_frame(["client1", "client2"]) == "a"
+
+    buffer.append("b")
+    buffer.append("c")
+    assert buffer.take_frame(["client1", "client2"]) is None
+    buffer.ack("client1")
+    assert buffer.take_frame(["client1", "client2"]) is None
+    buffer.ack("client2")
+    assert buffer.take_frame(["client1", "client2"]) == "bc"
+    assert not buffer.has_output()
+
+
+def test_oldest_output_is_dropped_above_max_chars():
+    buffer = PtyOutputBuffer(max_chars=5, ack_timeout_sec=60)
+    buffer.append("abc")
+    buffer.append("defg")
+    buffer.append("h")
+    frame = buffer.take_frame([])
+    assert frame is not None
+    assert "3 characters of output were dropped" in frame
+    assert frame.endswith("defgh")
+
+
+def test_frame_is_sent_when_ack_times_out():
+    buffer = PtyOutputBuffer(max_chars=100, ack_timeout_sec=1)
+    with mock.patch("time.monotonic", return_value=10.0):
+        buffer.append("a")
+        assert buffer.take_frame(["client1"]) == "a"
+        buffer.append("b")
+        assert buffer.take_frame(["client1"]) is None
+    with mock.patch("time.monotonic", return_value=11.5):
+        assert buffer.take_frame(["client1"]) == "b"
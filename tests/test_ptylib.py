@@ -9,3 +9,36 @@ def test_pty():
     os.write(pty.stdin, "hello".encode())
     output = os.read(pty.stdout, 1024).decode()
     assert output == "hello"
+
+
+def write_to_slave(pty: ptylib.Pty, data: bytes):
+    fd = os.open(pty.name, os.O_WRONLY | os.O_NOCTTY)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def test_pty_read_keeps_multibyte_characters_split_across_reads():
+    pty = ptylib.Pty(echo=False)
+    encoded = "é€".encode()
+    write_to_slave(pty, encoded[:3])
+    assert pty.read() == "é"
+    write_to_slave(pty, encoded[3:])
+    assert pty.read() == "€"
+
+
+def test_pty_read_replaces_invalid_bytes():
+    pty = ptylib.Pty(echo=False)
+    write_to_slave(pty, b"ok\xff")
+    assert pty.read() == "ok�"
+
+
+def test_pty_read_drains_up_to_max_bytes():
+    pty = ptylib.Pty(echo=False)
+    pty.max_read_bytes = 4
+    write_to_slave(pty, b"x" * 100)
+    assert pty.read() == "x" * 4
+    assert pty.read(max_bytes=90) == "x" * 90
+    assert pty.read(max_bytes=90) == "x" * 6
+    assert pty.read(max_bytes=90) is None
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import selectors
+
+from gdbgui.server import ptylib
+from gdbgui.server.ptywatcher import (
+    AsyncioPtyWatcher,
+    PtyWatcher,
+    get_selectors_module,
+)
+
+
+def test_wait_returns_readable_keys():
+    watcher = PtyWatcher()
+    idle_pty = ptylib.Pty()
+    busy_pty = ptylib.Pty()
+    watcher.register(idle_pty.stdout, "idle")
+    watcher.register(busy_pty.stdout, "busy")
+    assert watcher.wait(timeout_sec=0) == []
+
+    os.write(busy_pty.stdin, "hello".encode())
+    assert watcher.wait(timeout_sec=1) == ["busy"]
+    assert busy_pty.read() == "hello"
+
+    watcher.unregister(busy_pty.stdout)
+    os.write(busy_pty.stdin, "hello".encode())
+    assert watcher.wait(timeout_sec=0) == []
+
+
+def test_wakeup_interrupts_wait():
+    watcher = PtyWatcher()
+    watcher.wakeup()
+    assert watcher.wait(timeout_sec=1) == []
+
+
+def test_get_selectors_module():
+    assert get_selectors_module("threading") is selectors
+    assert get_selectors_module("eventlet") is not selectors
+
+
+def test_asyncio_pty_watcher_calls_back_with_readable_keys():
+    async def watch():
+        loop = asyncio.get_running_loop()
+        readable: "asyncio.Queue[str]" = asyncio.Queue()
+        wakeups: "asyncio.Queue[None]" = asyncio.Queue()
+        watcher = AsyncioPtyWatcher(
+            loop,
+            on_readable=readable.put_nowait,
+            on_wakeup=lambda: wakeups.put_nowait(None),
+        )
+        pty = ptylib.Pty()
+        watcher.register(pty.stdout, "busy")
+        os.write(pty.stdin, "hello".encode())
+        assert await asyncio.wait_for(readable.get(), timeout=1) == "busy"
+        assert pty.read() == "hello"
+        watcher.unregister(pty.stdout)
+
+        # wakeup can be called from other threads, i.e. mi parsing workers
+        await loop.run_in_executor(None, watcher.wakeup)
+        await asyncio.wait_for(wakeups.get(), timeout=1)
+
+    asyncio.run(watch())
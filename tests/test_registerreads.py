@@ -0,0 +1,193 @@
+from benchmarks import bench_forwarding
+from gdbgui.server.registerreads import REGISTER_READ_TOKEN_BASE, RegisterReader
+from tests.test_memoryreads import connect_to_fake_gdb, receive_until
+
+STOPPED = {"type": "notify", "message": "stopped", "payload": {}, "token": None}
+RUNNING = {"type": "notify", "message": "running", "payload": {}, "token": None}
+
+
+def result(token, **payload):
+    return {"type": "result", "message": "done", "payload": payload, "token": token}
+
+
+def get_token(command):
+    return int(command.split("-")[0])
+
+
+def start_program(session):
+    bench_forwarding.run_commands([session], "-exec-run")
+    # gdb stopped the program once it ran the next command, so reads don't
+    # race with the refresh of that stop
+    bench_forwarding.run_commands([session], "-gdb-set confirm off")
+
+
+def test_only_registers_that_changed_are_read_and_sent():
+    reader = RegisterReader()
+    changed_cmd, values_cmd = reader.get_commands("client", expanded=[])
+    assert changed_cmd == f"{REGISTER_READ_TOKEN_BASE}-data-list-changed-registers"
+    assert values_cmd.endswith("-data-list-register-values x")
+    register_values = [
+        {"number": "0", "value": "0x1"},
+        {"number": "1", "value": "0x2"},
+        {"number": "2", "value": "{v4_int32 = {0x0, 0x0, 0x0, 0x0}}"},
+    ]
+    other = result(1, stack=[])
+    responses, (first,), cmds = reader.take_results(
+        [
+            result(get_token(changed_cmd), **{"changed-registers": ["0", "1", "2"]}),
+            other,
+            result(get_token(values_cmd), **{"register-values": register_values}),
+        ]
+    )
+    assert responses == [other]
+    assert cmds == []
+    # vector registers are only read once they are expanded
+    assert first == {
+        "version": 0,
+        "vector_registers": ["2"],
+        "values": register_values[:2] + [{"number": "2"}],
+    }
+
+    assert reader.take_results([RUNNING]) == ([RUNNING], [], [])
+    assert reader.get_snapshot([]) is None
+    (changed_cmd,) = reader.get_refresh_commands([STOPPED])
+    _, _, (values_cmd,) = reader.take_results(
+        [result(get_token(changed_cmd), **{"changed-registers": ["1", "2"]})]
+    )
+    assert values_cmd.endswith("-data-list-register-values x 1")
+    _, (changes,), _ = reader.take_results(
+        [
+            result(
+                get_token(values_cmd),
+                **{"register-values": [{"number": "1", "value": "0x3"}]},
+            )
+        ]
+    )
+    assert changes == {
+        "version": 1,
+        "base_version": 0,
+        "vector_registers": ["2"],
+        "values": [{"number": "1", "value": "0x3"}],
+    }
+    assert reader.get_snapshot([])["values"][1] == {"number": "1", "value": "0x3"}
+
+    # expanding a register reads it, even if it did not change
+    assert reader.get_snapshot(["2"]) is None
+    (changed_cmd,) = reader.get_commands("client", expanded=["2"], full=False)
+    _, _, (values_cmd,) = reader.take_results(
+        [result(get_token(changed_cmd), **{"changed-registers": []})]
+    )
+    assert values_cmd.endswith("-data-list-register-values x 2")
+    _, (changes,), _ = reader.take_results(
+        [result(get_token(values_cmd), **{"register-values": register_values[2:]})]
+    )
+    assert changes["values"] == register_values[2:]
+
+    # the value of a vector register is forgotten when it changes while it
+    # is not expanded
+    (changed_cmd,) = reader.get_commands("client", expanded=[], full=False)
+    _, (changes,), cmds = reader.take_results(
+        [result(get_token(changed_cmd), **{"changed-registers": ["2"]})]
+    )
+    assert cmds == []
+    assert changes["values"] == [{"number": "2"}]
+
+    reader.unwatch("client")
+    assert reader.get_refresh_commands([STOPPED]) == []
+
+
+def test_no_registers_are_sent_when_gdb_cannot_read_them():
+    reader = RegisterReader()
+    changed_cmd, values_cmd = reader.get_commands("client", expanded=[])
+    error = {"type": "result", "message": "error", "payload": {"msg": "No registers."}}
+    assert reader.take_results(
+        [
+            dict(error, token=get_token(changed_cmd)),
+            dict(error, token=get_token(values_cmd)),
+        ]
+    ) == ([], [], [])
+    # every register is read once the program stopped
+    assert len(reader.get_refresh_commands([STOPPED])) == 2
+
+
+def test_registers_are_read_again_when_gdb_stops():
+    session = connect_to_fake_gdb(fake_gdb_args="--registers 16 --vector-registers 32")
+    try:
+        start_program(session)
+        session.client.emit(
+            "read_registers",
+            {"expanded": [], "full": True},
+            namespace=bench_forwarding.NAMESPACE,
+        )
+        (first,) = [
+            event["args"][0]
+            for event in receive_until(session, "register_values")
+            if event["name"] == "register_values"
+        ]
+        session.run_gdb_command("-exec-next")
+        (changes,) = [
+            event["args"][0]
+            for event in receive_until(session, "register_values")
+            if event["name"] == "register_values"
+        ]
+    finally:
+        session.disconnect()
+    assert len(first["values"]) == 48
+    assert first["vector_registers"] == [str(n) for n in range(16, 48)]
+    assert all("value" not in register for register in first["values"][16:])
+    assert changes["base_version"] == first["version"]
+    # the fake gdb changes every register but most vector registers
+    assert [register["number"] for register in changes["values"]] == [
+        str(n) for n in range(16)
+    ]
+
+
+def test_registers_are_read_again_when_another_frame_is_selected():
+    reader = RegisterReader()
+    assert reader.command_written("5-stack-select-frame 1") == []
+    changed_cmd, values_cmd = reader.get_commands("client", expanded=[])
+    reader.take_results(
+        [
+            result(get_token(changed_cmd), **{"changed-registers": ["0"]}),
+            result(
+                get_token(values_cmd),
+                **{"register-values": [{"number": "0", "value": "0x1"}]},
+            ),
+        ]
+    )
+    assert reader.command_written("-break-list") == []
+    (changed_cmd,) = reader.command_written("6-stack-select-frame 1")
+    assert changed_cmd.endswith("-data-list-changed-registers")
+    assert reader.get_snapshot([]) is None
+    # frames selected on gdb's console
+    thread_selected = {"type": "notify", "message": "thread-selected", "payload": {}}
+    assert reader.get_refresh_commands([thread_selected]) == []
+
+
+def test_registers_of_the_selected_frame_are_sent():
+    session = connect_to_fake_gdb(fake_gdb_args="--registers 16")
+    try:
+        start_program(session)
+        session.client.emit(
+            "read_registers",
+            {"expanded": [], "full": True},
+            namespace=bench_forwarding.NAMESPACE,
+        )
+        (first,) = [
+            event["args"][0]
+            for event in receive_until(session, "register_values")
+            if event["name"] == "register_values"
+        ]
+        session.run_gdb_command("-stack-select-frame 1")
+        (changes,) = [
+            event["args"][0]
+            for event in receive_until(session, "register_values")
+            if event["name"] == "register_values"
+        ]
+    finally:
+        session.disconnect()
+    assert changes["base_version"] == first["version"]
+    # the program counter of the fake gdb depends on the selected frame
+    assert changes["values"] == [
+        {"number": "0", "value": hex(int(first["values"][0]["value"], 16) + 0x40)}
+    ]
@@ -1,3 +1,5 @@
+from unittest import mock
+
 from gdbgui.server import sessionmanager
 
 
@@ -10,3 +12,45 @@ def test_SessionManager():
     assert pid
     dashboard_data = manager.get_dashboard_data()
     assert len(dashboard_data) == 1
+
+
+def make_debug_session(pid: int) -> sessionmanager.DebugSession:
+    return sessionmanager.DebugSession(
+        pygdbmi_controller=None,  # type: ignore
+        pty_for_gdbgui=None,  # type: ignore
+        pty_for_gdb=None,  # type: ignore
+        pty_for_debugged_program=None,  # type: ignore
+        command="gdb",
+        mi_version="mi3",
+        pid=pid,
+    )
+
+
+@mock.patch.object(sessionmanager.DebugSession, "terminate")
+def test_SessionManager_indexes(mock_terminate):
+    manager = sessionmanager.SessionManager()
+    first = make_debug_session(pid=1000)
+    second = make_debug_session(pid=1001)
+    manager.add_debug_session(first, "client1")
+    manager.add_debug_session(second, "client2")
+    manager.connect_client_to_debug_session(desired_gdbpid=1000, client_id="client3")
+
+    assert manager.debug_session_from_pid(1000) is first
+    assert manager.debug_session_from_pid(1001) is second
+    assert manager.debug_session_from_client_id("client1") is first
+    assert manager.debug_session_from_client_id("client3") is first
+    assert manager.debug_session_from_client_id("client2") is second
+
+    manager.disconnect_client("client1")
+    assert manager.debug_session_from_client_id("client1") is None
+    assert manager.debug_session_from_client_id("client3") is first
+    mock_terminate.assert_not_called()
+
+    manager.disconnect_client("client3")
+    assert manager.debug_session_from_pid(1000) is None
+    assert manager.debug_session_from_client_id("client3") is None
+    mock_terminate.assert_called()
+
+    assert manager.remove_debug_session_by_pid(1001) == ["client2"]
+    assert manager.debug_session_from_client_id("client2") is None
+    assert manager.get_dashboard_data() == []
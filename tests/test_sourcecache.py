@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+
+from gdbgui.server import sourcecache
+from gdbgui.server.sourcecache import SourceCache
+
+SOURCE = "\n/* a\n b */\nint main() {\n\n  return 0;\n}\n"
+
+
+def write_source(tmp_path, name="main.c", source=SOURCE):
+    path = tmp_path / name
+    path.write_text(source)
+    return str(path)
+
+
+def test_files_are_highlighted_as_a_whole(tmp_path):
+    path = write_source(tmp_path)
+    source_file = SourceCache(max_bytes=1024 * 1024).get(path, highlight=True)
+    assert source_file.highlighted
+    assert len(source_file.lines) == len(SOURCE.split("\n"))
+    # lines in the middle of a multi-line comment are highlighted as comments
+    assert source_file.lines[2] == '<span class="cm"> b */</span>\n'
+    assert source_file.last_modified_unix_sec == os.path.getmtime(path)
+
+
+def test_blank_lines_are_preserved_without_highlighting(tmp_path):
+    path = write_source(tmp_path)
+    source_file = SourceCache(max_bytes=1024 * 1024).get(path, highlight=False)
+    assert not source_file.highlighted
+    assert source_file.lines[:2] == [" ", "/* a"]
+
+
+def test_cached_until_the_file_changes(tmp_path):
+    path = write_source(tmp_path)
+    cache = SourceCache(max_bytes=1024 * 1024)
+    source_file = cache.get(path, highlight=True)
+    assert cache.get(path, highlight=True) is source_file
+    assert cache.get(path, highlight=False) is not source_file
+
+    write_source(tmp_path, source=SOURCE + "int x;\n")
+    os.utime(path, ns=(0, 12345))
+    changed = cache.get(path, highlight=True)
+    assert len(changed.lines) == len(source_file.lines) + 1
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    paths = [write_source(tmp_path, f"{i}.c") for i in range(3)]
+    size_bytes = SourceCache(max_bytes=1024 * 1024).get(paths[0], True).size_bytes
+    cache = SourceCache(max_bytes=size_bytes * 2)
+    first = cache.get(paths[0], highlight=True)
+    cache.get(paths[1], highlight=True)
+    assert cache.get(paths[0], highlight=True) is first
+    cache.get(paths[2], highlight=True)
+    # paths[1] was evicted rather than paths[0], which was used more recently
+    assert cache.get(paths[0], highlight=True) is first
+    assert len(cache._entries) == 2
+    assert cache.num_bytes <= cache.max_bytes
+
+
+def test_concurrent_requests_share_one_load(tmp_path, monkeypatch):
+    path = write_source(tmp_path)
+    load_source_file = sourcecache.load_source_file
+    num_loads = 0
+
+    def slow_load_source_file(*args):
+        nonlocal num_loads
+        num_loads += 1
+        time.sleep(0.2)
+        return load_source_file(*args)
+
+    monkeypatch.setattr(sourcecache, "load_source_file", slow_load_source_file)
+    cache = SourceCache(max_bytes=1024 * 1024)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get(path, True)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert num_loads == 1
+    assert len(results) == 4
+    assert all(result is results[0] for result in results)
+
+
+def test_large_files_are_read_in_blocks(tmp_path):
+    functions = [
+        f"/* function {i}\n * spans lines\n */\nint f{i}(void) {{\n\n  return {i};\n}}\n"
+        for i in range(600)
+    ]
+    path = write_source(tmp_path, source="\n".join(functions))
+    whole_file = SourceCache(max_bytes=1024 * 1024).read(path, 1, 10000, True)
+    blocks = SourceCache(max_bytes=1024 * 1024, ranged_read_min_bytes=0)
+    for start_line, end_line in [
+        (1, 10),
+        (990, 1010),
+        (2500, 4000),
+        (4790, 4800),
+        (4795, 5000),
+    ]:
+        source = blocks.read(path, start_line, end_line, highlight=True)
+        assert source.num_lines_in_file == whole_file.num_lines_in_file == 4800
+        assert source.end_line == min(end_line, 4800)
+        assert source.lines == whole_file.lines[start_line - 1 : end_line]
+    past_the_end = blocks.read(path, 4801, 4900, highlight=True)
+    assert past_the_end.lines == []
+    assert past_the_end.end_line == 4800
+    unhighlighted = blocks.read(path, 1002, 1003, highlight=False)
+    assert unhighlighted.lines == [" * spans lines", " */"]
+
+
+def test_lines_are_read_as_of_the_given_stat(tmp_path):
+    path = write_source(tmp_path, source="int x;\n")
+    cache = SourceCache(max_bytes=1024 * 1024)
+    stat = os.stat(path)
+    assert cache.read(path, 1, 1, highlight=False, stat=stat).lines == ["int x;"]
+    # the file changed after an entity tag was made from stat
+    write_source(tmp_path, source="int y;\n")
+    os.utime(path, ns=(stat.st_mtime_ns + 10**9, stat.st_mtime_ns + 10**9))
+    source = cache.read(path, 1, 1, highlight=False, stat=stat)
+    assert source.lines == ["int x;"]
+    assert source.last_modified_unix_sec == stat.st_mtime
+    assert cache.read(path, 1, 1, highlight=False).lines == ["int y;"]
+
+
+def test_lines_are_read_in_chunks_aligned_with_blocks(tmp_path):
+    path = write_source(tmp_path, source="int x;\n" * 2500)
+    for ranged_read_min_bytes in (0, 1024 * 1024):
+        cache = SourceCache(
+            max_bytes=1024 * 1024, ranged_read_min_bytes=ranged_read_min_bytes
+        )
+        chunks = list(cache.iter_read(path, 500, 2200, highlight=False))
+        assert [(c.start_line, c.end_line) for c in chunks] == [
+            (500, 1000),
+            (1001, 2000),
+            (2001, 2200),
+        ]
+        assert all(len(c.lines) == c.end_line - c.start_line + 1 for c in chunks)
+        assert all(c.num_lines_in_file == 2501 for c in chunks)
+
+
+def test_lexer_classes_are_resolved_once_per_file_name():
+    sourcecache.get_lexer_class.cache_clear()
+    assert sourcecache.get_lexer("/a/main.cpp").name == "C++"
+    assert sourcecache.get_lexer("/b/main.cpp").name == "C++"
+    assert sourcecache.get_lexer("/a/README") is None
+    assert sourcecache.get_lexer_class.cache_info().hits == 1
+
+
+def test_preload_lexers_of_project_files(tmp_path):
+    for name in ["a.c", "b.c", "c.py", ".hidden/d.rs", "notes.unknownextension"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text("")
+    paths = list(sourcecache.find_source_files(str(tmp_path)))
+    assert len(paths) == 4
+    assert sourcecache.preload_lexers(paths) == 2
+    assert len(list(sourcecache.find_source_files(str(tmp_path), max_files=2))) == 2
+
+
+def test_invalidate_drops_every_cached_version_of_a_file(tmp_path):
+    path = write_source(tmp_path)
+    other_path = write_source(tmp_path, name="other.c")
+    cache = SourceCache(max_bytes=1024 * 1024, ranged_read_min_bytes=10)
+    cache.get(path, highlight=True)
+    cache.get(path, highlight=False)
+    cache.read(path, 1, 2, highlight=True)
+    other_file = cache.get(other_path, highlight=True)
+    cache.invalidate(path)
+    assert [key[0] for key in cache._entries] == [other_path]
+    assert cache.num_bytes == other_file.size_bytes
+
+
+def test_prehighlighting_starts_with_priority_files(monkeypatch):
+    prehighlighter = sourcecache.SourcePrehighlighter(SourceCache(max_bytes=1024))
+    prehighlighted = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def prehighlight(path):
+        prehighlighted.append(path)
+        started.set()
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(prehighlighter, "prehighlight", prehighlight)
+    prehighlighter.add(["a.c"])
+    assert started.wait(5)
+    # queued while a.c is being highlighted
+    prehighlighter.add(["b.c", "c.c", "d.c"], priority_paths=["d.c"])
+    prehighlighter.add(["b.c"], priority_paths=["c.c"])
+    release.set()
+    deadline = time.time() + 5
+    while len(prehighlighted) < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    assert prehighlighted == ["a.c", "c.c", "d.c", "b.c"]
+
+
+def test_prehighlighting_only_uses_part_of_the_cache(tmp_path):
+    paths = [write_source(tmp_path, f"{i}.c") for i in range(4)]
+    size_bytes = SourceCache(max_bytes=1024 * 1024).get(paths[0], True).size_bytes
+    cache = SourceCache(max_bytes=size_bytes * 4)
+    prehighlighter = sourcecache.SourcePrehighlighter(cache)
+    assert [prehighlighter.prehighlight(path) for path in paths] == [
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert len(cache._entries) == 2
+    empty_cache = SourceCache(max_bytes=1024 * 1024)
+    missing_path = str(tmp_path / "missing.c")
+    assert not sourcecache.SourcePrehighlighter(empty_cache).prehighlight(missing_path)
@@ -0,0 +1,44 @@
+import os
+
+import pytest  # type: ignore
+
+from gdbgui.server.sourcewatcher import SourceWatcher
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "polling"])
+def watcher(request):
+    watcher = SourceWatcher(use_inotify=request.param)
+    if request.param and not watcher.uses_inotify:
+        pytest.skip("inotify is not available")
+    return watcher
+
+
+def test_changed_files_are_reported_with_their_keys(tmp_path, watcher):
+    path = tmp_path / "main.c"
+    path.write_text("int x;\n")
+    unchanged_path = tmp_path / "other.c"
+    unchanged_path.write_text("int y;\n")
+    watcher.watch(str(path), "session 1")
+    watcher.watch(str(path), "session 2")
+    watcher.watch(str(unchanged_path), "session 1")
+    assert watcher.wait(timeout_sec=0) == []
+
+    path.write_text("int x, z;\n")
+    (changed,) = watcher.wait(timeout_sec=5)
+    assert changed.path == str(path)
+    assert changed.last_modified_unix_sec == os.path.getmtime(path)
+    assert changed.keys == {"session 1", "session 2"}
+
+    path.unlink()
+    (deleted,) = watcher.wait(timeout_sec=5)
+    assert deleted.path == str(path)
+    assert deleted.last_modified_unix_sec is None
+
+
+def test_files_are_not_watched_once_no_key_watches_them(tmp_path, watcher):
+    path = tmp_path / "main.c"
+    path.write_text("int x;\n")
+    watcher.watch(str(path), "session 1")
+    watcher.unwatch("session 1")
+    path.write_text("int x, z;\n")
+    assert watcher.wait(timeout_sec=0.1) == []
@@ -0,0 +1,45 @@
+import pytest  # type: ignore
+
+from gdbgui.server import wireencoding
+from gdbgui.server.wireencoding import (
+    JSON,
+    MSGPACK,
+    encode_event_data,
+    negotiate_encoding,
+)
+
+
+def test_json_is_sent_as_is():
+    response = [{"type": "console", "payload": "hi"}]
+    assert encode_event_data("gdb_response", response, JSON) is response
+    assert negotiate_encoding(None) == JSON
+    assert negotiate_encoding("unknown") == JSON
+
+
+def test_msgpack_falls_back_to_json_when_unavailable(monkeypatch):
+    monkeypatch.setattr(wireencoding, "msgpack", None)
+    assert negotiate_encoding(MSGPACK) == JSON
+
+
+def test_msgpack_encoding():
+    msgpack = pytest.importorskip("msgpack")
+    assert negotiate_encoding(MSGPACK) == MSGPACK
+    response = [
+        {
+            "type": "result",
+            "message": "done",
+            "payload": {"frame": {"line": "7"}},
+            "stream": "stdout",
+            "token": 3,
+        },
+        {"type": "console", "payload": "hi", "stream": "stdout", "extra": 1},
+    ]
+    encoded = encode_event_data("gdb_response", response, MSGPACK)
+    assert msgpack.unpackb(encoded) == [
+        ["result", "done", {"frame": {"line": "7"}}, "stdout", 3],
+        ["console", None, "hi", "stdout", None, {"extra": 1}],
+    ]
+    assert encode_event_data("user_pty_response", "hé", MSGPACK) == "hé".encode()
+    # events that are not in the bulk of the traffic are sent as json
+    error = {"message": "oops"}
+    assert encode_event_data("fatal_server_error", error, MSGPACK) is error